@@ -0,0 +1,32 @@
+"""Add composite indexes for paginated task and chat listings
+
+Revision ID: 2d9b6f4e8a13
+Revises: e4a8c3f27b19
+Create Date: 2026-10-17 16:02:44.193027
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2d9b6f4e8a13'
+down_revision: Union[str, Sequence[str], None] = 'e4a8c3f27b19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_tasks_user_created', 'tasks', ['user_id', 'created_at', 'id'])
+    op.create_index('ix_tasks_user_status_updated', 'tasks', ['user_id', 'status', 'updated_at', 'id'])
+    op.create_index('ix_user_chats_user_active', 'user_chats', ['user_id', 'is_active', 'id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_user_chats_user_active', table_name='user_chats')
+    op.drop_index('ix_tasks_user_status_updated', table_name='tasks')
+    op.drop_index('ix_tasks_user_created', table_name='tasks')
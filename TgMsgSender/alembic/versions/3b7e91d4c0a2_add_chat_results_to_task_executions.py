@@ -0,0 +1,28 @@
+"""Add chat_results to task_executions
+
+Revision ID: 3b7e91d4c0a2
+Revises: 9f3c1a6e2b75
+Create Date: 2026-10-17 12:40:18.511203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7e91d4c0a2'
+down_revision: Union[str, Sequence[str], None] = '9f3c1a6e2b75'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('task_executions', sa.Column('chat_results', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('task_executions', 'chat_results')
@@ -0,0 +1,41 @@
+"""Add uploaded_media table
+
+Revision ID: 5d2e8b7c4a91
+Revises: 0481f007ac1a
+Create Date: 2026-10-17 10:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2e8b7c4a91'
+down_revision: Union[str, Sequence[str], None] = '0481f007ac1a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('uploaded_media',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('file_hash', sa.String(length=64), nullable=False),
+    sa.Column('media_type', sa.String(length=20), nullable=False),
+    sa.Column('media_id', sa.BigInteger(), nullable=False),
+    sa.Column('access_hash', sa.BigInteger(), nullable=False),
+    sa.Column('file_reference', sa.LargeBinary(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('last_used', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'file_hash', name='uq_uploaded_media_user_file')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('uploaded_media')
@@ -0,0 +1,32 @@
+"""Add users.username and per-user task status listing indexes
+
+Revision ID: 6a4f2e8c1d57
+Revises: 8e1f5c3b7d24
+Create Date: 2026-10-17 17:05:31.274906
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a4f2e8c1d57'
+down_revision: Union[str, Sequence[str], None] = '8e1f5c3b7d24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # /admin @username in the bot
+    op.create_index(op.f('ix_users_username'), 'users', ['username'], unique=False)
+    # /api/tasks?status=... ordered by created_at
+    op.create_index('ix_tasks_user_status_created', 'tasks', ['user_id', 'status', 'created_at', 'id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tasks_user_status_created', table_name='tasks')
+    op.drop_index(op.f('ix_users_username'), table_name='users')
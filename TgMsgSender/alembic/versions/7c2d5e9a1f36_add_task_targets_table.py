@@ -0,0 +1,55 @@
+"""Add task_targets table
+
+Revision ID: 7c2d5e9a1f36
+Revises: 3b7e91d4c0a2
+Create Date: 2026-10-17 14:05:52.207119
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2d5e9a1f36'
+down_revision: Union[str, Sequence[str], None] = '3b7e91d4c0a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    task_targets = op.create_table('task_targets',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('task_id', sa.String(length=32), nullable=False),
+    sa.Column('chat_id', sa.BigInteger(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['task_id'], ['tasks.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('task_id', 'chat_id', name='uq_task_targets_task_chat')
+    )
+    op.create_index(op.f('ix_task_targets_chat_id'), 'task_targets', ['chat_id'], unique=False)
+
+    # Backfill from tasks.chat_ids
+    tasks = sa.table('tasks', sa.column('id', sa.String), sa.column('chat_ids', sa.JSON))
+    bind = op.get_bind()
+    rows = []
+    for task_id, chat_ids in bind.execute(sa.select(tasks.c.id, tasks.c.chat_ids)).all():
+        if not isinstance(chat_ids, list):
+            continue
+        for position, chat_id in enumerate(dict.fromkeys(chat_ids)):
+            rows.append({'task_id': task_id, 'chat_id': int(chat_id), 'position': position})
+        if len(rows) >= BACKFILL_BATCH_SIZE:
+            op.bulk_insert(task_targets, rows)
+            rows = []
+    if rows:
+        op.bulk_insert(task_targets, rows)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_task_targets_chat_id'), table_name='task_targets')
+    op.drop_table('task_targets')
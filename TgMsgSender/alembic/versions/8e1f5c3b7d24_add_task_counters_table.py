@@ -0,0 +1,38 @@
+"""Add task_counters table
+
+Revision ID: 8e1f5c3b7d24
+Revises: 2d9b6f4e8a13
+Create Date: 2026-10-17 16:40:12.508316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e1f5c3b7d24'
+down_revision: Union[str, Sequence[str], None] = '2d9b6f4e8a13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Filled by TaskCounters.rebuild() when the app starts with TASK_COUNTERS enabled
+    op.create_table('task_counters',
+    sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('total_tasks', sa.Integer(), nullable=False),
+    sa.Column('active_tasks', sa.Integer(), nullable=False),
+    sa.Column('paused_tasks', sa.Integer(), nullable=False),
+    sa.Column('archived_tasks', sa.Integer(), nullable=False),
+    sa.Column('total_executions', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('task_counters')
@@ -0,0 +1,41 @@
+"""Add scheduler_leases and scheduler_workers tables
+
+Revision ID: 9f3c1a6e2b75
+Revises: 5d2e8b7c4a91
+Create Date: 2026-10-17 11:02:15.604918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9f3c1a6e2b75'
+down_revision: Union[str, Sequence[str], None] = '5d2e8b7c4a91'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('scheduler_leases',
+    sa.Column('shard', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('worker_id', sa.String(length=255), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('shard')
+    )
+    op.create_table('scheduler_workers',
+    sa.Column('worker_id', sa.String(length=255), nullable=False),
+    sa.Column('heartbeat_at', sa.DateTime(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('worker_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('scheduler_workers')
+    op.drop_table('scheduler_leases')
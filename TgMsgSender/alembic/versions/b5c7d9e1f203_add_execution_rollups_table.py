@@ -0,0 +1,49 @@
+"""Add execution_rollups table and task_executions.execution_time index
+
+Revision ID: b5c7d9e1f203
+Revises: 6a4f2e8c1d57
+Create Date: 2026-10-17 17:32:08.916420
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5c7d9e1f203'
+down_revision: Union[str, Sequence[str], None] = '6a4f2e8c1d57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Filled by ExecutionRetention from task_executions rows past the raw retention
+    op.create_table('execution_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('task_id', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('period', sa.String(length=4), nullable=False),
+    sa.Column('period_start', sa.DateTime(), nullable=False),
+    sa.Column('runs', sa.Integer(), nullable=False),
+    sa.Column('successful_chats', sa.Integer(), nullable=False),
+    sa.Column('failed_chats', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['task_id'], ['tasks.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('task_id', 'period', 'period_start', name='uq_execution_rollups_task_period')
+    )
+    op.create_index('ix_execution_rollups_user_period', 'execution_rollups', ['user_id', 'period', 'period_start'])
+    op.create_index('ix_execution_rollups_period', 'execution_rollups', ['period', 'period_start'])
+    # Compaction and the history stats select raw rows by age
+    op.create_index(op.f('ix_task_executions_execution_time'), 'task_executions', ['execution_time'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_task_executions_execution_time'), table_name='task_executions')
+    op.drop_index('ix_execution_rollups_period', table_name='execution_rollups')
+    op.drop_index('ix_execution_rollups_user_period', table_name='execution_rollups')
+    op.drop_table('execution_rollups')
@@ -0,0 +1,29 @@
+"""Add users.updated_at index
+
+Revision ID: c8e2a4f6b391
+Revises: b5c7d9e1f203
+Create Date: 2026-10-17 18:01:47.352118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8e2a4f6b391'
+down_revision: Union[str, Sequence[str], None] = 'b5c7d9e1f203'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # UserCache follow mode: which users rows changed since it last looked
+    op.create_index(op.f('ix_users_updated_at'), 'users', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_users_updated_at'), table_name='users')
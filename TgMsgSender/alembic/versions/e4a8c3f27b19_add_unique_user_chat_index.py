@@ -0,0 +1,34 @@
+"""Add unique (user_id, chat_id) index to user_chats
+
+Revision ID: e4a8c3f27b19
+Revises: 7c2d5e9a1f36
+Create Date: 2026-10-17 15:31:07.846552
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a8c3f27b19'
+down_revision: Union[str, Sequence[str], None] = '7c2d5e9a1f36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Keep the oldest row of any duplicated (user_id, chat_id) pair
+    user_chats = sa.table('user_chats', sa.column('id', sa.Integer), sa.column('user_id', sa.Integer),
+                          sa.column('chat_id', sa.Integer))
+    keep = sa.select(sa.func.min(user_chats.c.id)).group_by(user_chats.c.user_id, user_chats.c.chat_id)
+    op.execute(user_chats.delete().where(user_chats.c.id.notin_(keep)))
+
+    op.create_index('uq_user_chats_user_chat', 'user_chats', ['user_id', 'chat_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_user_chats_user_chat', table_name='user_chats')
@@ -0,0 +1,42 @@
+"""Backfill NULL task timestamps and make them NOT NULL
+
+Revision ID: f2a9c4e7b813
+Revises: c8e2a4f6b391
+Create Date: 2026-10-17 21:12:40.518306
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a9c4e7b813'
+down_revision: Union[str, Sequence[str], None] = 'c8e2a4f6b391'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The task lists page on (created_at, id) and (updated_at, id); a NULL there
+    # cannot be compared, so its row could not be paged past. A task missing
+    # both timestamps is listed as the oldest.
+    tasks = sa.table('tasks', sa.column('created_at', sa.DateTime), sa.column('updated_at', sa.DateTime))
+    op.execute(tasks.update().where(tasks.c.created_at.is_(None))
+               .values(created_at=sa.func.coalesce(tasks.c.updated_at, datetime(1970, 1, 1))))
+    op.execute(tasks.update().where(tasks.c.updated_at.is_(None)).values(updated_at=tasks.c.created_at))
+
+    # SQLite cannot change a column's nullability in place, so batch mode rebuilds the table
+    with op.batch_alter_table('tasks') as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('tasks') as batch_op:
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=True)
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=True)
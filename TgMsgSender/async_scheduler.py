@@ -0,0 +1,182 @@
+"""
+Asyncio-native interval scheduler that fires tasks as coroutines on the main loop
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+from due_index import DueTaskIndex
+
+
+class ScheduledJob:
+    """An interval job for one task"""
+
+    __slots__ = ('id', 'user_id', 'interval', 'next_run_time')
+
+    def __init__(self, task_id, user_id, interval_seconds, next_run_time):
+        self.id = task_id
+        self.user_id = user_id
+        self.interval = timedelta(seconds=interval_seconds)
+        self.next_run_time = next_run_time  # naive UTC, like Task.next_run
+
+
+class AsyncTaskScheduler:
+    """
+    Fires `run_task(user_id, task_id)` on `loop` every interval.
+
+    Due times live in a DueTaskIndex watched by a single dispatcher
+    coroutine, so finding the next due task is O(log n) no matter how many
+    tasks exist. No thread is held while a task runs and a job never
+    overlaps with itself. The public methods may be called from any thread.
+    """
+
+    def __init__(self, loop, run_task, store=None, accepts=None):
+        self.loop = loop
+        self.run_task = run_task
+        self.store = store
+        self.accepts = accepts or (lambda user_id: True)  # False for users another worker schedules
+        self.may_run = lambda user_id: True  # False while this worker's right to run the user's tasks is unsure
+        self.running = False
+        self._jobs = {}
+        self._index = DueTaskIndex()
+        self._in_flight = {}
+        self._wakeup = None
+        self._dispatcher = None
+
+    def start(self):
+        self._call(self._start)
+
+    def rebuild(self):
+        """
+        Replace every job with what the store holds. Runs missed while the
+        process was down are skipped, keeping each task's original phase.
+        """
+        if self.store is None:
+            return
+        if self._on_loop():
+            # Reading the store is blocking database work; do it on a worker thread
+            self.loop.run_in_executor(None, self.rebuild)
+            return
+        now = datetime.utcnow()
+        jobs, adjusted = [], {}
+        for task_id, user_id, interval_seconds, next_run in self.store.load_jobs():
+            job = ScheduledJob(task_id, user_id, interval_seconds, next_run or now + timedelta(seconds=interval_seconds))
+            if job.next_run_time <= now:
+                job.next_run_time += job.interval * ((now - job.next_run_time) // job.interval + 1)
+            if job.next_run_time != next_run:
+                adjusted[task_id] = job.next_run_time
+            jobs.append(job)
+        self.store.save_next_runs(adjusted)
+        self._call(self._replace_all, jobs)
+
+    def add_job(self, task_id, user_id, interval_seconds, next_run_time):
+        """Schedule a task, replacing any existing job with the same id"""
+        self._call(self._add, ScheduledJob(task_id, user_id, interval_seconds, next_run_time))
+
+    def remove_job(self, task_id):
+        """Stop firing a task; a run already in progress is left to finish"""
+        self._call(self._remove, task_id)
+
+    def get_job(self, task_id):
+        return self._jobs.get(task_id)
+
+    def get_jobs(self):
+        return list(self._jobs.values())
+
+    def in_flight(self):
+        return len(self._in_flight)
+
+    async def shutdown(self, wait=True):
+        self.running = False
+        if self._dispatcher:
+            self._dispatcher.cancel()
+        if wait and self._in_flight:
+            await asyncio.gather(*self._in_flight.values(), return_exceptions=True)
+
+    # --- Internals (loop thread only) ---
+    def _on_loop(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def _call(self, fn, *args):
+        if self._on_loop():
+            fn(*args)
+        else:
+            self.loop.call_soon_threadsafe(fn, *args)
+
+    def _start(self):
+        if self.running:
+            return
+        self.running = True
+        self._wakeup = asyncio.Event()
+        self._dispatcher = self.loop.create_task(self._dispatch())
+
+    def _replace_all(self, jobs):
+        self._jobs.clear()
+        self._index = DueTaskIndex()
+        for job in jobs:
+            self._jobs[job.id] = job
+            self._index.push(job.id, job.next_run_time)
+        self._wake()
+
+    def _add(self, job):
+        if not self.accepts(job.user_id):
+            self._remove(job.id)
+            return
+        head = self._index.peek()
+        self._jobs[job.id] = job
+        self._index.push(job.id, job.next_run_time)
+        if head is None or job.next_run_time < head[0]:
+            self._wake()
+
+    def _remove(self, task_id):
+        self._jobs.pop(task_id, None)
+        self._index.discard(task_id)
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _dispatch(self):
+        while self.running:
+            head = self._index.peek()
+            timeout = None if head is None else (head[0] - datetime.utcnow()).total_seconds()
+            if timeout is None or timeout > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            for task_id in self._index.pop_due(datetime.utcnow()):
+                job = self._jobs.get(task_id)
+                if job is not None:
+                    self._fire(job)
+
+    def _fire(self, job):
+        # Advance before running so the task can read its own next_run_time.
+        # Missed runs are coalesced into this one.
+        now = datetime.utcnow()
+        job.next_run_time += job.interval
+        if job.next_run_time <= now:
+            job.next_run_time = now + job.interval
+        self._index.push(job.id, job.next_run_time)
+
+        if job.id in self._in_flight:
+            print(f"Task {job.id} is still running, skipping this run")
+            return
+        if not self.may_run(job.user_id):
+            print(f"Task {job.id}: lease on its shard is not confirmed, skipping this run")
+            return
+        self._in_flight[job.id] = self.loop.create_task(self._run(job))
+
+    async def _run(self, job):
+        try:
+            await self.run_task(job.user_id, job.id)
+        except Exception as e:
+            print(f"Error executing task {job.id}: {e}")
+        finally:
+            self._in_flight.pop(job.id, None)
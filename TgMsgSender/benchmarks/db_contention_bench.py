@@ -0,0 +1,140 @@
+"""
+Database contention benchmark: scheduler writes vs. web reads.
+
+Runs threads that behave like send jobs (claim a task, record an execution,
+bump its counters, release it; one transaction each) next to threads that
+behave like dashboard polls (a stats GROUP BY and a page of tasks), for a
+fixed time, once per engine profile. Reports throughput, latency and how
+many operations failed with "database is locked" or similar.
+
+SQLite runs against a throwaway file; pass --url to point it at another
+database (e.g. a scratch Postgres) instead. Tables are created there.
+
+    python benchmarks/db_contention_bench.py --writers 8 --readers 8 --seconds 10
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import func, insert, update  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from database import Base, Task, TaskExecution, User, make_engine  # noqa: E402
+from task_stats import task_stats  # noqa: E402
+
+USERS = 20
+TASKS_PER_USER = 50
+
+
+def seed(session_factory):
+    db = session_factory()
+    try:
+        if db.query(func.count(User.id)).scalar():
+            return
+        users = [{'id': i + 1, 'telegram_id': 10_000 + i, 'phone': f'+1000{i}',
+                  'api_id_encrypted': 'x', 'api_hash_encrypted': 'x'} for i in range(USERS)]
+        db.execute(insert(User), users)
+        db.execute(insert(Task), [
+            {'id': f'u{u}t{t}', 'user_id': u + 1, 'name': f'task {t}', 'message': 'hello', 'status': 'active',
+             'interval_value': 1, 'interval_unit': 'hours', 'chat_ids': [1, 2, 3], 'execution_count': 0,
+             'is_running': False, 'created_at': datetime.utcnow(), 'updated_at': datetime.utcnow()}
+            for u in range(USERS) for t in range(TASKS_PER_USER)])
+        db.commit()
+    finally:
+        db.close()
+
+
+def send_job(db):
+    task_id = f'u{random.randrange(USERS)}t{random.randrange(TASKS_PER_USER)}'
+    claimed = db.execute(update(Task).where(Task.id == task_id, Task.is_running == False)  # noqa: E712
+                         .values(is_running=True)).rowcount
+    db.commit()
+    if not claimed:
+        return
+    db.execute(insert(TaskExecution), [{'task_id': task_id, 'execution_time': datetime.utcnow(), 'status': 'success',
+                                         'total_chats': 3, 'successful_chats': 3, 'failed_chats': 0}])
+    db.execute(update(Task).where(Task.id == task_id).values(
+        is_running=False, execution_count=Task.execution_count + 1, last_run=datetime.utcnow()))
+    db.commit()
+
+
+def web_read(db):
+    user_id = random.randrange(USERS) + 1
+    task_stats(db, user_id)
+    db.query(Task).filter(Task.user_id == user_id, Task.status != 'archived') \
+        .order_by(Task.created_at.desc(), Task.id.desc()).limit(50).all()
+    db.rollback()
+
+
+def worker(session_factory, operation, deadline, results):
+    latencies, errors = [], 0
+    db = session_factory()
+    try:
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                operation(db)
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                db.rollback()
+                errors += 1
+    finally:
+        db.close()
+    results.append((latencies, errors))
+
+
+def run(url, profile, writers, readers, seconds):
+    engine = make_engine(url, profile)
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    seed(session_factory)
+
+    write_results, read_results = [], []
+    deadline = time.monotonic() + seconds
+    threads = [threading.Thread(target=worker, args=(session_factory, send_job, deadline, write_results))
+               for _ in range(writers)]
+    threads += [threading.Thread(target=worker, args=(session_factory, web_read, deadline, read_results))
+                for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    for name, results in (('send jobs', write_results), ('web reads', read_results)):
+        latencies = sorted(l for ls, _ in results for l in ls)
+        errors = sum(e for _, e in results)
+        if latencies:
+            p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0]
+            print(f"  {profile:<6} {name:<10} {len(latencies) / seconds:9.1f} ops/s   "
+                  f"p50 {statistics.median(latencies) * 1000:8.2f} ms   p95 {p95 * 1000:8.2f} ms   "
+                  f"errors: {errors}")
+        else:
+            print(f"  {profile:<6} {name:<10} no successful operations   errors: {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='database to run against (default: a temporary SQLite file per profile)')
+    parser.add_argument('--writers', type=int, default=8, help='concurrent send-job threads')
+    parser.add_argument('--readers', type=int, default=8, help='concurrent web-read threads')
+    parser.add_argument('--seconds', type=float, default=10, help='duration per profile')
+    args = parser.parse_args()
+
+    print(f"{args.writers} send-job threads, {args.readers} web-read threads, {args.seconds}s per profile\n")
+    for profile in ('plain', 'tuned'):
+        url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+        run(url, profile, args.writers, args.readers, args.seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Credential decryption benchmark.
+
+Compares decrypting a user's three credential fields the old way (PEM file
+parsed on every call), with the key manager (keys parsed once), in the v2
+envelope format (one RSA-wrapped data key per user), and with the per-user
+CredentialCache in front of it. Runs against a throwaway key pair
+generated in a temporary directory.
+
+    python benchmarks/decrypt_bench.py --iterations 200
+"""
+
+import argparse
+import base64
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), '..')))
+os.chdir(tempfile.mkdtemp())  # encryption.py creates its keys in the working directory
+
+from cryptography.hazmat.backends import default_backend  # noqa: E402
+from cryptography.hazmat.primitives import hashes, serialization  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import padding  # noqa: E402
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes  # noqa: E402
+
+import encryption  # noqa: E402
+from credentials import CredentialCache  # noqa: E402
+
+
+def legacy_encrypt(data):
+    """encrypt_data before the v2 format: a fresh RSA-wrapped AES-CBC key per field"""
+    aes_key, iv = os.urandom(32), os.urandom(16)
+    raw = data.encode('utf-8')
+    pad = 16 - len(raw) % 16
+    encryptor = Cipher(algorithms.AES(aes_key), modes.CBC(iv), backend=default_backend()).encryptor()
+    ciphertext = encryptor.update(raw + bytes([pad]) * pad) + encryptor.finalize()
+    wrapped = encryption.load_public_key().encrypt(aes_key, encryption.OAEP_PADDING)
+    return base64.b64encode(len(wrapped).to_bytes(2, byteorder='big') + wrapped + iv + ciphertext).decode('utf-8')
+
+
+def legacy_decrypt(encrypted_data):
+    """decrypt_data as it was before the key manager: reads and parses the PEM each call"""
+    with open(encryption.RSA_PRIVATE_KEY_FILE, 'rb') as f:
+        private_key = serialization.load_pem_private_key(f.read(), password=None, backend=default_backend())
+    combined = base64.b64decode(encrypted_data.encode('utf-8'))
+    key_length = int.from_bytes(combined[0:2], byteorder='big')
+    aes_key = private_key.decrypt(combined[2:2 + key_length], padding.OAEP(
+        mgf=padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None))
+    iv = combined[2 + key_length:2 + key_length + 16]
+    decryptor = Cipher(algorithms.AES(aes_key), modes.CBC(iv), backend=default_backend()).decryptor()
+    padded = decryptor.update(combined[2 + key_length + 16:]) + decryptor.finalize()
+    return padded[:-padded[-1]].decode('utf-8')
+
+
+def run(name, iterations, fn):
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<32} {iterations / elapsed:10.1f} bundles/s   {elapsed / iterations * 1e6:10.1f} us/bundle")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    values = ('1234567', '0123456789abcdef0123456789abcdef', '1' + 'A' * 352)
+    fields = [legacy_encrypt(value) for value in values]
+    v2_fields = encryption.encrypt_fields(*values)
+    user = SimpleNamespace(id=1, api_id_encrypted=v2_fields[0], api_hash_encrypted=v2_fields[1],
+                           session_string_encrypted=v2_fields[2])
+
+    cache = CredentialCache(ttl=3600)
+
+    print("Decrypting api_id + api_hash + session_string for one user\n")
+    run('per-call PEM parse (before)', args.iterations, lambda: [legacy_decrypt(f) for f in fields])
+    run('cached RSA key', args.iterations, lambda: [encryption.decrypt_data(f) for f in fields])
+    run('v2 envelope, one data key', args.iterations, lambda: encryption.decrypt_fields(*v2_fields))
+    run('credential cache hit', args.iterations * 100, lambda: cache.get(user))
+
+
+if __name__ == '__main__':
+    main()
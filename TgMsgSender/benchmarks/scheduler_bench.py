@@ -0,0 +1,96 @@
+"""
+Scheduler benchmark: how many due tasks can be in flight at once?
+
+Compares the old design (APScheduler's default 10-thread pool, each job
+blocking its thread on run_coroutine_threadsafe(...).result()) with
+AsyncTaskScheduler firing coroutines straight on the loop. Every task
+simulates a fan-out with asyncio.sleep.
+
+    python benchmarks/scheduler_bench.py --tasks 200 --send-seconds 1
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from threading import Thread
+
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), '..')))
+
+from async_scheduler import AsyncTaskScheduler  # noqa: E402
+
+APSCHEDULER_DEFAULT_WORKERS = 10
+
+
+class Probe:
+    """Tracks how many simulated sends overlap"""
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self.done = 0
+
+    async def fake_send(self, seconds):
+        self.current += 1
+        self.peak = max(self.peak, self.current)
+        await asyncio.sleep(seconds)
+        self.current -= 1
+        self.done += 1
+
+
+def bench_thread_pool(tasks, send_seconds):
+    loop = asyncio.new_event_loop()
+    Thread(target=loop.run_forever, daemon=True).start()
+    probe = Probe()
+
+    def job():
+        asyncio.run_coroutine_threadsafe(probe.fake_send(send_seconds), loop).result()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=APSCHEDULER_DEFAULT_WORKERS) as pool:
+        for _ in range(tasks):
+            pool.submit(job)
+    elapsed = time.perf_counter() - start
+    loop.call_soon_threadsafe(loop.stop)
+    return elapsed, probe.peak
+
+
+def bench_async(tasks, send_seconds):
+    probe = Probe()
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        scheduler = AsyncTaskScheduler(loop, run_task=lambda user_id, task_id: probe.fake_send(send_seconds))
+        now = datetime.utcnow()
+        for i in range(tasks):
+            scheduler.add_job(f'task{i}', i, 3600, now)
+        start = time.perf_counter()
+        scheduler.start()
+        while probe.done < tasks:
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        await scheduler.shutdown()
+        return elapsed
+
+    elapsed = asyncio.run(main())
+    return elapsed, probe.peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=200, help='tasks due at the same moment')
+    parser.add_argument('--send-seconds', type=float, default=1.0, help='simulated fan-out duration per task')
+    args = parser.parse_args()
+
+    print(f"{args.tasks} due tasks, {args.send_seconds}s simulated send each\n")
+    for name, bench in (('thread pool + run_async', bench_thread_pool), ('asyncio scheduler', bench_async)):
+        elapsed, peak = bench(args.tasks, args.send_seconds)
+        print(f"{name:<26} drained in {elapsed:7.2f}s   peak in flight: {peak:5d}   "
+              f"throughput: {args.tasks / elapsed:8.1f} tasks/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+Supervisor that owns exactly one chat sync job per logged-in user
+"""
+
+import asyncio
+import random
+from collections import Counter
+from datetime import datetime
+
+
+class _Job:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.task = None
+        self.monitor = None
+        self.state = 'scheduled'
+        self.restarts = 0
+        self.last_error = None
+        self.started_at = datetime.utcnow()
+
+    def to_dict(self):
+        stats = self.monitor.stats.to_dict() if self.monitor else None
+        return {
+            'user_id': self.user_id,
+            'state': self.monitor.state if self.state == 'running' and self.monitor else self.state,
+            'restarts': self.restarts,
+            'last_error': self.last_error,
+            'started_at': self.started_at.isoformat(),
+            'sync': stats,
+        }
+
+
+class ChatSyncSupervisor:
+    """
+    Runs one ChatMonitor per user on `loop`.
+
+    `ensure()` is idempotent, so logging in twice does not start a second
+    loop. Jobs restored together are started at random points over `spread`
+    seconds, at most `max_concurrent` full syncs run at once, and a job that
+    fails with anything but an auth error is restarted with exponential
+    backoff. The public methods may be called from any thread.
+    """
+
+    def __init__(self, loop, make_monitor, max_concurrent=4, spread=300, is_auth_error=None,
+                 on_auth_error=None, retry_delay=60, max_retry_delay=3600, accepts=None):
+        self.loop = loop
+        self.make_monitor = make_monitor  # (user_id, sync_slots) -> ChatMonitor
+        self.max_concurrent = max_concurrent
+        self.spread = spread
+        self.is_auth_error = is_auth_error or (lambda e: False)
+        self.on_auth_error = on_auth_error or (lambda user_id: None)
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.accepts = accepts or (lambda user_id: True)  # False for users another worker monitors
+        self._jobs = {}
+        self._slots = None
+
+    def ensure(self, user_id, jitter=False):
+        """Start the user's job unless one is already running"""
+        self._call(self._ensure, user_id, random.uniform(0, self.spread) if jitter else 0)
+
+    def stop(self, user_id):
+        self._call(self._stop, user_id)
+
+    def restore(self, user_ids):
+        """Run jobs for exactly these users (if accepted), spreading new ones over `spread` seconds"""
+        self._call(self._restore, list(user_ids))
+
+    def jobs(self):
+        return [job.to_dict() for job in list(self._jobs.values())]
+
+    def summary(self):
+        return dict(Counter(job['state'] for job in self.jobs()))
+
+    async def shutdown(self):
+        tasks = [job.task for job in self._jobs.values() if job.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # --- Internals (loop thread only) ---
+    def _call(self, fn, *args):
+        try:
+            on_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            on_loop = False
+
+        if on_loop:
+            fn(*args)
+        else:
+            self.loop.call_soon_threadsafe(fn, *args)
+
+    def _ensure(self, user_id, delay):
+        if not self.accepts(user_id):
+            return
+        job = self._jobs.get(user_id)
+        if job is not None and job.task is not None and not job.task.done():
+            return
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        job = _Job(user_id)
+        job.task = self.loop.create_task(self._run(job, delay))
+        self._jobs[user_id] = job
+
+    def _stop(self, user_id):
+        job = self._jobs.pop(user_id, None)
+        if job is not None and job.task is not None:
+            job.task.cancel()
+
+    def _restore(self, user_ids):
+        wanted = {user_id for user_id in user_ids if self.accepts(user_id)}
+        for user_id in list(self._jobs):
+            if user_id not in wanted:
+                self._stop(user_id)
+        for user_id in wanted:
+            self._ensure(user_id, random.uniform(0, self.spread))
+
+    async def _run(self, job, delay):
+        try:
+            if delay:
+                job.state = 'scheduled'
+                await asyncio.sleep(delay)
+
+            failures = 0
+            while True:
+                job.monitor = self.make_monitor(job.user_id, self._slots)
+                job.state = 'running'
+                try:
+                    await job.monitor.run()
+                    job.state = 'stopped'  # the user logged out
+                    return
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    job.last_error = f"{e.__class__.__name__}: {e}"
+                    if self.is_auth_error(e):
+                        job.state = 'failed'
+                        print(f"Chat sync for user {job.user_id} stopped: {e}")
+                        self.on_auth_error(job.user_id)
+                        return
+
+                failures += 1
+                job.restarts += 1
+                job.state = 'backoff'
+                wait = min(self.max_retry_delay, self.retry_delay * 2 ** (failures - 1)) * random.uniform(1, 1.2)
+                print(f"Chat sync for user {job.user_id} failed ({job.last_error}), retrying in {wait:.0f}s")
+                await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            job.state = 'cancelled'
+            raise
@@ -0,0 +1,133 @@
+"""
+Bulk synchronisation of a user's dialogs into the user_chats table
+"""
+
+from datetime import datetime
+
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import UserChat
+
+_UPSERTS = {'sqlite': sqlite_insert, 'postgresql': postgresql_insert}
+
+
+class ChatSyncEngine:
+    """
+    Applies the difference between a user's current dialogs and their stored
+    user_chats in a handful of statements instead of one query per dialog.
+
+    Stored chats are loaded once, the diff is computed in memory, new and
+    changed rows are written with multi-row INSERT ... ON CONFLICT DO UPDATE
+    (SQLite and Postgres; other databases fall back to the ORM) and vanished
+    chats are deactivated with one UPDATE per batch.
+    """
+
+    DIFF_KEYS = ('inserted', 'renamed', 'retyped', 'reactivated', 'deactivated', 'unchanged')
+
+    def __init__(self, batch_size=100):
+        self.batch_size = batch_size
+        self.syncs = 0
+        self.totals = dict.fromkeys(self.DIFF_KEYS, 0)
+        self.last = None
+
+    def sync(self, db, user_id, chats):
+        """
+        Make user_chats match `chats` ([{'id', 'name', 'type'}]) for one user.
+        Returns the diff sizes. The caller commits.
+        """
+        existing = self._load(db, user_id)
+        seen = {chat['id'] for chat in chats}
+        gone = [chat_id for chat_id, (_, _, is_active) in existing.items() if is_active and chat_id not in seen]
+        return self._apply(db, user_id, existing, chats, gone)
+
+    def apply(self, db, user_id, chats=(), removed=()):
+        """
+        Apply a partial change, e.g. from a single update: upsert `chats` and
+        deactivate the chat ids in `removed`, leaving every other chat alone.
+        """
+        existing = self._load(db, user_id, [chat['id'] for chat in chats] + list(removed))
+        gone = [chat_id for chat_id in removed if chat_id in existing and existing[chat_id][2]]
+        return self._apply(db, user_id, existing, chats, gone)
+
+    def stats(self):
+        return {'syncs': self.syncs, 'totals': dict(self.totals), 'last': self.last}
+
+    def _load(self, db, user_id, chat_ids=None):
+        query = db.query(UserChat.chat_id, UserChat.chat_name, UserChat.chat_type, UserChat.is_active) \
+            .filter(UserChat.user_id == user_id)
+        if chat_ids is not None:
+            query = query.filter(UserChat.chat_id.in_(chat_ids))
+        return {chat_id: (name, chat_type, is_active) for chat_id, name, chat_type, is_active in query}
+
+    def _apply(self, db, user_id, existing, chats, gone):
+        diff = dict.fromkeys(self.DIFF_KEYS, 0)
+        now = datetime.utcnow()
+        upserts = {}
+        for chat in chats:
+            current = existing.get(chat['id'])
+            if current is None:
+                diff['inserted'] += 1
+            else:
+                name, chat_type, is_active = current
+                changed = False
+                if name != chat['name']:
+                    diff['renamed'] += 1
+                    changed = True
+                if chat_type != chat['type']:
+                    diff['retyped'] += 1
+                    changed = True
+                if not is_active:
+                    diff['reactivated'] += 1
+                    changed = True
+                if not changed:
+                    diff['unchanged'] += 1
+                    continue
+            upserts[chat['id']] = {
+                'user_id': user_id, 'chat_id': chat['id'], 'chat_name': chat['name'], 'chat_type': chat['type'],
+                'is_active': True, 'last_checked': now, 'created_at': now, 'updated_at': now,
+            }
+        diff['deactivated'] = len(gone)
+
+        self._upsert(db, list(upserts.values()))
+        for batch in self._batches(gone):
+            db.execute(update(UserChat)
+                       .where(UserChat.user_id == user_id, UserChat.chat_id.in_(batch))
+                       .values(is_active=False, updated_at=now))
+
+        self.syncs += 1
+        self.last = diff
+        for key, count in diff.items():
+            self.totals[key] += count
+        return diff
+
+    def _upsert(self, db, rows):
+        if not rows:
+            return
+        dialect_insert = _UPSERTS.get(db.get_bind().dialect.name)
+        if dialect_insert is None:
+            for row in rows:
+                chat = db.query(UserChat).filter_by(user_id=row['user_id'], chat_id=row['chat_id']).first()
+                if chat is None:
+                    db.add(UserChat(**row))
+                else:
+                    chat.chat_name, chat.chat_type, chat.is_active = row['chat_name'], row['chat_type'], True
+            return
+
+        for batch in self._batches(rows):
+            stmt = dialect_insert(UserChat.__table__).values(batch)
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=['user_id', 'chat_id'],
+                set_={
+                    'chat_name': stmt.excluded.chat_name,
+                    'chat_type': stmt.excluded.chat_type,
+                    'is_active': True,
+                    'last_checked': stmt.excluded.last_checked,
+                    'updated_at': stmt.excluded.updated_at,
+                }
+            ))
+
+    def _batches(self, items):
+        for start in range(0, len(items), self.batch_size):
+            yield items[start:start + self.batch_size]
@@ -0,0 +1,304 @@
+"""
+Check that the app's queries use indexes instead of scanning whole tables.
+
+Builds a throwaway SQLite database with the current schema and some data,
+then drives main_app.py (web routes through Flask's test client, the send
+path, chat sync, history retention and startup jobs) and telegram_bot_updated.py (the command
+and menu handlers, with stand-in Telegram objects) while recording every
+statement they send. Each distinct statement is run again under
+EXPLAIN QUERY PLAN; any plan step that is a full table scan fails the check,
+unless the code that issued it is listed in ALLOWED_SCANS because it has to
+read the whole table (admin listings, startup rebuilds).
+
+Nothing talks to Telegram; sends and logouts fail early on the fake
+credentials, as they would with a revoked session.
+
+    python check_query_plans.py
+    python check_query_plans.py --verbose
+
+tests/test_query_plans.py runs it, so a new scan fails the test suite.
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import sys
+import tempfile
+import traceback
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+DB_DIR = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(DB_DIR, 'plans.db')}"
+os.environ['TELEGRAM_BOT_TOKEN'] = ''
+os.environ.pop('SCHEDULER_SHARDS', None)
+os.environ.pop('TASK_COUNTERS', None)
+sys.path.insert(0, HERE)
+
+from sqlalchemy import event, insert  # noqa: E402
+
+import database  # noqa: E402
+from database import SessionLocal, Task, TaskExecution, User, UserChat  # noqa: E402
+from task_targets import set_task_targets  # noqa: E402
+
+# (file, function) -> why a full scan is fine there; matched against every
+# frame of the code that issued the statement
+ALLOWED_SCANS = {
+    ('main_app.py', 'get_admin_users'): 'lists every user',
+    ('main_app.py', 'get_admin_stats'): 'counts every user and task',
+    ('main_app.py', 'restore_scheduled_tasks'): 'runs once at startup',
+    ('main_app.py', 'restore_chat_monitors'): 'runs once at startup',
+    ('task_stats.py', 'rebuild'): 'recounts every task at startup',
+}
+
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+SKIP = ('PRAGMA', 'CREATE', 'DROP', 'ALTER', 'SAVEPOINT', 'RELEASE', 'ROLLBACK', 'BEGIN', 'COMMIT')
+
+ADMIN_TELEGRAM_ID = 5000
+USER_TELEGRAM_ID = 5001
+
+
+def seed():
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        db.execute(insert(User), [
+            {'id': 1, 'telegram_id': ADMIN_TELEGRAM_ID, 'phone': '+10001', 'username': 'admin', 'is_admin': True,
+             'is_bot_authorized': True, 'api_id_encrypted': 'x', 'api_hash_encrypted': 'x'},
+            {'id': 2, 'telegram_id': USER_TELEGRAM_ID, 'phone': '+10002', 'username': 'someone',
+             'is_bot_authorized': True, 'api_id_encrypted': 'x', 'api_hash_encrypted': 'x'},
+        ])
+        db.execute(insert(UserChat), [
+            {'user_id': user_id, 'chat_id': -100 - n, 'chat_name': f'chat {n}',
+             'chat_type': 'supergroup' if n % 2 else 'group', 'is_active': True}
+            for user_id in (1, 2) for n in range(20)])
+        db.commit()
+        tasks = []
+        for user_id in (1, 2):
+            for n, status in enumerate(['active'] * 15 + ['paused'] * 3 + ['archived'] * 2):
+                task = Task(id=f'u{user_id}t{n}', user_id=user_id, name=f'task {n}', message='hello',
+                            status=status, interval_value=3600, interval_unit='seconds',
+                            next_run=now + timedelta(hours=1) if status == 'active' else None,
+                            created_at=now - timedelta(minutes=n), updated_at=now - timedelta(minutes=n))
+                set_task_targets(task, [-100, -101, -102])
+                tasks.append(task)
+        db.add_all(tasks)
+        db.commit()
+        # Recent rows, rows due to be rolled up, and rows whose hourly rollups are due to be pruned
+        db.execute(insert(TaskExecution), [
+            {'task_id': 'u2t0', 'execution_time': now - timedelta(hours=h), 'status': 'success',
+             'total_chats': 3, 'successful_chats': 3, 'failed_chats': 0} for h in (0, 1, 2, 240, 2400)])
+        db.commit()
+    finally:
+        db.close()
+
+
+class Recorder:
+    """Collects distinct statements with their parameters and where they came from"""
+
+    def __init__(self):
+        self.statements = {}  # statement -> (parameters, [origin, ...])
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(SKIP) or conn.info.get('explaining'):
+            return
+        if executemany and parameters and isinstance(parameters[0], (tuple, list, dict)):
+            parameters = parameters[0]
+        frames = tuple((os.path.basename(f.filename), f.name) for f in traceback.extract_stack()
+                       if os.path.isabs(f.filename) and os.path.dirname(os.path.realpath(f.filename)) == HERE
+                       and os.path.basename(f.filename) != os.path.basename(__file__))
+        _, origins = self.statements.setdefault(statement, (parameters, []))
+        if frames and frames not in origins:
+            origins.append(frames)
+
+
+def fake_update(telegram_id, data=None, text=None):
+    async def ignore(*args, **kwargs):
+        return None
+
+    callback_query = SimpleNamespace(data=data, answer=ignore, edit_message_text=ignore) if data else None
+    return SimpleNamespace(effective_user=SimpleNamespace(id=telegram_id, first_name='Check'),
+                           effective_chat=SimpleNamespace(id=telegram_id),
+                           message=SimpleNamespace(text=text, reply_text=ignore),
+                           callback_query=callback_query)
+
+
+def fake_context(args=()):
+    async def ignore(*a, **kwargs):
+        return None
+
+    return SimpleNamespace(bot=SimpleNamespace(send_message=ignore), args=list(args), user_data={})
+
+
+def drive_web(main_app):
+    client = main_app.app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = ADMIN_TELEGRAM_ID
+
+    for url in ['/api/user/info', '/api/chats', '/api/chats?q=chat&type=group', '/api/chats?limit=5',
+                '/api/tasks', '/api/tasks?status=paused', '/api/tasks?q=task&chat=-100', '/api/tasks?limit=5',
+                '/api/tasks/archived', '/api/tasks/archived?limit=1', '/api/tasks/u1t0', '/api/stats',
+                '/api/settings/notifications', '/api/settings/simplified_login',
+                '/api/admin/stats', '/api/admin/users', '/api/admin/tasks/2', '/api/admin/tasks/2?status=active']:
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+        cursor = (response.get_json() or {}).get('next_cursor')
+        if cursor:
+            client.get(f"{url}{'&' if '?' in url else '?'}cursor={cursor}")
+
+    for url in ['/api/tasks/u1t1/pause', '/api/tasks/u1t1/resume', '/api/tasks/u1t2/archive',
+                '/api/tasks/u1t2/unarchive']:
+        assert client.post(url).status_code == 200, url
+    assert client.delete('/api/tasks/u1t3').status_code == 200
+    form = {'chat_ids': '-100,-101', 'task_name': 'new', 'message': 'hi', 'interval_unit': 'hours',
+            'interval_value': '1', 'final_order': '[]'}
+    assert client.post('/api/schedule', data=form).status_code == 200
+    assert client.post('/api/tasks/u1t4/update', data=form).status_code == 200
+    assert client.post('/api/settings/notifications', json={'enabled': True}).status_code == 200
+    assert client.post('/api/settings/simplified_login', json={'enabled': True}).status_code == 200
+
+
+def drive_background(main_app):
+    from task_stats import TaskCounters
+
+    main_app.restore_scheduled_tasks()
+    main_app.ensure_task_targets()
+    main_app.restore_chat_monitors()
+
+    counters = TaskCounters(SessionLocal)
+    counters.rebuild()
+    counters.apply(2, {'active_tasks': 1, 'total_tasks': 1})
+    db = SessionLocal()
+    try:
+        counters.get(db, 2)
+    finally:
+        db.close()
+
+    def dialog(chat_id, name, megagroup):
+        return SimpleNamespace(id=chat_id, name=name, is_group=True,
+                               entity=SimpleNamespace(megagroup=megagroup, banned_rights=None, migrated_to=None))
+
+    class Client:
+        async def get_dialogs(self):
+            # -100 and -200 share a name: the basic group is retargeted to the supergroup
+            return [dialog(-100, 'chat 0', False), dialog(-200, 'chat 0', True), dialog(-101, 'chat 1', True),
+                    dialog(-300, 'new chat', False)]
+
+    db = SessionLocal()
+    try:
+        main_app.run_async(main_app.update_user_chats(2, Client(), db))
+    finally:
+        db.close()
+
+    main_app.run_async(main_app.send_scheduled_message(2, 'u2t5'))
+    main_app.run_async(main_app.execution_writer.close())
+    main_app.run_async(main_app.execution_retention.run_once())
+    main_app.load_user_credentials(2)
+    main_app.invalidate_user_session_by_id(2)
+
+
+def drive_bot(bot):
+    async def run():
+        bot.user_cache._followed_at = float('-inf')  # let the first lookup ask what changed
+        for telegram_id in (ADMIN_TELEGRAM_ID, USER_TELEGRAM_ID, 1):
+            await bot.start_command(fake_update(telegram_id), fake_context())
+            await bot.help_command(fake_update(telegram_id), fake_context())
+        for data in ('menu_tasks', 'menu_archived', 'menu_stats', 'menu_settings', 'menu_admin', 'menu_main'):
+            await bot.menu_handler(fake_update(ADMIN_TELEGRAM_ID, data=data), fake_context())
+        await bot.view_tasks(fake_update(ADMIN_TELEGRAM_ID), fake_context())
+        await bot.view_archived_tasks(fake_update(ADMIN_TELEGRAM_ID), fake_context())
+        db = SessionLocal()
+        try:
+            boundaries = [(kind, bot.TASK_LISTS[kind][1], db.get(Task, task_id))
+                          for kind, task_id in (('tasks', 'u1t9'), ('archived', 'u1t18'))]
+        finally:
+            db.close()
+        for kind, column, task in boundaries:
+            for direction in ('next', 'prev'):
+                data = bot.page_callback(kind, direction, task, column)
+                await bot.task_page(fake_update(ADMIN_TELEGRAM_ID, data=data), fake_context())
+        await bot.view_stats(fake_update(ADMIN_TELEGRAM_ID), fake_context())
+        await bot.language_menu(fake_update(ADMIN_TELEGRAM_ID, data='set_lang_menu'), fake_context())
+        await bot.set_language(fake_update(ADMIN_TELEGRAM_ID, data='set_lang_ru'), fake_context())
+        await bot.toggle_notifications(fake_update(ADMIN_TELEGRAM_ID, data='toggle_notif'), fake_context())
+        await bot.toggle_simplified_login(fake_update(ADMIN_TELEGRAM_ID, data='toggle_simplified_login'),
+                                          fake_context())
+        context = fake_context(['@someone'])
+        await bot.admin_command(fake_update(ADMIN_TELEGRAM_ID, text='/admin @someone'), context)
+        context.user_data['target_user_id'] = 2
+        await bot.receive_admin_password(fake_update(ADMIN_TELEGRAM_ID, text=bot.ADMIN_PASSWORD), context)
+
+    bot.ADMIN_PASSWORD = bot.ADMIN_PASSWORD or 'check'
+    asyncio.run(run())
+
+
+def explain(statement, parameters):
+    with database.engine.connect() as conn:
+        conn.info['explaining'] = True
+        try:
+            return [row[-1] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+        finally:
+            conn.info.pop('explaining', None)
+
+
+def allowed(origins):
+    """The reason every caller of a statement may scan, or None"""
+    reasons = []
+    for frames in origins:
+        reason = next((ALLOWED_SCANS[frame] for frame in frames if frame in ALLOWED_SCANS), None)
+        if reason is None:
+            return None
+        reasons.append(reason)
+    return reasons[0] if reasons else None
+
+
+def describe(frames):
+    return ' > '.join(f'{file}:{function}' for file, function in frames[-3:])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--verbose', action='store_true', help='print the plan of every statement')
+    args = parser.parse_args()
+
+    database.init_db()
+    seed()
+    recorder = Recorder()
+    event.listen(database.engine, 'before_cursor_execute', recorder)
+
+    import main_app
+    import telegram_bot_updated
+    drive_web(main_app)
+    drive_bot(telegram_bot_updated)
+    drive_background(main_app)
+    event.remove(database.engine, 'before_cursor_execute', recorder)
+
+    failures = allowed_count = 0
+    for statement, (parameters, origins) in recorder.statements.items():
+        plan = explain(statement, parameters)
+        scans = [m.group(1) for m in map(FULL_SCAN.match, plan) if m]
+        reason = allowed(origins) if scans else None
+        if scans and reason is None:
+            failures += 1
+        elif scans:
+            allowed_count += 1
+        if (scans and reason is None) or args.verbose:
+            print(('FULL SCAN of ' + ', '.join(scans) if scans and reason is None
+                   else f'ok ({reason})' if scans else 'ok') + ':')
+            print('  ' + ' '.join(statement.split()))
+            for frames in origins:
+                print(f'  from {describe(frames)}')
+            for step in plan:
+                print(f'  | {step}')
+            print()
+
+    print(f"{len(recorder.statements)} distinct statements, {allowed_count} allowed full scans, "
+          f"{failures} unexpected full scans")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
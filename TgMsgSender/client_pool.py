@@ -0,0 +1,245 @@
+"""
+Pool of connected Telethon clients, one per user, living on the main event loop
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from telethon import TelegramClient
+from telethon.sessions import StringSession
+
+
+class _PoolEntry:
+    """A pooled client together with its bookkeeping"""
+
+    def __init__(self, client, session_string):
+        self.client = client
+        self.session_string = session_string
+        self.connecting = None  # Future resolved once the first connect() finishes
+        self.in_use = 0
+        self.pinned = False  # held open by a long-lived follower, counted against max_followers
+        self.last_used = time.monotonic()
+
+
+class TelegramClientPool:
+    """
+    Hands out warm, already-connected clients keyed by user id.
+
+    All state is owned by `loop`; acquire/release must run on it. Only
+    `discard()` and `stats()` may be called from other threads.
+
+    A borrower that keeps its client for hours (a chat monitor following
+    updates) pins it. Pinned clients count against `max_followers` instead of
+    `max_clients`, so short borrows (sends, refreshes, logins) always find
+    room once the clients ahead of them are released.
+    """
+
+    def __init__(self, loop, max_clients=200, idle_ttl=900, is_auth_error=None, max_followers=200):
+        self.loop = loop
+        self.max_clients = max_clients
+        self.max_followers = max_followers
+        self.idle_ttl = idle_ttl
+        self.is_auth_error = is_auth_error or (lambda e: False)
+        self._entries = OrderedDict()
+        self._retired = {}  # client -> entry, dropped while still borrowed
+        self._released = None
+        self._reaper = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.discards = 0
+
+    @asynccontextmanager
+    async def client(self, user_id, api_id, api_hash, session_string):
+        """Borrow a connected client for `user_id`; auth errors drop it from the pool"""
+        client = await self.acquire(user_id, api_id, api_hash, session_string)
+        try:
+            yield client
+        except Exception as e:
+            if self.is_auth_error(e):
+                self.discard(user_id)
+            raise
+        finally:
+            await self.release(user_id, client)
+
+    async def acquire(self, user_id, api_id, api_hash, session_string):
+        """Return a connected client, reusing the pooled one when possible"""
+        self._start_reaper()
+        while True:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry.session_string != session_string:
+                # User logged in again, the old session is stale
+                self._drop(user_id)
+                self.evictions += 1
+                continue
+
+            if entry is not None:
+                if entry.connecting is not None:
+                    await asyncio.shield(entry.connecting)
+                    continue
+                if entry.client.is_connected():
+                    entry.in_use += 1
+                    entry.last_used = time.monotonic()
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    return entry.client
+                self._drop(user_id)
+                continue
+
+            await self._make_room()
+            if user_id in self._entries:
+                continue
+
+            self.misses += 1
+            client = TelegramClient(StringSession(session_string), api_id, api_hash, loop=self.loop)
+            entry = _PoolEntry(client, session_string)
+            entry.connecting = self.loop.create_future()
+            entry.in_use = 1
+            self._entries[user_id] = entry
+            try:
+                await client.connect()
+            except BaseException:
+                if self._entries.get(user_id) is entry:
+                    del self._entries[user_id]
+                    self.loop.create_task(self._notify_released())
+                raise
+            finally:
+                # Wake up waiters; on failure they will find no entry and retry
+                entry.connecting.set_result(None)
+                entry.connecting = None
+            return client
+
+    async def release(self, user_id, client):
+        """Give a client back to the pool"""
+        entry = self._entries.get(user_id)
+        if entry is None or entry.client is not client:
+            # Entry was dropped while borrowed; disconnect once nobody uses it
+            entry = self._retired.get(client)
+            if entry is not None:
+                entry.in_use -= 1
+                if entry.in_use <= 0:
+                    del self._retired[client]
+                    await self._disconnect(client)
+            return
+        entry.in_use -= 1
+        entry.last_used = time.monotonic()
+        await self._notify_released()
+
+    def pin(self, user_id, client):
+        """Mark a borrowed client as held long-term; False if every follower slot is taken"""
+        entry = self._entries.get(user_id)
+        if entry is None or entry.client is not client:
+            return False
+        if not entry.pinned:
+            if self._followers() >= self.max_followers:
+                return False
+            entry.pinned = True
+            # It no longer takes up one of the max_clients slots
+            self.loop.create_task(self._notify_released())
+        return True
+
+    def unpin(self, user_id, client):
+        entry = self._entries.get(user_id)
+        if entry is not None and entry.client is client:
+            entry.pinned = False
+
+    def discard(self, user_id):
+        """Drop a user's client, e.g. after an auth error. Safe from any thread."""
+        try:
+            on_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            on_loop = False
+
+        if on_loop:
+            self._discard(user_id)
+        else:
+            self.loop.call_soon_threadsafe(self._discard, user_id)
+
+    def stats(self):
+        """Counters for monitoring"""
+        return {
+            'open': len(self._entries),
+            'in_use': sum(1 for e in list(self._entries.values()) if e.in_use),
+            'followers': self._followers(),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'discards': self.discards,
+        }
+
+    async def close(self):
+        """Disconnect every pooled client"""
+        if self._reaper:
+            self._reaper.cancel()
+            self._reaper = None
+        for user_id in list(self._entries):
+            entry = self._entries.pop(user_id)
+            await self._disconnect(entry.client)
+        for client in list(self._retired):
+            del self._retired[client]
+            await self._disconnect(client)
+
+    # --- Internals ---
+    def _discard(self, user_id):
+        if user_id in self._entries:
+            # Borrowers still holding the client finish with it; it disconnects on the last release
+            self._drop(user_id)
+            self.discards += 1
+            self.loop.create_task(self._notify_released())
+
+    def _drop(self, user_id):
+        entry = self._entries.pop(user_id)
+        if entry.in_use == 0:
+            self.loop.create_task(self._disconnect(entry.client))
+        else:
+            self._retired[entry.client] = entry
+
+    def _followers(self):
+        return sum(1 for e in list(self._entries.values()) if e.pinned)
+
+    async def _make_room(self):
+        if self._released is None:
+            self._released = asyncio.Condition()
+        async with self._released:
+            while len(self._entries) - self._followers() >= self.max_clients:
+                idle = next((uid for uid, e in self._entries.items()
+                             if e.in_use == 0 and e.connecting is None), None)
+                if idle is not None:
+                    self._drop(idle)
+                    self.evictions += 1
+                    continue
+                await self._released.wait()
+
+    async def _notify_released(self):
+        if self._released is None:
+            return
+        async with self._released:
+            self._released.notify_all()
+
+    def _start_reaper(self):
+        if self._reaper is None or self._reaper.done():
+            self._reaper = self.loop.create_task(self._reap_idle())
+
+    async def _reap_idle(self):
+        interval = max(5, self.idle_ttl / 2)
+        while True:
+            await asyncio.sleep(interval)
+            cutoff = time.monotonic() - self.idle_ttl
+            reaped = 0
+            for user_id, entry in list(self._entries.items()):
+                if entry.in_use == 0 and entry.connecting is None and entry.last_used < cutoff:
+                    self._drop(user_id)
+                    reaped += 1
+            self.evictions += reaped
+            if reaped:
+                await self._notify_released()
+
+    @staticmethod
+    async def _disconnect(client):
+        try:
+            if client.is_connected():
+                await client.disconnect()
+        except Exception as e:
+            print(f"Error disconnecting pooled client: {e}")
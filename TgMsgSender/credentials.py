@@ -0,0 +1,59 @@
+"""
+Bounded, short-lived cache of decrypted Telegram credentials per user
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from encryption import decrypt_fields
+
+
+class CredentialCache:
+    """
+    Maps user id -> (api_id, api_hash, session_string).
+
+    Entries remember the ciphertexts they were decrypted from, so a user row
+    with new credentials is never served a stale bundle even before the
+    explicit invalidate() call.
+    """
+
+    def __init__(self, max_entries=1000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user_id -> (ciphertexts, expires_at, bundle)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user):
+        """Decrypted credentials of a User row; raises like decrypt_fields on bad ciphertext"""
+        ciphertexts = (user.api_id_encrypted, user.api_hash_encrypted, user.session_string_encrypted)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user.id)
+            if entry and entry[0] == ciphertexts and entry[1] > now:
+                self._entries.move_to_end(user.id)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        api_id, api_hash, session_string = decrypt_fields(*ciphertexts)
+        bundle = (int(api_id), api_hash, session_string)
+        with self._lock:
+            self._entries[user.id] = (ciphertexts, now + self.ttl, bundle)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return bundle
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,48 @@
+"""
+Versions behind the ETags of the polled read endpoints, read from the database
+"""
+
+import hashlib
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from database import Task, TaskCounter, TaskExecution, User, UserChat
+
+
+def _summary(model, *where):
+    """Row count and latest updated_at: an insert or a delete changes the first, an update the second"""
+    return [select(func.count()).select_from(model).where(*where),
+            select(func.max(model.updated_at)).where(*where)]
+
+
+def _parts(scope, user_id):
+    if scope == 'users':
+        return _summary(User) + [select(func.count()).select_from(Task)]  # task_count of every user
+    if scope == 'chats':
+        return _summary(UserChat, UserChat.user_id == user_id)
+    parts = _summary(Task, Task.user_id == user_id)
+    if scope == 'stats':
+        # Execution rows are written in batches, after the task row
+        parts += [select(TaskCounter.updated_at).where(TaskCounter.user_id == user_id),
+                  select(func.max(TaskExecution.id)).join(Task, Task.id == TaskExecution.task_id)
+                  .where(Task.user_id == user_id)]
+    return parts
+
+
+def data_version(db, scope, user_id=None):
+    """
+    Opaque version of what a read endpoint shows: the 'tasks', 'chats' or
+    'stats' of `user_id`, or the admin's 'users' list. It is derived from the
+    rows themselves, so changes made by the bot, other web workers or
+    scheduler shards count as well as this process's own.
+
+    Read it before running the queries a response is built from, so an ETag
+    can only ever be older than the data it is sent with.
+    """
+    summary = db.execute(select(*(part.scalar_subquery() for part in _parts(scope, user_id)))).one()
+    # Whose data it is goes into the hash too: two users with equal counts and times differ
+    row = (scope, user_id) + tuple(summary)
+    if scope == 'stats':
+        row += (datetime.utcnow().date(),)  # the history window starts at midnight UTC
+    return f"{scope}-{hashlib.blake2b(repr(row).encode(), digest_size=8).hexdigest()}"
@@ -1,8 +1,8 @@
 import os
 from datetime import datetime
 
-from sqlalchemy import (create_engine, Column, Integer, String, Boolean,
-                        DateTime, Text, ForeignKey, JSON)
+from sqlalchemy import (create_engine, event, Column, Integer, BigInteger, String, Boolean,
+                        DateTime, Text, ForeignKey, JSON, LargeBinary, UniqueConstraint, Index)
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
 
 # Use declarative_base for modern SQLAlchemy
@@ -10,11 +10,48 @@ Base = declarative_base()
 
 # Database setup
 DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///telegram_scheduler.db')
-connect_args = {}
-if 'sqlite' in DATABASE_URL:
-    connect_args = {'check_same_thread': False}
-
-engine = create_engine(DATABASE_URL, echo=False, connect_args=connect_args)
+# 'tuned' applies the settings below; 'plain' leaves SQLAlchemy's and the database's defaults
+DB_ENGINE_PROFILE = os.getenv('DB_ENGINE_PROFILE', 'tuned')
+
+# SQLite: WAL lets the web threads read while the scheduler writes, and a busy
+# timeout makes writers wait for each other instead of failing with "database is locked"
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': -int(os.getenv('SQLITE_CACHE_SIZE_KB', 64 * 1024)),  # negative = KiB, not pages
+}
+
+# Postgres connection pool, per process
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 20))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 30000))
+
+
+def make_engine(url, profile='tuned'):
+    """Engine for `url` with the given profile ('tuned' or 'plain')"""
+    if 'sqlite' in url:
+        engine = create_engine(url, echo=False, connect_args={'check_same_thread': False})
+        if profile == 'tuned':
+            @event.listens_for(engine, 'connect')
+            def set_sqlite_pragmas(dbapi_connection, connection_record):
+                cursor = dbapi_connection.cursor()
+                for name, value in SQLITE_PRAGMAS.items():
+                    cursor.execute(f'PRAGMA {name}={value}')
+                cursor.close()
+        return engine
+
+    if profile == 'tuned' and url.startswith('postgresql'):
+        return create_engine(url, echo=False, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                             pool_timeout=DB_POOL_TIMEOUT, pool_recycle=DB_POOL_RECYCLE, pool_pre_ping=True,
+                             connect_args={'options': f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'})
+    return create_engine(url, echo=False)
+
+
+engine = make_engine(DATABASE_URL, DB_ENGINE_PROFILE)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
@@ -34,7 +71,7 @@ class User(Base):
     telegram_id = Column(Integer, unique=True, index=True, nullable=False)
     phone = Column(String(50), unique=True, index=True)
     first_name = Column(String(255))
-    username = Column(String(255), nullable=True)
+    username = Column(String(255), nullable=True, index=True)
     api_id_encrypted = Column(Text, nullable=False)
     api_hash_encrypted = Column(Text, nullable=False)
     session_string_encrypted = Column(Text, nullable=True)
@@ -44,15 +81,23 @@ class User(Base):
     is_admin = Column(Boolean, default=False)
     language = Column(String(5), default='en', nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     last_login = Column(DateTime, nullable=True)
 
     tasks = relationship("Task", back_populates="user", cascade="all, delete-orphan")
     chats = relationship("UserChat", back_populates="user", cascade="all, delete-orphan")
+    uploaded_media = relationship("UploadedMedia", cascade="all, delete-orphan")
 
 
 class Task(Base):
     __tablename__ = 'tasks'
+    __table_args__ = (
+        # Keyset pagination of the task lists: newest first, per user
+        Index('ix_tasks_user_created', 'user_id', 'created_at', 'id'),
+        Index('ix_tasks_user_status_updated', 'user_id', 'status', 'updated_at', 'id'),
+        # The same lists filtered by ?status=
+        Index('ix_tasks_user_status_created', 'user_id', 'status', 'created_at', 'id'),
+    )
 
     id = Column(String(32), primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -73,14 +118,23 @@ class Task(Base):
     file_paths = Column(JSON, nullable=True)
     chat_ids = Column(JSON, nullable=False)
 
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # NOT NULL: the task lists page on them
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
     user = relationship("User", back_populates="tasks")
+    # History is removed with one DELETE by the code deleting a task, not row by row through the ORM
+    executions = relationship("TaskExecution", cascade="all, delete-orphan", passive_deletes=True)
+    execution_rollups = relationship("ExecutionRollup", cascade="all, delete-orphan", passive_deletes=True)
+    targets = relationship("TaskTarget", cascade="all, delete-orphan", order_by="TaskTarget.position")
 
 
 class UserChat(Base):
     __tablename__ = 'user_chats'
+    __table_args__ = (
+        Index('uq_user_chats_user_chat', 'user_id', 'chat_id', unique=True),
+        Index('ix_user_chats_user_active', 'user_id', 'is_active', 'id'),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
@@ -100,12 +154,91 @@ class TaskExecution(Base):
 
     id = Column(Integer, primary_key=True)
     task_id = Column(String(32), ForeignKey('tasks.id'), nullable=False, index=True)
-    execution_time = Column(DateTime, default=datetime.utcnow)
+    execution_time = Column(DateTime, default=datetime.utcnow, index=True)
     status = Column(String(20))  # e.g., 'success', 'partial_failure', 'total_failure'
     total_chats = Column(Integer)
     successful_chats = Column(Integer)
     failed_chats = Column(Integer)
     error_message = Column(Text, nullable=True)
+    chat_results = Column(JSON, nullable=True)  # [{'chat_id', 'ok', 'error'}], error is the exception class
+
+
+class ExecutionRollup(Base):
+    """Totals of one task's task_executions rows for an hour or a day, kept by execution_retention"""
+    __tablename__ = 'execution_rollups'
+    __table_args__ = (
+        UniqueConstraint('task_id', 'period', 'period_start', name='uq_execution_rollups_task_period'),
+        Index('ix_execution_rollups_user_period', 'user_id', 'period', 'period_start'),
+        Index('ix_execution_rollups_period', 'period', 'period_start'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(String(32), ForeignKey('tasks.id'), nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)  # the task's, so user stats need no join
+    period = Column(String(4), nullable=False)  # 'hour' or 'day'
+    period_start = Column(DateTime, nullable=False)
+    runs = Column(Integer, default=0, nullable=False)
+    successful_chats = Column(Integer, default=0, nullable=False)
+    failed_chats = Column(Integer, default=0, nullable=False)
+
+
+class TaskTarget(Base):
+    """One chat a task sends to; mirrors Task.chat_ids so tasks can be looked up by chat"""
+    __tablename__ = 'task_targets'
+    __table_args__ = (UniqueConstraint('task_id', 'chat_id', name='uq_task_targets_task_chat'),)
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(String(32), ForeignKey('tasks.id'), nullable=False)
+    chat_id = Column(BigInteger, nullable=False, index=True)
+    position = Column(Integer, nullable=False)
+
+
+class TaskCounter(Base):
+    """Running task stats of one user (user_id 0 = all users), kept by task_stats.TaskCounters"""
+    __tablename__ = 'task_counters'
+
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    total_tasks = Column(Integer, default=0, nullable=False)
+    active_tasks = Column(Integer, default=0, nullable=False)
+    paused_tasks = Column(Integer, default=0, nullable=False)
+    archived_tasks = Column(Integer, default=0, nullable=False)
+    total_executions = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class UploadedMedia(Base):
+    """Telegram-side reference to a file a user's account has already uploaded"""
+    __tablename__ = 'uploaded_media'
+    __table_args__ = (UniqueConstraint('user_id', 'file_hash', name='uq_uploaded_media_user_file'),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    file_hash = Column(String(64), nullable=False)  # sha256 of the file content
+    media_type = Column(String(20), nullable=False)  # 'photo' or 'document'
+    media_id = Column(BigInteger, nullable=False)
+    access_hash = Column(BigInteger, nullable=False)
+    file_reference = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used = Column(DateTime, default=datetime.utcnow)
+
+
+class SchedulerLease(Base):
+    """Which scheduler worker currently owns a shard of the tasks"""
+    __tablename__ = 'scheduler_leases'
+
+    shard = Column(Integer, primary_key=True, autoincrement=False)
+    worker_id = Column(String(255), nullable=True)
+    expires_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    heartbeat_at = Column(DateTime, nullable=True)
+
+
+class SchedulerWorker(Base):
+    """Liveness record of a scheduler worker, used to compute fair shares of shards"""
+    __tablename__ = 'scheduler_workers'
+
+    worker_id = Column(String(255), primary_key=True)
+    heartbeat_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
 
 
 def init_db():
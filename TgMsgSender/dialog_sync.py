@@ -0,0 +1,238 @@
+"""
+Keeps a user's user_chats current, either by polling get_dialogs() or by
+following Telegram updates with a rare full reconciliation
+"""
+
+import asyncio
+import contextlib
+import random
+import time
+from datetime import datetime, timezone
+
+from telethon import events, utils
+from telethon.errors import RPCError
+from telethon.tl import types
+
+from task_targets import retarget_chat
+
+
+def chat_from_entity(entity):
+    """
+    {'id', 'name', 'type'} for a group the account can still post in, or None.
+    Same rules as the full sync in update_user_chats.
+    """
+    if isinstance(entity, types.Chat):
+        if entity.left or entity.deactivated or entity.migrated_to:
+            return None
+        chat_type = 'group'
+    elif isinstance(entity, types.Channel) and entity.megagroup:
+        if entity.left:
+            return None
+        chat_type = 'supergroup'
+    else:
+        return None
+    if getattr(entity, 'banned_rights', None) and entity.banned_rights.send_messages:
+        return None
+    return {'id': utils.get_peer_id(entity), 'name': (entity.title or '').strip(), 'type': chat_type}
+
+
+class ChatSyncStats:
+    """Per-user cost and freshness counters"""
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.full_syncs = 0  # each one is a get_dialogs() call
+        self.events = 0
+        self.entity_fetches = 0
+        self.rows_changed = 0
+        self.last_full_sync = None
+        self.last_event = None
+        self.last_lag = None  # seconds between an update's date and applying it
+        self.max_lag = None
+
+    def record_lag(self, date):
+        if date is None:
+            return
+        lag = max(0.0, (datetime.now(timezone.utc) - date).total_seconds())
+        self.last_lag = lag
+        self.max_lag = lag if self.max_lag is None else max(self.max_lag, lag)
+
+    def to_dict(self):
+        synced = max(filter(None, (self.last_full_sync, self.last_event)), default=None)
+        return {
+            'mode': self.mode,
+            'full_syncs': self.full_syncs,
+            'events': self.events,
+            'entity_fetches': self.entity_fetches,
+            'rows_changed': self.rows_changed,
+            'last_full_sync': self.last_full_sync.isoformat() if self.last_full_sync else None,
+            'last_event': self.last_event.isoformat() if self.last_event else None,
+            'seconds_since_sync': (datetime.utcnow() - synced).total_seconds() if synced else None,
+            'last_lag': self.last_lag,
+            'max_lag': self.max_lag,
+        }
+
+
+class ChatMonitor:
+    """
+    Keeps one user's chats in sync until the user logs out.
+
+    'poll' mode runs `full_sync` every `poll_interval` seconds. 'incremental'
+    mode runs it once, then keeps the pooled client borrowed (pinned, see
+    TelegramClientPool.pin) and applies chat joins/leaves, title changes,
+    group -> supergroup migrations and banned-rights changes as they arrive;
+    a full sync still runs every `reconcile_interval` seconds to catch
+    anything missed. While the pool has no follower slot left the monitor
+    polls instead and tries again after the next sync.
+    """
+
+    CHECK_INTERVAL = 60
+
+    _CHAT_UPDATES = (types.UpdateChannel, types.UpdateChatDefaultBannedRights)
+
+    def __init__(self, user_id, pool, engine, session_factory, get_credentials, full_sync,
+                 mode='incremental', poll_interval=300, reconcile_interval=6 * 3600, sync_slots=None):
+        self.user_id = user_id
+        self.pool = pool
+        self.engine = engine
+        self.session_factory = session_factory
+        self.get_credentials = get_credentials
+        self.full_sync = full_sync
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self.reconcile_interval = reconcile_interval
+        self.sync_slots = sync_slots  # semaphore shared by all monitors to cap concurrent full syncs
+        self.state = 'starting'
+        self.stats = ChatSyncStats(mode)
+        self._write_lock = asyncio.Lock()  # updates are written in the order they arrived
+
+    async def _credentials(self):
+        # A database read, so on a worker thread like every other query here
+        return await asyncio.get_running_loop().run_in_executor(None, self.get_credentials, self.user_id)
+
+    async def run(self):
+        """Returns once the user has no session any more; Telegram errors propagate"""
+        while True:
+            credentials = await self._credentials()
+            if credentials is None:
+                return
+            async with self.pool.client(self.user_id, *credentials) as client:
+                await self._full_sync(client)
+                if self.mode == 'incremental' and self.pool.pin(self.user_id, client):
+                    self.state = 'following'
+                    try:
+                        await self._follow(client, credentials)
+                    finally:
+                        self.pool.unpin(self.user_id, client)
+                    continue
+            self.state = 'sleeping'
+            # A little jitter keeps monitors that started together from staying in lockstep
+            await asyncio.sleep(self.poll_interval * random.uniform(0.9, 1.1))
+
+    async def _full_sync(self, client):
+        self.state = 'waiting_for_slot'
+        async with self.sync_slots or contextlib.nullcontext():
+            self.state = 'syncing'
+            db = self.session_factory()
+            try:
+                diff = await self.full_sync(self.user_id, client, db)
+            finally:
+                db.close()
+        self.stats.full_syncs += 1
+        self.stats.last_full_sync = datetime.utcnow()
+        if diff:
+            self.stats.rows_changed += sum(count for key, count in diff.items() if key != 'unchanged')
+
+    async def _follow(self, client, credentials):
+        """Apply updates until it is time to reconcile, the client drops or the session changes"""
+        me = await client.get_me(input_peer=True)
+        my_id = me.user_id
+
+        async def on_chat_action(event):
+            mine = event.user_joined or event.user_added or event.user_left or event.user_kicked
+            if not (event.new_title or event.created or self._migration(event)
+                    or (mine and my_id in (event.user_ids or []))):
+                return
+            self.stats.record_lag(event.action_message.date if event.action_message else None)
+            await self._handle(client, event, self._apply_action)
+
+        async def on_raw(update):
+            peer = types.PeerChannel(update.channel_id) if isinstance(update, types.UpdateChannel) else update.peer
+            await self._handle(client, peer, self._refresh)
+
+        handlers = [(on_chat_action, events.ChatAction()), (on_raw, events.Raw(types=self._CHAT_UPDATES))]
+        for callback, event in handlers:
+            client.add_event_handler(callback, event)
+        try:
+            deadline = time.monotonic() + self.reconcile_interval
+            while time.monotonic() < deadline:
+                await asyncio.sleep(min(self.CHECK_INTERVAL, max(0, deadline - time.monotonic())))
+                if not client.is_connected() or await self._credentials() != credentials:
+                    return
+        finally:
+            for callback, event in handlers:
+                client.remove_event_handler(callback, event)
+
+    async def _handle(self, client, subject, apply):
+        try:
+            diff = await apply(client, subject)
+            self.stats.events += 1
+            self.stats.last_event = datetime.utcnow()
+            self.stats.rows_changed += sum(count for key, count in diff.items() if key != 'unchanged')
+        except Exception as e:
+            # The next reconciliation will pick the change up
+            print(f"Chat update for user {self.user_id} not applied: {e}")
+
+    @staticmethod
+    def _migration(event):
+        action = event.action_message.action if event.action_message else None
+        if isinstance(action, types.MessageActionChatMigrateTo):
+            return event.chat_id, utils.get_peer_id(types.PeerChannel(action.channel_id))
+        if isinstance(action, types.MessageActionChannelMigrateFrom):
+            return utils.get_peer_id(types.PeerChat(action.chat_id)), event.chat_id
+        return None
+
+    async def _apply_action(self, client, event):
+        migration = self._migration(event)
+        if migration is None:
+            return await self._refresh(client, event.chat_id)
+
+        old_id, new_id = migration
+        chat = await self._fetch(client, new_id)
+        return await self._store([chat] if chat else [], [old_id], retarget=migration if chat else None)
+
+    async def _refresh(self, client, peer):
+        chat_id = peer if isinstance(peer, int) else utils.get_peer_id(peer)
+        chat = await self._fetch(client, peer)
+        if chat is None:
+            return await self._store([], [chat_id])
+        return await self._store([chat], [])
+
+    async def _store(self, chats, removed, retarget=None):
+        """Write fetched chats on a worker thread, so a slow or locked database never stalls the loop"""
+        async with self._write_lock:
+            return await asyncio.get_running_loop().run_in_executor(None, self._write, chats, removed, retarget)
+
+    def _write(self, chats, removed, retarget):
+        db = self.session_factory()
+        try:
+            diff = self.engine.apply(db, self.user_id, chats, removed=removed)
+            if retarget:
+                old_id, new_id = retarget
+                for task_id in retarget_chat(db, self.user_id, old_id, new_id):
+                    print(f"   -> 🩹 Fixing Task {task_id}: Swapping {old_id} -> {new_id}")
+            db.commit()
+            return diff
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def _fetch(self, client, peer):
+        self.stats.entity_fetches += 1
+        try:
+            return chat_from_entity(await client.get_entity(peer))
+        except RPCError:
+            # Kicked, banned or the chat is gone
+            return None
@@ -0,0 +1,139 @@
+"""
+In-memory index of due tasks and the stores it is rebuilt from
+"""
+
+import heapq
+import itertools
+from abc import ABC, abstractmethod
+from datetime import timedelta
+
+from sqlalchemy import update
+
+from database import Task
+
+
+class DueTaskIndex:
+    """
+    Min-heap of (next_run, task_id) with lazy deletion.
+
+    push/discard are O(log n)/O(1), the next due task is O(1) to peek
+    (amortised O(log n) when stale entries have to be skipped).
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._live = {}  # task_id -> sequence number of its current heap entry
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self._live)
+
+    def __contains__(self, task_id):
+        return task_id in self._live
+
+    def push(self, task_id, when):
+        """Insert a task, replacing its previous due time if any"""
+        seq = next(self._seq)
+        self._live[task_id] = seq
+        heapq.heappush(self._heap, (when, seq, task_id))
+        if len(self._heap) > 2 * len(self._live) + 64:
+            self._compact()
+
+    def discard(self, task_id):
+        self._live.pop(task_id, None)
+
+    def peek(self):
+        """(when, task_id) of the next due task, or None"""
+        self._drop_stale()
+        if not self._heap:
+            return None
+        when, _, task_id = self._heap[0]
+        return when, task_id
+
+    def pop_due(self, now):
+        """Remove and return the ids of every task due at or before `now`"""
+        due = []
+        while True:
+            self._drop_stale()
+            if not self._heap or self._heap[0][0] > now:
+                return due
+            _, _, task_id = heapq.heappop(self._heap)
+            del self._live[task_id]
+            due.append(task_id)
+
+    def _drop_stale(self):
+        heap = self._heap
+        while heap and self._live.get(heap[0][2]) != heap[0][1]:
+            heapq.heappop(heap)
+
+    def _compact(self):
+        self._heap = [entry for entry in self._heap if self._live.get(entry[2]) == entry[1]]
+        heapq.heapify(self._heap)
+
+
+class TaskStore(ABC):
+    """Persistence backend the scheduler is rebuilt from; the database stays the source of truth"""
+
+    @abstractmethod
+    def load_jobs(self):
+        """Iterable of (task_id, user_id, interval_seconds, next_run) for every schedulable task"""
+
+    @abstractmethod
+    def save_next_runs(self, next_runs):
+        """Persist {task_id: next_run} after the scheduler adjusted them"""
+
+
+class MemoryTaskStore(TaskStore):
+    """Keeps jobs in a dict; for benchmarks and tooling"""
+
+    def __init__(self, jobs=()):
+        self.jobs = {job[0]: tuple(job) for job in jobs}
+
+    def load_jobs(self):
+        return list(self.jobs.values())
+
+    def save_next_runs(self, next_runs):
+        for task_id, next_run in next_runs.items():
+            if task_id in self.jobs:
+                task_id, user_id, interval, _ = self.jobs[task_id]
+                self.jobs[task_id] = (task_id, user_id, interval, next_run)
+
+
+class SQLTaskStore(TaskStore):
+    """
+    Reads active tasks (and their next_run) from the tasks table.
+
+    With `shard_count` set, only tasks whose user falls in `shards` are loaded.
+    """
+
+    def __init__(self, session_factory, shard_count=None, shards=None):
+        self.session_factory = session_factory
+        self.shard_count = shard_count
+        self.shards = shards
+
+    def load_jobs(self):
+        db = self.session_factory()
+        try:
+            query = db.query(Task.id, Task.user_id, Task.interval_value, Task.interval_unit, Task.next_run) \
+                .filter(Task.status == 'active')
+            if self.shard_count:
+                if not self.shards:
+                    return []
+                query = query.filter((Task.user_id % self.shard_count).in_(self.shards))
+            rows = query.all()
+        finally:
+            db.close()
+        return [(task_id, user_id, max(1, int(timedelta(**{unit: value}).total_seconds())), next_run)
+                for task_id, user_id, value, unit, next_run in rows]
+
+    def save_next_runs(self, next_runs):
+        if not next_runs:
+            return
+        db = self.session_factory()
+        try:
+            # Bulk UPDATE by primary key, executed as one executemany
+            db.execute(update(Task), [{'id': task_id, 'next_run': next_run}
+                                      for task_id, next_run in next_runs.items()])
+            db.commit()
+        finally:
+            db.close()
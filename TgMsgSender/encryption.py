@@ -1,16 +1,73 @@
 """
 RSA + AES Hybrid Encryption Module for sensitive data
+
+Values are written in envelope format v2 (prefix "v2:"): a random AES-256
+data key encrypts the data with AES-GCM and is itself wrapped with RSA-OAEP.
+The older "RSA:" and AES-CBC formats can still be decrypted.
 """
 
 from cryptography.hazmat.primitives.asymmetric import rsa, padding
 from cryptography.hazmat.primitives import serialization, hashes
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.backends import default_backend
 import base64
 import os
+import threading
 
 RSA_PRIVATE_KEY_FILE = 'rsa_private_key.pem'
 RSA_PUBLIC_KEY_FILE = 'rsa_public_key.pem'
+V2_PREFIX = 'v2:'
+
+OAEP_PADDING = padding.OAEP(
+    mgf=padding.MGF1(algorithm=hashes.SHA256()),
+    algorithm=hashes.SHA256(),
+    label=None
+)
+
+
+class KeyManager:
+    """
+    Keeps the parsed RSA keys in memory instead of reading the PEM files on
+    every call. A key is reloaded when its file's mtime or size changes.
+    """
+
+    def __init__(self, private_key_file, public_key_file):
+        self.private_key_file = private_key_file
+        self.public_key_file = public_key_file
+        self._keys = {}  # path -> ((mtime_ns, size), key)
+        self._lock = threading.Lock()
+
+    def private_key(self):
+        return self._get(self.private_key_file, lambda pem: serialization.load_pem_private_key(
+            pem, password=None, backend=default_backend()))
+
+    def public_key(self):
+        return self._get(self.public_key_file, lambda pem: serialization.load_pem_public_key(
+            pem, backend=default_backend()))
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+
+    def _get(self, path, parse):
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self._keys.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        with self._lock:
+            cached = self._keys.get(path)
+            if cached and cached[0] == signature:
+                return cached[1]
+            with open(path, 'rb') as f:
+                key = parse(f.read())
+            self._keys[path] = (signature, key)
+            return key
+
+
+key_manager = KeyManager(RSA_PRIVATE_KEY_FILE, RSA_PUBLIC_KEY_FILE)
 
 def generate_rsa_keys():
     """Generate RSA key pair if not exists"""
@@ -47,97 +104,93 @@ def generate_rsa_keys():
     print("✅ RSA keys generated successfully")
 
 def load_private_key():
-    """Load private key from file"""
-    with open(RSA_PRIVATE_KEY_FILE, 'rb') as f:
-        return serialization.load_pem_private_key(
-            f.read(),
-            password=None,
-            backend=default_backend()
-        )
+    """Load private key (parsed once, reloaded if the file changes)"""
+    return key_manager.private_key()
 
 def load_public_key():
-    """Load public key from file"""
-    with open(RSA_PUBLIC_KEY_FILE, 'rb') as f:
-        return serialization.load_pem_public_key(
-            f.read(),
-            backend=default_backend()
-        )
+    """Load public key (parsed once, reloaded if the file changes)"""
+    return key_manager.public_key()
 
-def encrypt_data(data: str) -> str:
+def _wrap_data_key(data_key: bytes) -> bytes:
+    """Encrypt a data key with the RSA public key"""
+    return load_public_key().encrypt(data_key, OAEP_PADDING)
+
+def _unwrap_data_key(wrapped_key: bytes) -> bytes:
+    """Decrypt a wrapped data key with the RSA private key"""
+    return load_private_key().decrypt(wrapped_key, OAEP_PADDING)
+
+def generate_data_key():
+    """New random AES-256 data key and its RSA-wrapped form"""
+    data_key = AESGCM.generate_key(bit_length=256)
+    return data_key, _wrap_data_key(data_key)
+
+def encrypt_with_data_key(data: str, data_key: bytes, wrapped_key: bytes) -> str:
     """
-    Hybrid encryption: AES for data, RSA for AES key
-    This allows encrypting large data (like session strings)
+    Envelope format v2: V2_PREFIX + base64(
+        wrapped_key_length (2 bytes) + wrapped_key + nonce (12 bytes) + AES-GCM ciphertext+tag)
     """
     if not data:
         return None
+    nonce = os.urandom(12)
+    ciphertext = AESGCM(data_key).encrypt(nonce, data.encode('utf-8'), None)
+    combined = len(wrapped_key).to_bytes(2, byteorder='big') + wrapped_key + nonce + ciphertext
+    return V2_PREFIX + base64.b64encode(combined).decode('utf-8')
 
-    try:
-        public_key = load_public_key()
-
-        # Generate random AES key
-        aes_key = os.urandom(32)  # 256-bit key
-        iv = os.urandom(16)  # 128-bit IV
-
-        # Encrypt data with AES
-        cipher = Cipher(
-            algorithms.AES(aes_key),
-            modes.CBC(iv),
-            backend=default_backend()
-        )
-        encryptor = cipher.encryptor()
-
-        # Pad data to AES block size
-        data_bytes = data.encode('utf-8')
-        padding_length = 16 - (len(data_bytes) % 16)
-        padded_data = data_bytes + bytes([padding_length] * padding_length)
-
-        # Encrypt with AES
-        encrypted_data = encryptor.update(padded_data) + encryptor.finalize()
-
-        # Encrypt AES key with RSA
-        encrypted_key = public_key.encrypt(
-            aes_key,
-            padding.OAEP(
-                mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                algorithm=hashes.SHA256(),
-                label=None
-            )
-        )
-
-        # Combine: encrypted_key_length (2 bytes) + encrypted_key + iv + encrypted_data
-        key_length = len(encrypted_key).to_bytes(2, byteorder='big')
-        combined = key_length + encrypted_key + iv + encrypted_data
-
-        # Return base64 encoded
-        return base64.b64encode(combined).decode('utf-8')
+def encrypt_fields(*values):
+    """
+    Encrypt several values of one user under a single data key, so that
+    decrypting all of them needs only one RSA operation.
+    """
+    data_key, wrapped_key = generate_data_key()
+    return [encrypt_with_data_key(value, data_key, wrapped_key) for value in values]
 
-    except Exception as e:
-        print(f"Encryption error: {e}")
-        # Fallback to simple RSA for short strings
-        if len(data.encode('utf-8')) < 190:  # RSA 2048 can encrypt up to ~190 bytes
-            try:
-                data_bytes = data.encode('utf-8')
-                encrypted = public_key.encrypt(
-                    data_bytes,
-                    padding.OAEP(
-                        mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                        algorithm=hashes.SHA256(),
-                        label=None
-                    )
-                )
-                return 'RSA:' + base64.b64encode(encrypted).decode('utf-8')
-            except:
-                raise Exception("Data too large to encrypt")
-        raise
+def encrypt_data(data: str) -> str:
+    """
+    Envelope encryption: AES-GCM for data, RSA for the AES key.
+    This allows encrypting large data (like session strings)
+    """
+    if not data:
+        return None
+    return encrypt_fields(data)[0]
+
+def _decrypt_v2(encrypted_data: str, data_keys: dict) -> str:
+    combined = base64.b64decode(encrypted_data[len(V2_PREFIX):].encode('utf-8'))
+    key_length = int.from_bytes(combined[0:2], byteorder='big')
+    wrapped_key = combined[2:2+key_length]
+    nonce = combined[2+key_length:2+key_length+12]
+    ciphertext = combined[2+key_length+12:]
+    data_key = data_keys.get(wrapped_key)
+    if data_key is None:
+        data_key = data_keys[wrapped_key] = _unwrap_data_key(wrapped_key)
+    return AESGCM(data_key).decrypt(nonce, ciphertext, None).decode('utf-8')
+
+def is_current_format(encrypted_data: str) -> bool:
+    """False for values still stored in the RSA: or legacy AES-CBC formats"""
+    return not encrypted_data or encrypted_data.startswith(V2_PREFIX)
+
+def decrypt_fields(*values):
+    """
+    Decrypt several values of one user. Values encrypted together by
+    encrypt_fields share a data key, which is unwrapped once; the plaintext
+    data keys are dropped when this returns.
+    """
+    data_keys = {}
+    return [_decrypt(value, data_keys) for value in values]
 
 def decrypt_data(encrypted_data: str) -> str:
     """
     Decrypt hybrid encrypted data
     """
+    return _decrypt(encrypted_data, {})
+
+def _decrypt(encrypted_data: str, data_keys: dict) -> str:
     if not encrypted_data:
         return None
 
     try:
+        if encrypted_data.startswith(V2_PREFIX):
+            return _decrypt_v2(encrypted_data, data_keys)
+
         private_key = load_private_key()
 
         # Check if it's simple RSA (fallback format)
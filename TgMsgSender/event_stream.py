@@ -0,0 +1,104 @@
+"""
+In-process publish/subscribe of per-user events for the /api/events SSE stream
+"""
+
+import itertools
+import json
+import queue
+import threading
+
+
+class Subscription:
+    """One open event stream; a bounded queue of (id, event, data)"""
+
+    def __init__(self, user_id, max_pending):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=max_pending)
+
+    def get(self, timeout):
+        """Next event, or None if nothing arrived within `timeout` seconds"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBroker:
+    """
+    Fans events out to every open stream of a user. Safe from any thread.
+
+    A subscriber that falls `max_pending` events behind has its backlog
+    replaced by a single 'resync' event, telling the page to reload once.
+    Each stream holds a server thread, so a user gets at most
+    `max_streams_per_user` of them at a time.
+    """
+
+    def __init__(self, max_pending=100, max_streams_per_user=None):
+        self.max_pending = max_pending
+        self.max_streams_per_user = max_streams_per_user
+        self._subscribers = {}  # user_id -> set of Subscription
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.published = 0
+        self.overflows = 0
+        self.rejected = 0
+
+    def subscribe(self, user_id):
+        """A new Subscription, or None if the user already has as many streams as allowed"""
+        subscription = Subscription(user_id, self.max_pending)
+        with self._lock:
+            subscribers = self._subscribers.setdefault(user_id, set())
+            if self.max_streams_per_user and len(subscribers) >= self.max_streams_per_user:
+                self.rejected += 1
+                return None
+            subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        if not subscribers:
+            return
+        item = (next(self._ids), event, data)
+        self.published += 1
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(item)
+            except queue.Full:
+                self.overflows += 1
+                self._reset(subscription)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._subscribers),
+                'streams': sum(len(s) for s in self._subscribers.values()),
+                'published': self.published,
+                'overflows': self.overflows,
+                'rejected': self.rejected,
+            }
+
+    def _reset(self, subscription):
+        try:
+            while True:
+                subscription.queue.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            subscription.queue.put_nowait((next(self._ids), 'resync', {}))
+        except queue.Full:
+            pass
+
+
+def format_sse(item):
+    """Serialise an (id, event, data) item in text/event-stream format"""
+    event_id, event, data = item
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,148 @@
+"""
+Buffered writer for per-run task history (the task_executions table)
+"""
+
+import asyncio
+import time
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from database import TaskExecution
+
+
+def error_class(error):
+    """Short name stored for a failed chat: the exception class, or the label itself"""
+    return error if isinstance(error, str) else error.__class__.__name__
+
+
+def execution_row(task_id, started_at, results):
+    """Build a task_executions row from fan-out results [(chat_id, error or None)]"""
+    chat_results = [{'chat_id': chat_id, 'ok': error is None,
+                     'error': None if error is None else error_class(error)}
+                    for chat_id, error in results]
+    successful = sum(1 for r in chat_results if r['ok'])
+    failed = len(chat_results) - successful
+
+    if not failed:
+        status = 'success'
+    elif successful:
+        status = 'partial_failure'
+    else:
+        status = 'total_failure'
+
+    errors = Counter(r['error'] for r in chat_results if not r['ok'])
+    return {
+        'task_id': task_id,
+        'execution_time': started_at,
+        'status': status,
+        'total_chats': len(chat_results),
+        'successful_chats': successful,
+        'failed_chats': failed,
+        'error_message': ', '.join(f"{name} x{count}" for name, count in errors.most_common()) or None,
+        'chat_results': chat_results,
+    }
+
+
+class ExecutionWriter:
+    """
+    Collects execution rows on the event loop and inserts them in batches.
+
+    A batch is written when `batch_size` rows are waiting or `flush_interval`
+    seconds after its first row, as one multi-row INSERT in one transaction,
+    on a worker thread so senders never wait on the database. When
+    `max_pending` rows are queued, `record()` blocks until the writer catches
+    up. `close()` writes whatever is left.
+    """
+
+    def __init__(self, loop, session_factory, batch_size=200, flush_interval=0.5, max_pending=10000):
+        self.loop = loop
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self._queue = None
+        self._writer = None
+
+    def start(self):
+        self.loop.call_soon_threadsafe(self._start)
+
+    async def record(self, task_id, started_at, results):
+        """Queue one execution; waits while the buffer is full"""
+        if self._queue is None:
+            self._start()
+        await self._queue.put(execution_row(task_id, started_at, results))
+
+    async def close(self):
+        """Stop accepting rows and flush everything still queued"""
+        if self._writer is None:
+            return
+        await self._queue.put(None)
+        await self._writer
+        self._writer = None
+
+    def stats(self):
+        return {
+            'pending': self._queue.qsize() if self._queue else 0,
+            'written': self.written,
+            'dropped': self.dropped,
+            'batches': self.batches,
+        }
+
+    def _start(self):
+        if self._writer is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._writer = self.loop.create_task(self._run())
+
+    async def _run(self):
+        closing = False
+        while not closing:
+            row = await self._queue.get()
+            if row is None:
+                break
+            batch = [row]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is None:
+                    closing = True
+                    break
+                batch.append(row)
+            await self.loop.run_in_executor(None, self._write, batch)
+
+    def _write(self, batch):
+        db = self.session_factory()
+        try:
+            db.execute(insert(TaskExecution), batch)
+            db.commit()
+            self.written += len(batch)
+            self.batches += 1
+            return
+        except Exception as e:
+            db.rollback()
+            print(f"Could not write {len(batch)} task executions as a batch: {e}")
+        finally:
+            db.close()
+
+        # One bad row (e.g. its task was deleted meanwhile) must not lose the others
+        for row in batch:
+            db = self.session_factory()
+            try:
+                db.execute(insert(TaskExecution), [row])
+                db.commit()
+                self.written += 1
+            except Exception:
+                db.rollback()
+                self.dropped += 1
+            finally:
+                db.close()
@@ -0,0 +1,182 @@
+"""
+Retention for per-run task history: old task_executions rows are rolled up
+into hourly and daily totals per task (execution_rollups) and deleted
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from functools import partial
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import ExecutionRollup, Task, TaskExecution
+
+_UPSERTS = {'sqlite': sqlite_insert, 'postgresql': postgresql_insert}
+
+HOUR = 'hour'
+DAY = 'day'
+TOTALS = ('runs', 'successful_chats', 'failed_chats')
+
+
+def period_start(moment, period):
+    """Start of the hour or day `moment` falls in"""
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0) if period == DAY else moment
+
+
+class ExecutionRetention:
+    """
+    Keeps task_executions to the last `raw_days` days.
+
+    Older rows are added to the hourly and the daily execution_rollups row of
+    their task and deleted, `batch_size` rows per transaction. The DELETE has
+    to remove exactly the rows that were read or the batch is rolled back, so
+    two processes compacting at once never count a row twice. Hourly rollups
+    are kept for `hourly_days`, daily ones for `daily_days` (0 = forever).
+
+    A pass runs every `interval` seconds on the event loop, each batch on a
+    worker thread with a `pause` between batches, so no transaction holds
+    the write lock for long and sends keep flowing while history is trimmed.
+    """
+
+    def __init__(self, loop, session_factory, raw_days=7, hourly_days=90, daily_days=0, batch_size=500,
+                 interval=3600, pause=0.05):
+        self.loop = loop
+        self.session_factory = session_factory
+        self.raw_days = raw_days
+        self.hourly_days = hourly_days
+        self.daily_days = daily_days
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pause = pause
+        self.passes = 0
+        self.compacted = 0
+        self.pruned = 0
+        self.conflicts = 0
+        self.last_run_at = None
+        self._runner = None
+
+    def start(self):
+        self.loop.call_soon_threadsafe(self._start)
+
+    async def run_once(self):
+        """One full pass; returns how many rows each step removed"""
+        now = datetime.utcnow()
+        steps = [('compacted', self._compact_batch, now - timedelta(days=self.raw_days)),
+                 ('hourly_pruned', partial(self._prune_batch, HOUR), now - timedelta(days=self.hourly_days))]
+        if self.daily_days:
+            steps.append(('daily_pruned', partial(self._prune_batch, DAY), now - timedelta(days=self.daily_days)))
+
+        done = {}
+        for key, step, cutoff in steps:
+            done[key] = 0
+            while True:
+                count = await self.loop.run_in_executor(None, step, cutoff)
+                done[key] += count
+                if count < self.batch_size:
+                    break
+                await asyncio.sleep(self.pause)
+
+        self.passes += 1
+        self.compacted += done['compacted']
+        self.pruned += done['hourly_pruned'] + done.get('daily_pruned', 0)
+        self.last_run_at = now
+        return done
+
+    def stats(self):
+        return {'passes': self.passes, 'compacted': self.compacted, 'pruned': self.pruned,
+                'conflicts': self.conflicts,
+                'last_run_at': self.last_run_at.isoformat() if self.last_run_at else None}
+
+    def _start(self):
+        if self._runner is None:
+            self._runner = self.loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                done = await self.run_once()
+                if any(done.values()):
+                    print(f"Execution history trimmed: {done}")
+            except Exception as e:
+                print(f"Execution history retention failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def _compact_batch(self, cutoff):
+        db = self.session_factory()
+        try:
+            rows = db.query(TaskExecution.id, TaskExecution.task_id, TaskExecution.execution_time,
+                            TaskExecution.successful_chats, TaskExecution.failed_chats, Task.user_id) \
+                .outerjoin(Task, Task.id == TaskExecution.task_id) \
+                .filter(TaskExecution.execution_time < cutoff) \
+                .order_by(TaskExecution.execution_time, TaskExecution.id).limit(self.batch_size).all()
+            if not rows:
+                return 0
+
+            rollups = {}
+            for _, task_id, executed_at, successful, failed, user_id in rows:
+                if user_id is None:
+                    continue  # the task is gone; just drop its history
+                for period in (HOUR, DAY):
+                    start = period_start(executed_at, period)
+                    rollup = rollups.setdefault((task_id, period, start), {
+                        'task_id': task_id, 'user_id': user_id, 'period': period, 'period_start': start,
+                        'runs': 0, 'successful_chats': 0, 'failed_chats': 0})
+                    rollup['runs'] += 1
+                    rollup['successful_chats'] += successful or 0
+                    rollup['failed_chats'] += failed or 0
+
+            ids = [row[0] for row in rows]
+            deleted = db.execute(delete(TaskExecution).where(TaskExecution.id.in_(ids))).rowcount
+            if deleted != len(ids):
+                # Another process compacted some of these rows meanwhile
+                db.rollback()
+                self.conflicts += 1
+                return 0
+            self._add(db, list(rollups.values()))
+            db.commit()
+            return len(rows)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _prune_batch(self, period, cutoff):
+        db = self.session_factory()
+        try:
+            ids = [rollup_id for (rollup_id,) in db.query(ExecutionRollup.id)
+                   .filter(ExecutionRollup.period == period, ExecutionRollup.period_start < cutoff)
+                   .limit(self.batch_size)]
+            if ids:
+                db.execute(delete(ExecutionRollup).where(ExecutionRollup.id.in_(ids)))
+                db.commit()
+            return len(ids)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _add(self, db, rollups):
+        """Add the totals in `rollups` to their rows, creating the missing ones"""
+        dialect_insert = _UPSERTS.get(db.get_bind().dialect.name)
+        if dialect_insert is None:
+            for values in rollups:
+                rollup = db.query(ExecutionRollup).filter_by(task_id=values['task_id'], period=values['period'],
+                                                             period_start=values['period_start']).first()
+                if rollup is None:
+                    db.add(ExecutionRollup(**values))
+                else:
+                    for key in TOTALS:
+                        setattr(rollup, key, getattr(rollup, key) + values[key])
+            return
+
+        for start in range(0, len(rollups), 100):
+            stmt = dialect_insert(ExecutionRollup.__table__).values(rollups[start:start + 100])
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=['task_id', 'period', 'period_start'],
+                set_={key: stmt.table.c[key] + stmt.excluded[key] for key in TOTALS}
+            ))
@@ -0,0 +1,125 @@
+"""
+Concurrent, rate-limited delivery of one message to many chats
+"""
+
+import asyncio
+import time
+
+from telethon.errors import FloodWaitError
+
+
+class TokenBucket:
+    """Classic token bucket; must only be used from one event loop"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def take(self):
+        """Wait until a token is available and consume it"""
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def drain(self):
+        self._refill()
+        self.tokens = 0
+
+
+class AccountLimiter:
+    """Concurrency cap, token bucket and flood-wait deadline for one Telegram account"""
+
+    def __init__(self, concurrency, rate, burst):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.bucket = TokenBucket(rate, burst)
+        self.resume_at = 0.0
+
+    async def wait_turn(self):
+        """Block until the account may send again, then take a token"""
+        while True:
+            delay = self.resume_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            await self.bucket.take()
+            # A flood wait may have been reported while we were waiting for the token
+            if self.resume_at <= time.monotonic():
+                return
+
+    def flood_wait(self, seconds):
+        """Pause the whole account for the duration the server asked for"""
+        self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+        self.bucket.drain()
+
+
+class FanoutEngine:
+    """
+    Sends to several chats at once with per-account limits.
+
+    Telethon already sleeps through short flood waits on its own; longer ones
+    surface as FloodWaitError and pause every in-flight send of that account.
+    """
+
+    def __init__(self, concurrency=5, rate=1.0, burst=5, max_flood_wait=300,
+                 max_flood_retries=2, is_fatal=None):
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.max_flood_wait = max_flood_wait
+        self.max_flood_retries = max_flood_retries
+        self.is_fatal = is_fatal or (lambda e: False)
+        self._accounts = {}
+
+    def limiter(self, account_key):
+        limiter = self._accounts.get(account_key)
+        if limiter is None:
+            limiter = AccountLimiter(self.concurrency, self.rate, self.burst)
+            self._accounts[account_key] = limiter
+        return limiter
+
+    async def fan_out(self, account_key, chat_ids, send_one):
+        """
+        Call `send_one(chat_id)` for every chat.
+
+        Returns a list of (chat_id, error) pairs in `chat_ids` order, where
+        error is None on success. A fatal error (e.g. auth) stops the remaining
+        chats, which are reported with that same error.
+        """
+        limiter = self.limiter(account_key)
+        fatal = None
+
+        async def deliver(chat_id):
+            nonlocal fatal
+            last_error = None
+            async with limiter.semaphore:
+                for _ in range(self.max_flood_retries + 1):
+                    if fatal is not None:
+                        return chat_id, fatal
+                    await limiter.wait_turn()
+                    if fatal is not None:
+                        return chat_id, fatal
+                    try:
+                        await send_one(chat_id)
+                        return chat_id, None
+                    except FloodWaitError as e:
+                        limiter.flood_wait(e.seconds)
+                        last_error = e
+                        if e.seconds > self.max_flood_wait:
+                            break
+                    except Exception as e:
+                        if self.is_fatal(e):
+                            fatal = e
+                        return chat_id, e
+            return chat_id, last_error
+
+        return await asyncio.gather(*(deliver(chat_id) for chat_id in chat_ids))
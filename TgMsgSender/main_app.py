@@ -1,4 +1,5 @@
 import asyncio
+import atexit
 import base64
 import json
 import os
@@ -8,20 +9,38 @@ from functools import wraps
 from threading import Thread
 from telethon.tl.types import Channel, Chat
 import pytz
-from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.interval import IntervalTrigger
 from dotenv import load_dotenv
-from flask import Flask, render_template, request, jsonify, session, send_from_directory
+from flask import Flask, Response, g, make_response, render_template, request, jsonify, session, send_from_directory
 from flask_session import Session
+from sqlalchemy import delete
 from sqlalchemy.orm import selectinload
 from telethon import TelegramClient
 from telethon.errors import SessionPasswordNeededError, rpcerrorlist
 from telethon.sessions import StringSession
 from werkzeug.utils import secure_filename
 
-from database import init_db, User, Task, UserChat, SessionLocal, DATABASE_URL
-from encryption import encrypt_data, decrypt_data
+from async_scheduler import AsyncTaskScheduler
+from chat_supervisor import ChatSyncSupervisor
+from chat_sync import ChatSyncEngine
+from client_pool import TelegramClientPool
+from credentials import CredentialCache
+from data_versions import data_version
+from database import init_db, ExecutionRollup, User, Task, TaskExecution, TaskTarget, UserChat, SessionLocal
+from dialog_sync import ChatMonitor
+from due_index import SQLTaskStore
+from encryption import encrypt_fields, decrypt_fields
+from event_stream import EventBroker, format_sse
+from execution_log import ExecutionWriter
+from execution_retention import ExecutionRetention
+from fanout import FanoutEngine
+from media_cache import MediaStager
+from notifications import NotificationDispatcher
+from pagination import InvalidCursor, contains_pattern, page_size, paginate
+from session_validity import SessionValidityCache
+from sharding import ShardCoordinator
+from task_stats import TaskCounters, execution_history, status_counts, task_stats
+from task_targets import set_task_targets, retarget_chat, backfill_task_targets
+from user_cache import UserCache
 
 try:
     from telegram import Bot
@@ -51,14 +70,65 @@ Session(app)
 UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+CLIENT_POOL_MAX_CLIENTS = int(os.getenv('CLIENT_POOL_MAX_CLIENTS', 200))
+CLIENT_POOL_IDLE_TTL = int(os.getenv('CLIENT_POOL_IDLE_TTL', 900))
+# Clients held open by incremental chat monitors, on top of CLIENT_POOL_MAX_CLIENTS;
+# monitors beyond this many poll instead
+CLIENT_POOL_MAX_FOLLOWERS = int(os.getenv('CLIENT_POOL_MAX_FOLLOWERS', 200))
+CREDENTIAL_CACHE_SIZE = int(os.getenv('CREDENTIAL_CACHE_SIZE', 1000))
+CREDENTIAL_CACHE_TTL = int(os.getenv('CREDENTIAL_CACHE_TTL', 300))
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 30))
+# How often the user cache looks for users rows changed by other processes (the bot); 0 = never
+USER_CACHE_FOLLOW_INTERVAL = float(os.getenv('USER_CACHE_FOLLOW_INTERVAL', 5))
+SEND_CONCURRENCY = int(os.getenv('SEND_CONCURRENCY', 5))
+SEND_RATE_PER_SECOND = float(os.getenv('SEND_RATE_PER_SECOND', 1.0))
+SEND_BURST = int(os.getenv('SEND_BURST', 5))
+# 0 = this process schedules every task. N > 0 = tasks are split into N shards
+# that all processes running the app share through leases in the database.
+SCHEDULER_SHARDS = int(os.getenv('SCHEDULER_SHARDS', 0))
+SCHEDULER_WORKER_ID = os.getenv('SCHEDULER_WORKER_ID')
+SCHEDULER_LEASE_TTL = int(os.getenv('SCHEDULER_LEASE_TTL', 30))
+# 'incremental' = one full sync, then Telegram updates plus a rare reconciliation;
+# 'poll' = full get_dialogs() sync every CHAT_SYNC_POLL_INTERVAL seconds
+CHAT_SYNC_MODE = os.getenv('CHAT_SYNC_MODE', 'incremental')
+CHAT_SYNC_POLL_INTERVAL = int(os.getenv('CHAT_SYNC_POLL_INTERVAL', 300))
+CHAT_SYNC_RECONCILE_INTERVAL = int(os.getenv('CHAT_SYNC_RECONCILE_INTERVAL', 6 * 3600))
+CHAT_SYNC_MAX_CONCURRENT = int(os.getenv('CHAT_SYNC_MAX_CONCURRENT', 4))
+SSE_KEEPALIVE_SECONDS = int(os.getenv('SSE_KEEPALIVE_SECONDS', 15))
+# Each open /api/events stream holds a server thread; further tabs fall back to polling
+SSE_MAX_STREAMS_PER_USER = int(os.getenv('SSE_MAX_STREAMS_PER_USER', 5))
+EXECUTION_LOG_BATCH_SIZE = int(os.getenv('EXECUTION_LOG_BATCH_SIZE', 200))
+EXECUTION_LOG_FLUSH_MS = int(os.getenv('EXECUTION_LOG_FLUSH_MS', 500))
+EXECUTION_LOG_MAX_PENDING = int(os.getenv('EXECUTION_LOG_MAX_PENDING', 10000))
+# task_executions rows older than EXECUTION_HISTORY_RAW_DAYS are rolled up into
+# hourly (kept EXECUTION_HISTORY_HOURLY_DAYS) and daily (kept EXECUTION_HISTORY_DAILY_DAYS,
+# 0 = forever) totals per task, every EXECUTION_HISTORY_INTERVAL seconds
+EXECUTION_HISTORY_RAW_DAYS = int(os.getenv('EXECUTION_HISTORY_RAW_DAYS', 7))
+EXECUTION_HISTORY_HOURLY_DAYS = int(os.getenv('EXECUTION_HISTORY_HOURLY_DAYS', 90))
+EXECUTION_HISTORY_DAILY_DAYS = int(os.getenv('EXECUTION_HISTORY_DAILY_DAYS', 0))
+EXECUTION_HISTORY_BATCH_SIZE = int(os.getenv('EXECUTION_HISTORY_BATCH_SIZE', 500))
+EXECUTION_HISTORY_INTERVAL = int(os.getenv('EXECUTION_HISTORY_INTERVAL', 3600))
+# Window of the run history in /api/stats and /api/admin/stats
+EXECUTION_STATS_DAYS = int(os.getenv('EXECUTION_STATS_DAYS', 30))
+# Bot notifications: at most NOTIFY_RATE messages per second overall and one per
+# NOTIFY_CHAT_INTERVAL seconds per user; more than NOTIFY_DIGEST_THRESHOLD within
+# NOTIFY_DIGEST_WINDOW seconds are sent as one digest at the end of the window
+NOTIFY_RATE = float(os.getenv('NOTIFY_RATE', 25))
+NOTIFY_CHAT_INTERVAL = float(os.getenv('NOTIFY_CHAT_INTERVAL', 1.0))
+NOTIFY_DIGEST_THRESHOLD = int(os.getenv('NOTIFY_DIGEST_THRESHOLD', 3))
+NOTIFY_DIGEST_WINDOW = int(os.getenv('NOTIFY_DIGEST_WINDOW', 60))
+NOTIFY_MAX_PENDING = int(os.getenv('NOTIFY_MAX_PENDING', 1000))
+# /api/auth/status answers from memory; sessions nobody has vouched for (a login,
+# a successful send) in SESSION_CHECK_INTERVAL seconds are re-checked with Telegram,
+# at most SESSION_CHECK_RATE checks per second
+SESSION_CHECK_INTERVAL = int(os.getenv('SESSION_CHECK_INTERVAL', 300))
+SESSION_CHECK_RATE = float(os.getenv('SESSION_CHECK_RATE', 2.0))
+# Keep per-user and global task stats in the task_counters table instead of
+# aggregating the tasks table on every /api/stats and /api/admin/stats request
+TASK_COUNTERS = os.getenv('TASK_COUNTERS', 'false').lower() in ('1', 'true', 'yes')
 
 init_db()
 
-jobstores = {'default': SQLAlchemyJobStore(url=DATABASE_URL)}
-scheduler = BackgroundScheduler(jobstores=jobstores, timezone="UTC")
-if not scheduler.running:
-    scheduler.start()
-
 main_loop = asyncio.new_event_loop()
 
 
@@ -70,6 +140,14 @@ def run_loop_in_thread():
 loop_thread = Thread(target=run_loop_in_thread, daemon=True)
 loop_thread.start()
 
+task_store = SQLTaskStore(SessionLocal)
+scheduler = AsyncTaskScheduler(main_loop, run_task=lambda user_db_id, task_id: send_scheduled_message(user_db_id, task_id),
+                               store=task_store)
+shard_coordinator = None
+if SCHEDULER_SHARDS:
+    shard_coordinator = ShardCoordinator(main_loop, scheduler, task_store, SessionLocal, SCHEDULER_SHARDS,
+                                         worker_id=SCHEDULER_WORKER_ID, lease_ttl=SCHEDULER_LEASE_TTL)
+
 pending_auth = {}
 
 
@@ -77,12 +155,90 @@ def is_auth_error(e):
     return isinstance(e, rpcerrorlist.AuthKeyUnregisteredError) or "key is not registered" in str(e)
 
 
+credential_cache = CredentialCache(max_entries=CREDENTIAL_CACHE_SIZE, ttl=CREDENTIAL_CACHE_TTL)
+user_cache = UserCache(ttl=USER_CACHE_TTL, follow_interval=USER_CACHE_FOLLOW_INTERVAL or None)
+user_cache.watch(SessionLocal)
+client_pool = TelegramClientPool(main_loop, max_clients=CLIENT_POOL_MAX_CLIENTS,
+                                 idle_ttl=CLIENT_POOL_IDLE_TTL, is_auth_error=is_auth_error,
+                                 max_followers=CLIENT_POOL_MAX_FOLLOWERS)
+fanout = FanoutEngine(concurrency=SEND_CONCURRENCY, rate=SEND_RATE_PER_SECOND, burst=SEND_BURST,
+                      is_fatal=is_auth_error)
+chat_sync = ChatSyncEngine()
+event_broker = EventBroker(max_streams_per_user=SSE_MAX_STREAMS_PER_USER)
+task_counters = TaskCounters(SessionLocal) if TASK_COUNTERS else None
+execution_writer = ExecutionWriter(main_loop, SessionLocal, batch_size=EXECUTION_LOG_BATCH_SIZE,
+                                   flush_interval=EXECUTION_LOG_FLUSH_MS / 1000,
+                                   max_pending=EXECUTION_LOG_MAX_PENDING)
+execution_retention = ExecutionRetention(main_loop, SessionLocal, raw_days=EXECUTION_HISTORY_RAW_DAYS,
+                                         hourly_days=EXECUTION_HISTORY_HOURLY_DAYS,
+                                         daily_days=EXECUTION_HISTORY_DAILY_DAYS,
+                                         batch_size=EXECUTION_HISTORY_BATCH_SIZE,
+                                         interval=EXECUTION_HISTORY_INTERVAL)
+notifications = None
+if BOT_TOKEN and TELEGRAM_BOT_AVAILABLE:
+    notifications = NotificationDispatcher(main_loop, Bot(token=BOT_TOKEN), rate=NOTIFY_RATE,
+                                           chat_interval=NOTIFY_CHAT_INTERVAL,
+                                           digest_threshold=NOTIFY_DIGEST_THRESHOLD,
+                                           digest_window=NOTIFY_DIGEST_WINDOW, max_pending=NOTIFY_MAX_PENDING)
+
+
+def find_user(telegram_id: int):
+    """The users row with this telegram_id, detached, or None"""
+    db = SessionLocal()
+    try:
+        return db.query(User).filter_by(telegram_id=telegram_id).first()
+    finally:
+        db.close()
+
+
+async def check_user_session(telegram_id: int):
+    """Ask Telegram whether a user's session is authorised; None if it could not be reached"""
+    user = await asyncio.get_running_loop().run_in_executor(None, find_user, telegram_id)
+    if not user or not user.session_string_encrypted:
+        return False
+
+    try:
+        api_id, api_hash, session_string = credential_cache.get(user)
+    except Exception:
+        invalidate_user_session(telegram_id)
+        return False
+
+    try:
+        async with client_pool.client(user.id, api_id, api_hash, session_string) as client:
+            is_auth = await client.is_user_authorized()
+    except Exception as e:
+        if is_auth_error(e):
+            invalidate_user_session(telegram_id)
+            return False
+        return None
+    if not is_auth:
+        invalidate_user_session(telegram_id)
+    return is_auth
+
+
+session_validity = SessionValidityCache(main_loop, check_user_session, refresh_interval=SESSION_CHECK_INTERVAL,
+                                        rate=SESSION_CHECK_RATE)
+
+
 def run_async(coro):
     return asyncio.run_coroutine_threadsafe(coro, main_loop).result()
 
 
+def on_main_loop():
+    try:
+        return asyncio.get_running_loop() is main_loop
+    except RuntimeError:
+        return False
+
+
 def invalidate_user_session(user_telegram_id: int):
+    if on_main_loop():
+        # Called from a coroutine: the database work below must not stall the loop
+        main_loop.run_in_executor(None, invalidate_user_session, user_telegram_id)
+        return
+
     print(f"Invalidating session for user Telegram ID: {user_telegram_id}")
+    session_validity.invalidate(user_telegram_id)
     db = SessionLocal()
     user = db.query(User).filter_by(telegram_id=user_telegram_id).first()
 
@@ -92,47 +248,70 @@ def invalidate_user_session(user_telegram_id: int):
 
     if user.session_string_encrypted:
         try:
-            api_id = int(decrypt_data(user.api_id_encrypted))
-            api_hash = decrypt_data(user.api_hash_encrypted)
-            session_string = decrypt_data(user.session_string_encrypted)
+            api_id, api_hash, session_string = credential_cache.get(user)
 
             async def do_remote_logout():
-                client = TelegramClient(StringSession(session_string), api_id, api_hash, loop=main_loop)
                 try:
-                    await client.connect()
-                    await client.log_out()
+                    async with client_pool.client(user.id, api_id, api_hash, session_string) as client:
+                        await client.log_out()
                 except Exception as e:
                     print(f"Could not perform remote logout for user {user_telegram_id}: {e}")
-                finally:
-                    if client.is_connected():
-                        await client.disconnect()
 
             run_async(do_remote_logout())
         except Exception as e:
             print(f"Error during remote logout preparation for user {user_telegram_id}: {e}")
 
+    client_pool.discard(user.id)
+    credential_cache.invalidate(user.id)
+    chat_supervisor.stop(user.id)
+
     user.session_string_encrypted = None
     user.is_bot_authorized = False
 
     tasks_to_pause = db.query(Task).filter_by(user_id=user.id, status='active').all()
     for task in tasks_to_pause:
         try:
-            if scheduler.get_job(task.id):
-                scheduler.pause_job(task.id)
+            scheduler.remove_job(task.id)
             task.status = 'paused'
             task.next_run = None
         except Exception as e:
             print(f"Could not pause job {task.id}: {e}")
 
     db.commit()
+    for task in tasks_to_pause:
+        publish_task_event(user.id, 'paused', task, old_status='active', reason='auth')
+    event_broker.publish(user.id, 'session', {'authorized': False})
     db.close()
 
 
+def get_db():
+    """The request's database session, closed by close_db() when the request ends"""
+    if 'db' not in g:
+        g.db = SessionLocal()
+    return g.db
+
+
+def current_user():
+    """The logged-in User, attached to get_db() and looked up once per request; None if there is none"""
+    if 'user' not in g:
+        g.user = user_cache.load(get_db(), session['user_id']) if 'user_id' in session else None
+    return g.user
+
+
+@app.teardown_appcontext
+def close_db(exc=None):
+    db = g.pop('db', None)
+    if db is not None:
+        db.close()
+
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
             return jsonify({'error': 'Not authenticated'}), 401
+        if current_user() is None:
+            return jsonify({'error': 'User not found'}), 404
         return f(*args, **kwargs)
 
     return decorated_function
@@ -143,9 +322,7 @@ def admin_required(f):
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
             return jsonify({'error': 'Not authenticated'}), 401
-        db = SessionLocal()
-        user = db.query(User).filter_by(telegram_id=session['user_id']).first()
-        db.close()
+        user = current_user()
         if not user or not user.is_admin:
             return jsonify({'error': 'Administrator access required'}), 403
         return f(*args, **kwargs)
@@ -153,6 +330,36 @@ def admin_required(f):
     return decorated_function
 
 
+def versioned(scope):
+    """
+    ETag / 304 for a read endpoint showing the logged-in user's `scope`
+    ('tasks', 'chats', 'stats') or the 'users' list, versioned from the
+    database (see data_version) so writes by other processes are seen.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            version = data_version(get_db(), scope, current_user().id)
+            # Parsed entity-tags, weak comparison as If-None-Match requires ('*' matches too)
+            if request.if_none_match.contains_weak(version):
+                response = Response(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(version, weak=True)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+
+        return decorated_function
+
+    return decorator
+
+
+def interval_in_seconds(interval_value, interval_unit):
+    return max(1, int(timedelta(**{interval_unit: interval_value}).total_seconds()))
+
+
 def calculate_next_run(interval_value, interval_unit):
     now = datetime.utcnow()
     if interval_unit == 'seconds':
@@ -187,13 +394,10 @@ def start_auth():
         return jsonify({'error': 'Phone number is required.'}), 400
 
     if not api_id or not api_hash:
-        db = SessionLocal()
-        user = db.query(User).filter_by(phone=phone).first()
-        db.close()
+        user = get_db().query(User).filter_by(phone=phone).first()
         if user and user.simplified_login_enabled and user.api_id_encrypted:
             try:
-                api_id = decrypt_data(user.api_id_encrypted)
-                api_hash = decrypt_data(user.api_hash_encrypted)
+                api_id, api_hash = decrypt_fields(user.api_id_encrypted, user.api_hash_encrypted)
             except Exception:
                 return jsonify({'error': 'Could not use stored credentials. Please perform a full login.',
                                 'action': 'require_full_login'}), 400
@@ -268,6 +472,58 @@ def verify_2fa():
         return jsonify({'error': "Invalid password or session."}), 400
 
 
+def save_login(me, auth_data, session_string):
+    """Store a fresh login and resume the user's paused tasks; returns (user id, is_admin)"""
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter_by(telegram_id=me.id).first()
+        # One data key for all three fields, so reading them back costs one RSA operation
+        session_encrypted, api_id_encrypted, api_hash_encrypted = encrypt_fields(
+            session_string, str(auth_data['api_id']), auth_data['api_hash'])
+        creds = {
+            'session_string_encrypted': session_encrypted,
+            'api_id_encrypted': api_id_encrypted,
+            'api_hash_encrypted': api_hash_encrypted,
+            'last_login': datetime.utcnow(),
+            'is_bot_authorized': True
+        }
+        if user:
+            user.phone = auth_data['phone']
+            for key, value in creds.items():
+                setattr(user, key, value)
+        else:
+            user = User(
+                telegram_id=me.id, phone=auth_data['phone'], first_name=me.first_name,
+                username=me.username, **creds
+            )
+            db.add(user)
+        db.commit()
+        user_db_id = user.id
+        is_admin = user.is_admin
+        credential_cache.invalidate(user_db_id)
+        session_validity.mark_valid(me.id)
+
+        paused_tasks = db.query(Task).filter_by(user_id=user.id, status='paused').all()
+        if paused_tasks:
+            resumed = []
+            for task in paused_tasks:
+                try:
+                    new_next_run = calculate_next_run(task.interval_value, task.interval_unit)
+                    scheduler.add_job(task.id, user.id, interval_in_seconds(task.interval_value, task.interval_unit),
+                                      new_next_run)
+                    task.status = 'active'
+                    task.next_run = new_next_run
+                    resumed.append(task)
+                except Exception as e:
+                    print(f"Failed to resume task {task.id}: {e}")
+            db.commit()
+            for task in resumed:
+                publish_task_event(user.id, 'resumed', task, old_status='paused')
+        return user_db_id, is_admin
+    finally:
+        db.close()
+
+
 async def complete_login(client, auth_data, temp_id):
     me = await client.get_me()
     photo_base64 = None
@@ -281,49 +537,11 @@ async def complete_login(client, auth_data, temp_id):
         except Exception as e:
             print(f"Error downloading photo: {e}")
 
-    db = SessionLocal()
-    user = db.query(User).filter_by(telegram_id=me.id).first()
-    creds = {
-        'session_string_encrypted': encrypt_data(client.session.save()),
-        'api_id_encrypted': encrypt_data(str(auth_data['api_id'])),
-        'api_hash_encrypted': encrypt_data(auth_data['api_hash']),
-        'last_login': datetime.utcnow(),
-        'is_bot_authorized': True
-    }
-    if user:
-        user.phone = auth_data['phone']
-        for key, value in creds.items():
-            setattr(user, key, value)
-    else:
-        user = User(
-            telegram_id=me.id, phone=auth_data['phone'], first_name=me.first_name,
-            username=me.username, **creds
-        )
-        db.add(user)
-    db.commit()
-    user_db_id = user.id
-    is_admin = user.is_admin
-
-    paused_tasks = db.query(Task).filter_by(user_id=user.id, status='paused').all()
-    if paused_tasks:
-        for task in paused_tasks:
-            try:
-                new_next_run = calculate_next_run(task.interval_value, task.interval_unit)
-                scheduler.add_job(
-                    send_scheduled_message,
-                    IntervalTrigger(**{task.interval_unit: task.interval_value}, timezone='UTC'),
-                    args=[user.id, task.id], id=task.id, replace_existing=True, next_run_time=new_next_run
-                )
-                task.status = 'active'
-                task.next_run = new_next_run
-            except Exception as e:
-                print(f"Failed to resume task {task.id}: {e}")
-        db.commit()
-
-    db.close()
+    user_db_id, is_admin = await asyncio.get_running_loop().run_in_executor(
+        None, save_login, me, auth_data, client.session.save())
 
     if user_db_id:
-        asyncio.run_coroutine_threadsafe(monitor_user_chats(user_db_id), main_loop)
+        chat_supervisor.ensure(user_db_id)
     if temp_id in pending_auth:
         del pending_auth[temp_id]
     await client.disconnect()
@@ -342,33 +560,26 @@ def switch_account():
     if not new_user_id:
         return jsonify({'error': 'telegram_id is required'}), 400
 
-    db = SessionLocal()
-    user = db.query(User).filter_by(telegram_id=new_user_id).first()
-
+    user = user_cache.load(get_db(), new_user_id)
     if not user or not user.session_string_encrypted:
-        db.close()
         return jsonify({'error': 'This account requires re-authentication.'}), 401
 
     session['user_id'] = user.telegram_id
     session.permanent = True
 
     try:
-        api_id = int(decrypt_data(user.api_id_encrypted))
-        api_hash = decrypt_data(user.api_hash_encrypted)
-        session_string = decrypt_data(user.session_string_encrypted)
+        api_id, api_hash, session_string = credential_cache.get(user)
 
         async def get_photo():
-            client = TelegramClient(StringSession(session_string), api_id, api_hash, loop=main_loop)
-            await client.connect()
-            me = await client.get_me()
-            photo_base64 = None
-            if me.photo:
-                from io import BytesIO
-                photo_bytes_io = BytesIO()
-                await client.download_profile_photo(me, file=photo_bytes_io, download_big=False)
-                photo_bytes_io.seek(0)
-                photo_base64 = base64.b64encode(photo_bytes_io.read()).decode('utf-8')
-            await client.disconnect()
+            async with client_pool.client(user.id, api_id, api_hash, session_string) as client:
+                me = await client.get_me()
+                photo_base64 = None
+                if me.photo:
+                    from io import BytesIO
+                    photo_bytes_io = BytesIO()
+                    await client.download_profile_photo(me, file=photo_bytes_io, download_big=False)
+                    photo_bytes_io.seek(0)
+                    photo_base64 = base64.b64encode(photo_bytes_io.read()).decode('utf-8')
             return photo_base64
 
         session['user_photo'] = run_async(get_photo())
@@ -376,7 +587,6 @@ def switch_account():
         print(f"Could not refresh photo on switch: {e}")
         session['user_photo'] = None
 
-    db.close()
     return jsonify({'success': True})
 
 
@@ -385,54 +595,25 @@ def auth_status():
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
 
-    db = SessionLocal()
-    user = db.query(User).filter_by(telegram_id=session['user_id']).first()
-    if not user or not user.session_string_encrypted:
-        db.close()
-        session.clear()
-        return jsonify({'error': 'Not authenticated'}), 401
+    telegram_id = session['user_id']
+    is_auth = session_validity.get(telegram_id)
+    if is_auth is None:
+        # First time this process is asked about the user: one real check, then memory
+        is_auth = run_async(session_validity.check_now(telegram_id))
+        if is_auth is None:
+            return jsonify({'error': 'Could not reach Telegram, try again later.'}), 503
 
-    async def check_connection():
-        try:
-            api_id = int(decrypt_data(user.api_id_encrypted))
-            api_hash = decrypt_data(user.api_hash_encrypted)
-            session_string = decrypt_data(user.session_string_encrypted)
-        except Exception:
-            invalidate_user_session(user.telegram_id)
-            return False
-
-        client = TelegramClient(StringSession(session_string), api_id, api_hash, loop=main_loop)
-        try:
-            await client.connect()
-            is_auth = await client.is_user_authorized()
-            await client.disconnect()
-            if not is_auth:
-                invalidate_user_session(user.telegram_id)
-            return is_auth
-        except Exception as e:
-            if is_auth_error(e):
-                invalidate_user_session(user.telegram_id)
-            return False
-
-    try:
-        if not run_async(check_connection()):
-            session.clear()
-            return jsonify({'error': 'Telegram session is invalid.'}), 401
-        return jsonify({'status': 'ok'}), 200
-    except Exception as e:
-        return jsonify({'error': f'An unexpected error occurred: {str(e)}'}), 500
-    finally:
-        db.close()
+    if not is_auth:
+        session.clear()
+        return jsonify({'error': 'Telegram session is invalid.'}), 401
+    return jsonify({'status': 'ok'}), 200
 
 
 @app.route('/api/user/info', methods=['GET'])
 def get_user_info():
     if 'user_id' not in session: return jsonify({'logged_in': False})
-    db = SessionLocal()
-    user = db.query(User).filter_by(telegram_id=session['user_id']).first()
-
+    user = current_user()
     if not user:
-        db.close()
         session.clear()
         return jsonify({'logged_in': False})
 
@@ -440,7 +621,6 @@ def get_user_info():
         'id': user.telegram_id, 'first_name': user.first_name, 'username': user.username,
         'photo': session.get('user_photo'), 'phone': user.phone, 'is_admin': user.is_admin
     }
-    db.close()
     return jsonify({'logged_in': True, 'user': user_info})
 
 
@@ -455,13 +635,21 @@ def logout():
 
 @app.route('/api/chats', methods=['GET'])
 @login_required
+@versioned('chats')
 def get_chats():
-    db = SessionLocal()
-    user = db.query(User).filter_by(telegram_id=session['user_id']).first()
-    if not user: return jsonify({'error': 'User not found'}), 404
-    chats = db.query(UserChat).filter_by(user_id=user.id, is_active=True).all()
-    db.close()
-    return jsonify({'chats': [{'id': c.chat_id, 'name': c.chat_name, 'type': c.chat_type} for c in chats]})
+    query = get_db().query(UserChat).filter_by(user_id=current_user().id, is_active=True)
+    name = (request.args.get('q') or '').strip()
+    if name:
+        query = query.filter(UserChat.chat_name.ilike(contains_pattern(name), escape='\\'))
+    if request.args.get('type'):
+        query = query.filter(UserChat.chat_type == request.args['type'])
+    try:
+        chats, next_cursor = paginate(query, (UserChat.id,), request.args.get('cursor'),
+                                      page_size(request.args.get('limit'), default=200), descending=False)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'chats': [{'id': c.chat_id, 'name': c.chat_name, 'type': c.chat_type} for c in chats],
+                    'next_cursor': next_cursor})
 
 
 async def refresh_chats_async(user_id: int):
@@ -472,13 +660,11 @@ async def refresh_chats_async(user_id: int):
         invalidate_user_session(user.telegram_id)
         raise rpcerrorlist.AuthKeyUnregisteredError
 
-    api_id = int(decrypt_data(user.api_id_encrypted))
-    api_hash = decrypt_data(user.api_hash_encrypted)
-    session_string = decrypt_data(user.session_string_encrypted)
-    client = TelegramClient(StringSession(session_string), api_id, api_hash, loop=main_loop)
+    api_id, api_hash, session_string = credential_cache.get(user)
     try:
-        await client.connect()
-        await update_user_chats(user.id, client, db)
+        async with client_pool.client(user.id, api_id, api_hash, session_string) as client:
+            await update_user_chats(user.id, client, db)
+        session_validity.mark_valid(user.telegram_id)
         count = db.query(UserChat).filter_by(user_id=user.id, is_active=True).count()
         return count
     except Exception as e:
@@ -486,40 +672,30 @@ async def refresh_chats_async(user_id: int):
             invalidate_user_session(user.telegram_id)
         raise e
     finally:
-        if client.is_connected(): await client.disconnect()
         db.close()
 
 
 @app.route('/api/chats/refresh', methods=['POST'])
 @login_required
 def refresh_chats():
-    db = SessionLocal()
     try:
-        user = db.query(User).filter_by(telegram_id=session['user_id']).first()
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
-        count = run_async(refresh_chats_async(user.id))
+        count = run_async(refresh_chats_async(current_user().id))
         return jsonify({'success': True, 'count': count})
     except Exception as e:
         if is_auth_error(e):
             return jsonify({'error': 'Your Telegram session has expired. Please log out and log back in.'}), 401
         return jsonify({'error': str(e)}), 500
-    finally:
-        db.close()
 
 
 @app.route('/api/schedule', methods=['POST'])
 @login_required
 def schedule_message():
-    db = SessionLocal()
+    db, user = get_db(), current_user()
     try:
-        user = db.query(User).filter_by(telegram_id=session['user_id']).first()
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
-
         task = create_or_update_task_from_request(request, user.id, db)
         db.add(task)
         db.commit()
+        publish_task_event(user.id, 'created', task)
 
         send_immediately = request.form.get('send_immediately') == 'true'
 
@@ -536,18 +712,16 @@ def schedule_message():
         db.rollback()
         print(f"Error in schedule_message: {e}")
         return jsonify({'error': str(e)}), 400
-    finally:
-        db.close()
 
 
 @app.route('/api/tasks/<task_id>/update', methods=['POST'])
 @login_required
 def update_task_route(task_id):
-    db = SessionLocal()
+    db, user = get_db(), current_user()
     try:
-        user = db.query(User).filter_by(telegram_id=session['user_id']).first()
         task = db.query(Task).filter_by(id=task_id, user_id=user.id).first()
         if not task: return jsonify({'error': 'Task not found'}), 404
+        old_status = task.status
         keep_existing_urls = json.loads(request.form.get('keep_existing', '[]'))
         if task.file_paths:
             for file_path in task.file_paths:
@@ -561,27 +735,22 @@ def update_task_route(task_id):
         create_or_update_task_from_request(request, user.id, db, task_id_to_update=task_id,
                                            existing_files=kept_file_paths)
         db.commit()
+        publish_task_event(user.id, 'updated', task, old_status=old_status)
         return jsonify({'success': True, 'message': 'Task updated successfully'})
     except Exception as e:
         db.rollback()
         return jsonify({'error': str(e)}), 400
-    finally:
-        db.close()
 
 
 def create_or_update_task_from_request(req, user_db_id, db, task_id_to_update=None, existing_files=None):
     if task_id_to_update:
         task = db.query(Task).filter_by(id=task_id_to_update, user_id=user_db_id).first()
-        try:
-            if scheduler.get_job(task.id):
-                scheduler.remove_job(task.id)
-        except Exception:
-            pass
+        scheduler.remove_job(task.id)
     else:
         task = Task(id=secrets.token_hex(16), user_id=user_db_id)
         existing_files = []
 
-    task.chat_ids = [int(id.strip()) for id in req.form.get('chat_ids').split(',')]
+    set_task_targets(task, [int(id.strip()) for id in req.form.get('chat_ids').split(',')])
     task.name = req.form.get('task_name', '').strip()
     task.message = req.form.get('message')
 
@@ -632,14 +801,7 @@ def create_or_update_task_from_request(req, user_db_id, db, task_id_to_update=No
     task.next_run = calculate_next_run(task.interval_value, task.interval_unit)
 
     # Add to Scheduler using 'seconds'
-    scheduler.add_job(
-        send_scheduled_message,
-        IntervalTrigger(seconds=task.interval_value, timezone='UTC'),
-        args=[user_db_id, task.id],
-        id=task.id,
-        replace_existing=True,
-        next_run_time=task.next_run
-    )
+    scheduler.add_job(task.id, user_db_id, task.interval_value, task.next_run)
 
     if not task_id_to_update: return task
     return None
@@ -663,241 +825,302 @@ def task_to_dict(t: Task, user_timezone_str: str):
             'next_run': convert_time(t.next_run)}
 
 
+def publish_task_event(user_db_id, action, task=None, task_id=None, old_status=None, executions=0, **extra):
+    """
+    Push a task change to the user's open /api/events streams, followed by
+    the matching change to /api/stats. Call before the session is closed.
+    Writes the task counters, so never call it on the event loop.
+    """
+    new_status = task.status if task is not None and action != 'deleted' else None
+    old, new = status_counts(old_status), status_counts(new_status)
+    deltas = {key: new[key] - old[key] for key in new if new[key] != old[key]}
+    if executions:
+        deltas['total_executions'] = executions
+
+    if task_counters:
+        task_counters.apply(user_db_id, deltas)
+
+    payload = task_to_dict(task, 'UTC') if new_status else {'id': task_id or task.id}
+    event_broker.publish(user_db_id, 'task', {'action': action, 'task': payload, **extra})
+    if deltas:
+        event_broker.publish(user_db_id, 'stats', {'deltas': deltas})
+
+
+def task_page(query, order_column):
+    """
+    Respond with one page of tasks, newest `order_column` first. Takes
+    ?status=, ?q= (name contains), ?chat= (sends to that chat id), ?limit=
+    and ?cursor= (the next_cursor of the previous page).
+    """
+    args = request.args
+    if args.get('status'):
+        query = query.filter(Task.status == args['status'])
+    name = (args.get('q') or '').strip()
+    if name:
+        query = query.filter(Task.name.ilike(contains_pattern(name), escape='\\'))
+    chat_id = args.get('chat', type=int)
+    if chat_id is not None:
+        query = query.filter(Task.targets.any(TaskTarget.chat_id == chat_id))
+    try:
+        tasks, next_cursor = paginate(query, (order_column, Task.id), args.get('cursor'), page_size(args.get('limit')))
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    user_timezone = args.get('timezone', 'UTC')
+    return jsonify({'tasks': [task_to_dict(t, user_timezone) for t in tasks], 'next_cursor': next_cursor})
+
+
 @app.route('/api/tasks', methods=['GET'])
 @login_required
+@versioned('tasks')
 def get_tasks():
-    user_timezone = request.args.get('timezone', 'UTC')
-    db = SessionLocal()
-    user = db.query(User).filter_by(telegram_id=session['user_id']).first()
-    if not user: return jsonify({'error': 'User not found'}), 404
-    tasks = db.query(Task).filter_by(user_id=user.id).filter(Task.status != 'archived').order_by(
-        Task.created_at.desc()).all()
-    db.close()
-    return jsonify({'tasks': [task_to_dict(t, user_timezone) for t in tasks]})
+    query = get_db().query(Task).filter(Task.user_id == current_user().id, Task.status != 'archived')
+    return task_page(query, Task.created_at)
 
 
 @app.route('/api/tasks/archived', methods=['GET'])
 @login_required
+@versioned('tasks')
 def get_archived_tasks():
-    user_timezone = request.args.get('timezone', 'UTC')
-    db = SessionLocal()
-    user = db.query(User).filter_by(telegram_id=session['user_id']).first()
-    if not user: return jsonify({'error': 'User not found'}), 404
-    tasks = db.query(Task).filter_by(user_id=user.id, status='archived').order_by(Task.updated_at.desc()).all()
-    db.close()
-    return jsonify({'tasks': [task_to_dict(t, user_timezone) for t in tasks]})
+    query = get_db().query(Task).filter(Task.user_id == current_user().id, Task.status == 'archived')
+    return task_page(query, Task.updated_at)
 
 
 @app.route('/api/tasks/<task_id>', methods=['GET'])
 @login_required
 def get_single_task(task_id):
     user_timezone = request.args.get('timezone', 'UTC')
-    db = SessionLocal()
-    try:
-        user = db.query(User).filter_by(telegram_id=session['user_id']).first()
-        if not user: return jsonify({'error': 'User not found'}), 404
-        task = db.query(Task).filter(Task.id == task_id, Task.user_id == user.id).first()
-        if not task: return jsonify({'error': 'Task not found'}), 404
-        return jsonify({'task': task_to_dict(task, user_timezone)})
-    finally:
-        db.close()
+    task = get_db().query(Task).filter(Task.id == task_id, Task.user_id == current_user().id).first()
+    if not task: return jsonify({'error': 'Task not found'}), 404
+    return jsonify({'task': task_to_dict(task, user_timezone)})
 
 
 @app.route('/api/tasks/<task_id>', methods=['DELETE'])
 @login_required
 def delete_task(task_id):
-    db = SessionLocal()
-    user = db.query(User).filter_by(telegram_id=session['user_id']).first()
+    db, user = get_db(), current_user()
     task = db.query(Task).filter_by(id=task_id, user_id=user.id).first()
     if not task: return jsonify({'error': 'Task not found'}), 404
     if task.file_paths:
         for file_path in task.file_paths:
             if os.path.exists(file_path): os.remove(file_path)
-    try:
-        if scheduler.get_job(task.id):
-            scheduler.remove_job(task.id)
-    except Exception:
-        pass
+    scheduler.remove_job(task.id)
+    old_status, executions = task.status, task.execution_count or 0
+    # One statement however long the history is, instead of loading every row
+    db.execute(delete(TaskExecution).where(TaskExecution.task_id == task.id))
+    db.execute(delete(ExecutionRollup).where(ExecutionRollup.task_id == task.id))
     db.delete(task);
     db.commit();
-    db.close()
+    publish_task_event(user.id, 'deleted', task_id=task_id, old_status=old_status, executions=-executions)
     return jsonify({'success': True})
 
 
 @app.route('/api/tasks/<task_id>/pause', methods=['POST'])
 @login_required
 def pause_task(task_id):
-    db = SessionLocal()
-    user = db.query(User).filter_by(telegram_id=session['user_id']).first()
+    db, user = get_db(), current_user()
     task = db.query(Task).filter_by(id=task_id, user_id=user.id).first()
     if not task: return jsonify({'error': 'Task not found'}), 404
-    scheduler.pause_job(task_id);
+    scheduler.remove_job(task_id)
+    old_status = task.status
     task.status = 'paused'
     task.next_run = None
     db.commit();
-    db.close()
+    publish_task_event(user.id, 'paused', task, old_status=old_status)
     return jsonify({'success': True})
 
 
 @app.route('/api/tasks/<task_id>/resume', methods=['POST'])
 @login_required
 def resume_task(task_id):
-    db = SessionLocal()
-    user = db.query(User).filter_by(telegram_id=session['user_id']).first()
+    db, user = get_db(), current_user()
     task = db.query(Task).filter_by(id=task_id, user_id=user.id).first()
     if not task: return jsonify({'error': 'Task not found'}), 404
 
     # Calculate next run
     new_next_run = calculate_next_run(task.interval_value, task.interval_unit)
+    scheduler.add_job(task.id, user.id, interval_in_seconds(task.interval_value, task.interval_unit),
+                      new_next_run)
 
-    # Logic to handle 'seconds' unit vs legacy units
-    trigger_args = {'seconds': task.interval_value} if task.interval_unit == 'seconds' else {
-        task.interval_unit: task.interval_value}
-
-    scheduler.reschedule_job(task_id,
-                             trigger=IntervalTrigger(**trigger_args, timezone='UTC'),
-                             next_run_time=new_next_run)
-    scheduler.resume_job(task_id)
-
+    old_status = task.status
     task.status = 'active'
     task.next_run = new_next_run
     db.commit()
-    db.close()
+    publish_task_event(user.id, 'resumed', task, old_status=old_status)
     return jsonify({'success': True})
 
 
 @app.route('/api/tasks/<task_id>/archive', methods=['POST'])
 @login_required
 def archive_task(task_id):
-    db = SessionLocal()
-    user = db.query(User).filter_by(telegram_id=session['user_id']).first()
+    db, user = get_db(), current_user()
     task = db.query(Task).filter_by(id=task_id, user_id=user.id).first()
     if not task: return jsonify({'error': 'Task not found'}), 404
-    try:
-        if scheduler.get_job(task.id):
-            scheduler.remove_job(task.id)
-    except Exception:
-        pass
+    scheduler.remove_job(task.id)
+    old_status = task.status
     task.status = 'archived';
     task.next_run = None
     db.commit();
-    db.close()
+    publish_task_event(user.id, 'archived', task, old_status=old_status)
     return jsonify({'success': True})
 
 
 @app.route('/api/tasks/<task_id>/unarchive', methods=['POST'])
 @login_required
 def unarchive_task(task_id):
-    db = SessionLocal()
+    db, user = get_db(), current_user()
     try:
-        user = db.query(User).filter_by(telegram_id=session['user_id']).first()
         task = db.query(Task).filter_by(id=task_id, user_id=user.id).first()
         if not task: return jsonify({'error': 'Task not found'}), 404
 
+        old_status = task.status
         task.status = 'active'
         task.next_run = calculate_next_run(task.interval_value, task.interval_unit)
-
-        # Logic to handle 'seconds' unit vs legacy units
-        trigger_args = {'seconds': task.interval_value} if task.interval_unit == 'seconds' else {
-            task.interval_unit: task.interval_value}
-
-        scheduler.add_job(send_scheduled_message,
-                          IntervalTrigger(**trigger_args, timezone='UTC'),
-                          args=[user.id, task.id], id=task.id, replace_existing=True, next_run_time=task.next_run)
+        scheduler.add_job(task.id, user.id, interval_in_seconds(task.interval_value, task.interval_unit),
+                          task.next_run)
         db.commit()
+        publish_task_event(user.id, 'unarchived', task, old_status=old_status)
         return jsonify({'success': True})
     except Exception as e:
         db.rollback()
         return jsonify({'error': str(e)}), 400
-    finally:
-        db.close()
+
+
+@app.route('/api/events')
+@login_required
+def stream_events():
+    """Server-sent events: task changes and stats deltas for the logged-in user"""
+    subscription = event_broker.subscribe(current_user().id)
+    if subscription is None:
+        return jsonify({'error': 'Too many open event streams'}), 429
+    # The stream can stay open for hours; don't hold a database connection for it
+    close_db()
+
+    def generate():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                item = subscription.get(timeout=SSE_KEEPALIVE_SECONDS)
+                # Comment lines keep proxies from closing an idle stream
+                yield format_sse(item) if item else ': keepalive\n\n'
+        finally:
+            event_broker.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 @app.route('/api/settings/notifications', methods=['GET', 'POST'])
 @login_required
 def notification_settings():
-    db = SessionLocal()
-    user = db.query(User).filter_by(telegram_id=session['user_id']).first()
+    user = current_user()
     if request.method == 'POST':
         user.notifications_enabled = request.json.get('enabled', False)
-        db.commit()
-        db.close()
+        get_db().commit()
         return jsonify({'success': True})
-    enabled = user.notifications_enabled if user else True
-    db.close()
-    return jsonify({'enabled': enabled})
+    return jsonify({'enabled': user.notifications_enabled})
 
 
 @app.route('/api/settings/simplified_login', methods=['GET', 'POST'])
 @login_required
 def simplified_login_settings():
-    db = SessionLocal()
-    user = db.query(User).filter_by(telegram_id=session['user_id']).first()
+    user = current_user()
     if request.method == 'POST':
         user.simplified_login_enabled = request.json.get('enabled', False)
-        db.commit()
-        db.close()
+        get_db().commit()
         return jsonify({'success': True})
-    enabled = user.simplified_login_enabled if user else False
-    db.close()
-    return jsonify({'enabled': enabled})
+    return jsonify({'enabled': user.simplified_login_enabled})
 
 
 @app.route('/api/stats', methods=['GET'])
 @login_required
+@versioned('stats')
 def get_stats():
-    db = SessionLocal()
-    user = db.query(User).filter_by(telegram_id=session['user_id']).first()
-    if not user: return jsonify({'error': 'User not found'}), 404
-    tasks = db.query(Task).filter_by(user_id=user.id).all()
-    db.close()
-    return jsonify({'total_tasks': len([t for t in tasks if t.status != 'archived']),
-                    'active_tasks': sum(1 for t in tasks if t.status == 'active'),
-                    'archived_tasks': sum(1 for t in tasks if t.status == 'archived'),
-                    'total_executions': sum(t.execution_count for t in tasks)})
+    db, user = get_db(), current_user()
+    stats = task_counters.get(db, user.id) if task_counters else None
+    return jsonify({**(stats or task_stats(db, user.id)),
+                    'history': execution_history(db, user.id, EXECUTION_STATS_DAYS)})
 
 
 @app.route('/api/admin/stats', methods=['GET'])
 @admin_required
 def get_admin_stats():
-    db = SessionLocal()
+    db = get_db()
     total_users = db.query(User).count()
-    total_tasks = db.query(Task).filter(Task.status != 'archived').count()
-    total_executions = sum(t.execution_count for t in db.query(Task).all())
-    db.close()
+    stats = (task_counters.get(db) if task_counters else None) or task_stats(db)
     return jsonify({
         'total_users': total_users,
-        'total_tasks': total_tasks,
-        'total_executions': total_executions
+        'total_tasks': stats['total_tasks'],
+        'total_executions': stats['total_executions'],
+        'history': execution_history(db, days=EXECUTION_STATS_DAYS),
+        'task_counters': task_counters.stats() if task_counters else None,
+        'client_pool': client_pool.stats(),
+        'credential_cache': credential_cache.stats(),
+        'user_cache': user_cache.stats(),
+        'session_validity': session_validity.stats(),
+        'execution_log': execution_writer.stats(),
+        'execution_retention': execution_retention.stats(),
+        'notifications': notifications.stats() if notifications else None,
+        'event_streams': event_broker.stats(),
+        'chat_sync': {
+            'engine': chat_sync.stats(),
+            'jobs': chat_supervisor.summary()
+        },
+        'scheduler': {
+            'jobs': len(scheduler.get_jobs()),
+            'in_flight': scheduler.in_flight(),
+            'shards': shard_coordinator.stats() if shard_coordinator else None
+        }
     })
 
 
+@app.route('/api/admin/chat_sync', methods=['GET'])
+@admin_required
+def get_admin_chat_sync():
+    return jsonify({'engine': chat_sync.stats(), 'jobs': chat_supervisor.jobs()})
+
+
 @app.route('/api/admin/users', methods=['GET'])
 @admin_required
+@versioned('users')
 def get_admin_users():
-    db = SessionLocal()
-    users = db.query(User).options(selectinload(User.tasks)).order_by(User.created_at.desc()).all()
+    users = get_db().query(User).options(selectinload(User.tasks)).order_by(User.created_at.desc()).all()
     users_data = [{
         'id': u.id, 'telegram_id': u.telegram_id, 'first_name': u.first_name,
         'username': u.username, 'is_admin': u.is_admin,
         'last_login': u.last_login.isoformat() if u.last_login else None,
         'task_count': len(u.tasks)
     } for u in users]
-    db.close()
     return jsonify({'users': users_data})
 
 
 @app.route('/api/admin/tasks/<int:user_id>', methods=['GET'])
 @admin_required
 def get_admin_user_tasks(user_id):
-    user_timezone = request.args.get('timezone', 'UTC')
-    db = SessionLocal()
-    tasks = db.query(Task).filter_by(user_id=user_id).order_by(Task.created_at.desc()).all()
-    db.close()
-    return jsonify({'tasks': [task_to_dict(t, user_timezone) for t in tasks]})
+    return task_page(get_db().query(Task).filter(Task.user_id == user_id), Task.created_at)
+
+
+async def send_scheduled_message(user_db_id: int, task_id: str):
+    # The database work runs on worker threads: a slow query or a busy SQLite
+    # must not stall every other send, pooled client and stream on the loop
+    loop = asyncio.get_running_loop()
+    try:
+        claimed = await loop.run_in_executor(None, claim_scheduled_task, user_db_id, task_id)
+        if claimed is None:
+            return
+        user, task = claimed
+
+        # Execute the sending logic
+        success, s_count, f_count = await send_message_async(user, task)
+
+        await loop.run_in_executor(None, finish_scheduled_task, user_db_id, task_id, success, s_count, f_count)
+    except Exception as e:
+        print(f"Error executing task {task_id}: {e}")
+        # Ensure we unlock the task if it crashes
+        await loop.run_in_executor(None, unlock_task, task_id)
 
 
-def send_scheduled_message(user_db_id: int, task_id: str):
+def claim_scheduled_task(user_db_id: int, task_id: str):
+    """Mark a due task as running; returns the (user, task) to send, detached, or None"""
     db = SessionLocal()
     try:
         # --- FIX START: Atomic Update ---
@@ -914,7 +1137,10 @@ def send_scheduled_message(user_db_id: int, task_id: str):
         # If result is 0, it means the task is already running or paused/archived.
         # We stop immediately to prevent double/triple posting.
         if result == 0:
-            return
+            # Deleted, paused or archived through another worker: stop firing it here
+            if db.query(Task.status).filter_by(id=task_id).scalar() != 'active':
+                scheduler.remove_job(task_id)
+            return None
         # --- FIX END ---
 
         # Re-fetch the task object now that we have locked it
@@ -926,18 +1152,27 @@ def send_scheduled_message(user_db_id: int, task_id: str):
             invalidate_user_session(user.telegram_id if user else 0)
             task.is_running = False
             db.commit()
-            return
+            return None
 
-        # Execute the sending logic
-        success, s_count, f_count = run_async(send_message_async(user, task))
+        db.expunge_all()
+        return user, task
+    finally:
+        db.close()
 
-        # Refresh state to ensure we have latest DB data
-        db.refresh(task)
-        db.refresh(user)
+
+def finish_scheduled_task(user_db_id: int, task_id: str, success, s_count, f_count):
+    """Record a finished run, unlock the task and notify the user"""
+    db = SessionLocal()
+    try:
+        # Fresh rows: the task may have been edited while it was sending
+        task = db.query(Task).filter_by(id=task_id).first()
+        user = db.query(User).filter_by(id=user_db_id).first()
+        if not task or not user:
+            return
 
         # Update next run time
         job = scheduler.get_job(task.id)
-        next_run_time = job.next_run_time.replace(tzinfo=None) if job else None
+        next_run_time = job.next_run_time if job else None
 
         # If job is missing (e.g. was deleted during run), calculate manually to prevent null error
         if not next_run_time and task.status == 'active':
@@ -948,66 +1183,87 @@ def send_scheduled_message(user_db_id: int, task_id: str):
         task.next_run = next_run_time
         task.is_running = False
         db.commit()
+        publish_task_event(user.id, 'executed', task, old_status=task.status, executions=1,
+                           result={'success': success, 'sent': s_count, 'failed': f_count})
 
         if user.notifications_enabled:
             send_task_notification(user.telegram_id, task, success, s_count, f_count)
-
-    except Exception as e:
-        print(f"Error executing task {task_id}: {e}")
+    except Exception:
         db.rollback()
-        # Ensure we unlock the task if it crashes
-        try:
-            db.query(Task).filter_by(id=task_id).update({"is_running": False})
-            db.commit()
-        except:
-            pass
+        raise
+    finally:
+        db.close()
+
+
+def unlock_task(task_id: str):
+    db = SessionLocal()
+    try:
+        db.query(Task).filter_by(id=task_id).update({"is_running": False})
+        db.commit()
+    except:
+        pass
     finally:
         db.close()
 
 async def send_message_async(user: User, task: Task):
+    started_at = datetime.utcnow()
+    results = await deliver_task(user, task)
+    await execution_writer.record(task.id, started_at, results)
+
+    s_count = sum(1 for _, error in results if error is None)
+    return s_count > 0, s_count, len(results) - s_count
+
+async def deliver_task(user: User, task: Task):
+    """Send a task to all its chats; returns [(chat_id, error or None)]"""
     if not user.session_string_encrypted:
         invalidate_user_session(user.telegram_id)
-        return False, 0, len(task.chat_ids)
+        return [(chat_id, 'NoSession') for chat_id in task.chat_ids]
 
     try:
-        api_id = int(decrypt_data(user.api_id_encrypted))
-        api_hash = decrypt_data(user.api_hash_encrypted)
-        session_string = decrypt_data(user.session_string_encrypted)
-    except Exception:
+        api_id, api_hash, session_string = credential_cache.get(user)
+    except Exception as e:
         invalidate_user_session(user.telegram_id)
-        return False, 0, len(task.chat_ids)
+        return [(chat_id, e) for chat_id in task.chat_ids]
 
-    client = TelegramClient(StringSession(session_string), api_id, api_hash, loop=main_loop)
-    s_count, f_count = 0, 0
     message = task.message or ""
 
     try:
-        await client.connect()
-        for chat_id in task.chat_ids:
-            try:
-                if task.file_paths:
-                    await client.send_file(chat_id, task.file_paths, caption=message)
+        async with client_pool.client(user.id, api_id, api_hash, session_string) as client:
+            media = None
+            if task.file_paths:
+                # Upload each file once for the whole execution, not once per chat
+                media = MediaStager(client, user.id, task.file_paths)
+                await media.stage()
+                print(f"Task {task.id}: staged {len(task.file_paths)} files "
+                      f"({media.uploaded} uploaded, {media.reused} reused)")
+
+            async def send_one(chat_id):
+                if media:
+                    await media.send(chat_id, message)
                 else:
                     await client.send_message(chat_id, message)
-                s_count += 1
-            except Exception as e:
-                print(f"Send Error (Task {task.id} to {chat_id}): {e}")
-                f_count += 1
-                if is_auth_error(e):
-                    invalidate_user_session(user.telegram_id)
-                    break
-            await asyncio.sleep(2)
+
+            results = await fanout.fan_out(user.id, task.chat_ids, send_one)
+
+        auth_failed = False
+        for chat_id, error in results:
+            if error is None:
+                continue
+            print(f"Send Error (Task {task.id} to {chat_id}): {error}")
+            auth_failed = auth_failed or is_auth_error(error)
+        if auth_failed:
+            invalidate_user_session(user.telegram_id)
+        elif any(error is None for _, error in results):
+            session_validity.mark_valid(user.telegram_id)
+        return results
     except Exception as e:
         if is_auth_error(e):
             invalidate_user_session(user.telegram_id)
-        return False, s_count, len(task.chat_ids) - s_count
-    finally:
-        if client.is_connected(): await client.disconnect()
-    return s_count > 0, s_count, f_count
+        return [(chat_id, e) for chat_id in task.chat_ids]
 
 
 def send_task_notification(telegram_id, task, success, s_count, f_count):
-    if not BOT_TOKEN or not TELEGRAM_BOT_AVAILABLE:
+    if not notifications:
         return
 
     emoji = '✅' if success else '❌'
@@ -1021,50 +1277,48 @@ def send_task_notification(telegram_id, task, success, s_count, f_count):
     if f_count > 0:
         text += f"\n⚠️ Failed: {f_count} chats"
 
-    async def send_notif():
-        try:
-            bot = Bot(token=BOT_TOKEN)
-            await bot.send_message(chat_id=telegram_id, text=text)
-        except Exception as e:
-            print(f"Failed to send bot notification: {e}")
-
-    asyncio.run_coroutine_threadsafe(send_notif(), main_loop)
+    summary = f"{emoji} {task_identifier}: {s_count}/{len(task.chat_ids)} chats"
+    notifications.notify(telegram_id, text, summary=summary, ok=success)
 
 
-async def monitor_user_chats(user_db_id: int):
+def load_user_credentials(user_db_id: int):
+    """(api_id, api_hash, session_string) of a logged-in user, or None"""
     db = SessionLocal()
-    user = db.query(User).filter_by(id=user_db_id).first()
-    if not user or not user.session_string_encrypted:
+    try:
+        user = db.query(User).filter_by(id=user_db_id).first()
+        if not user or not user.session_string_encrypted:
+            return None
+        try:
+            return credential_cache.get(user)
+        except Exception:
+            invalidate_user_session(user.telegram_id)
+            return None
+    finally:
         db.close()
-        return
 
+
+def make_chat_monitor(user_db_id: int, sync_slots):
+    return ChatMonitor(user_db_id, client_pool, chat_sync, SessionLocal, load_user_credentials,
+                       update_user_chats, mode=CHAT_SYNC_MODE, poll_interval=CHAT_SYNC_POLL_INTERVAL,
+                       reconcile_interval=CHAT_SYNC_RECONCILE_INTERVAL, sync_slots=sync_slots)
+
+
+def invalidate_user_session_by_id(user_db_id: int):
+    if on_main_loop():
+        main_loop.run_in_executor(None, invalidate_user_session_by_id, user_db_id)
+        return
+    db = SessionLocal()
     try:
-        api_id = int(decrypt_data(user.api_id_encrypted))
-        api_hash = decrypt_data(user.api_hash_encrypted)
-        session_string = decrypt_data(user.session_string_encrypted)
-    except Exception:
+        telegram_id = db.query(User.telegram_id).filter_by(id=user_db_id).scalar()
+    finally:
         db.close()
-        invalidate_user_session(user.telegram_id)
-        return
+    if telegram_id:
+        invalidate_user_session(telegram_id)
 
-    db.close()
 
-    client = TelegramClient(StringSession(session_string), api_id, api_hash, loop=main_loop)
-    while True:
-        db = SessionLocal()
-        try:
-            user_check = db.query(User).filter_by(id=user_db_id).first()
-            if not user_check or not user_check.session_string_encrypted: break
-            if not client.is_connected(): await client.connect()
-            await update_user_chats(user_db_id, client, db)
-        except Exception as e:
-            if is_auth_error(e):
-                invalidate_user_session(user_db_id)
-            print(f"Chat Monitor Error for user {user_db_id}: {e}");
-            break
-        finally:
-            db.close()
-        await asyncio.sleep(300)
+chat_supervisor = ChatSyncSupervisor(main_loop, make_chat_monitor, max_concurrent=CHAT_SYNC_MAX_CONCURRENT,
+                                     spread=min(CHAT_SYNC_POLL_INTERVAL, CHAT_SYNC_RECONCILE_INTERVAL),
+                                     is_auth_error=is_auth_error, on_auth_error=invalidate_user_session_by_id)
 
 
 async def update_user_chats(user_db_id, client, db):
@@ -1077,7 +1331,7 @@ async def update_user_chats(user_db_id, client, db):
         dialogs = await client.get_dialogs()
     except Exception as e:
         print(f"Error fetching dialogs: {e}")
-        return
+        return None
 
     # 1. ORGANIZE DIALOGS BY NAME
     # We group them to detect duplicates (Same Name = Potential Migration)
@@ -1107,6 +1361,12 @@ async def update_user_chats(user_db_id, client, db):
                 dialogs_by_name[chat_name] = []
             dialogs_by_name[chat_name].append(chat_obj)
 
+    # The rest is database work: on a worker thread, so the loop keeps serving other clients
+    return await asyncio.get_running_loop().run_in_executor(None, save_user_chats, user_db_id, db, dialogs_by_name)
+
+
+def save_user_chats(user_db_id, db, dialogs_by_name):
+    """Steps 2 and 3 of update_user_chats; blocks on the database, so never call it on the event loop"""
     # 2. RESOLVE CONFLICTS (Supergroup vs Group)
     final_active_chats = []
 
@@ -1127,30 +1387,20 @@ async def update_user_chats(user_db_id, client, db):
                 print(f"⚔️ Conflict resolved for '{name}': Supergroup ({winner['id']}) wins.")
 
                 # FIX TASKS: Move any task using a Loser ID to the Winner ID
-                user_tasks = db.query(Task).filter_by(user_id=user_db_id).all()
-                tasks_dirty = False
-
                 for loser in losers:
                     loser_id = loser['id']
                     # Also explicit check: If the group is marked 'deactivated' or 'migrated_to'
                     if hasattr(loser['entity'], 'migrated_to') and loser['entity'].migrated_to:
                         print(f"   -> Confirmed migration flag on old group {loser_id}")
 
-                    # Scan tasks
-                    for task in user_tasks:
-                        current_ids = task.chat_ids if isinstance(task.chat_ids, list) else []
-                        if loser_id in current_ids:
-                            print(f"   -> 🩹 Fixing Task {task.id}: Swapping {loser_id} -> {winner['id']}")
-                            new_ids = [winner['id'] if x == loser_id else x for x in current_ids]
-                            task.chat_ids = list(set(new_ids))
-                            tasks_dirty = True
-                            db.add(task)
+                    # Indexed lookup through task_targets instead of scanning every task
+                    for task_id in retarget_chat(db, user_db_id, loser_id, winner['id']):
+                        print(f"   -> 🩹 Fixing Task {task_id}: Swapping {loser_id} -> {winner['id']}")
 
                     # Delete the loser from DB immediately so it doesn't reappear
                     db.query(UserChat).filter_by(user_id=user_db_id, chat_id=loser_id).delete()
 
-                if tasks_dirty:
-                    db.commit()
+                db.commit()
 
                 # Only add the winner to the active list
                 final_active_chats.append(winner)
@@ -1159,35 +1409,75 @@ async def update_user_chats(user_db_id, client, db):
                 final_active_chats.extend(chat_list)
 
     # 3. SAVE TO DATABASE
-    active_ids_list = [c['id'] for c in final_active_chats]
-
-    for chat in final_active_chats:
-        # Update or Insert
-        existing = db.query(UserChat).filter_by(user_id=user_db_id, chat_id=chat['id']).first()
-        if existing:
-            existing.chat_name = chat['name']
-            existing.chat_type = chat['type']
-            existing.is_active = True
-        else:
-            db.add(UserChat(
-                user_id=user_db_id,
-                chat_id=chat['id'],
-                chat_name=chat['name'],
-                chat_type=chat['type'],
-                is_active=True
-            ))
-
-    # 4. CLEANUP (Deactivate chats not in our final list)
-    db.query(UserChat).filter(
-        UserChat.user_id == user_db_id,
-        UserChat.chat_id.notin_(active_ids_list)
-    ).update({'is_active': False}, synchronize_session=False)
-
+    # One diff against the stored chats: upsert new/changed ones, deactivate the rest
     try:
+        diff = chat_sync.sync(db, user_db_id, final_active_chats)
         db.commit()
     except Exception as e:
         print(f"Error saving chat updates: {e}")
         db.rollback()
+        return None
+    if any(count for key, count in diff.items() if key != 'unchanged'):
+        print(f"Chats synced for user {user_db_id}: {diff}")
+    return diff
+
+def restore_scheduled_tasks():
+    """Rebuild the due-task index from tasks.next_run; the tasks table is the source of truth"""
+    db = SessionLocal()
+    try:
+        # Nothing can be running yet in a fresh process
+        db.query(Task).filter(Task.is_running == True).update({'is_running': False}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+    scheduler.rebuild()
+
+
+def ensure_task_targets():
+    """Fill task_targets for tasks saved before the table existed"""
+    db = SessionLocal()
+    try:
+        filled = backfill_task_targets(db)
+        if filled:
+            print(f"✅ Created chat targets for {filled} tasks")
+    except Exception as e:
+        db.rollback()
+        print(f"Could not backfill task targets: {e}")
+    finally:
+        db.close()
+
+
+def restore_chat_monitors():
+    """Start a chat sync job for every logged-in user (that this worker owns)"""
+    db = SessionLocal()
+    try:
+        user_ids = [user_id for (user_id,) in db.query(User.id).filter(User.session_string_encrypted.isnot(None))]
+    finally:
+        db.close()
+    chat_supervisor.restore(user_ids)
+
+
+ensure_task_targets()
+if task_counters:
+    task_counters.rebuild()
+scheduler.start()
+execution_writer.start()
+execution_retention.start()
+if notifications:
+    notifications.start()
+    atexit.register(lambda: run_async(notifications.close()))
+session_validity.start()
+# Write out buffered execution history before the loop thread dies with the process
+atexit.register(lambda: run_async(execution_writer.close()))
+if shard_coordinator:
+    # Jobs are loaded shard by shard as leases are acquired
+    chat_supervisor.accepts = shard_coordinator.owns
+    shard_coordinator.listeners.append(restore_chat_monitors)
+    shard_coordinator.start()
+    atexit.register(shard_coordinator.release)
+else:
+    restore_scheduled_tasks()
+    restore_chat_monitors()
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
@@ -0,0 +1,183 @@
+"""
+Upload task media once per execution and remember Telegram's file references
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from telethon import utils
+from telethon.errors import (FileReferenceExpiredError, FileReferenceInvalidError, FileIdInvalidError,
+                             MediaEmptyError, MediaInvalidError, PhotoInvalidError)
+from telethon.tl import functions, types
+
+from database import SessionLocal, UploadedMedia
+
+# Errors meaning Telegram no longer accepts a stored file reference
+MEDIA_REJECTED_ERRORS = (FileReferenceExpiredError, FileReferenceInvalidError, FileIdInvalidError,
+                         MediaEmptyError, MediaInvalidError, PhotoInvalidError)
+
+# path -> (size, mtime, sha256) of the most recently hashed files, so unchanged files are not re-read every run
+DIGEST_CACHE_SIZE = int(os.getenv('MEDIA_DIGEST_CACHE_SIZE', 2048))
+_digest_cache = OrderedDict()
+_digest_lock = threading.Lock()
+
+
+def file_digest(path):
+    """sha256 of a file's content (blocking; call it from a worker thread)"""
+    stat = os.stat(path)
+    with _digest_lock:
+        entry = _digest_cache.get(path)
+        if entry is not None and entry[:2] == (stat.st_size, stat.st_mtime_ns):
+            _digest_cache.move_to_end(path)
+            return entry[2]
+
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    digest = h.hexdigest()
+
+    with _digest_lock:
+        _digest_cache[path] = (stat.st_size, stat.st_mtime_ns, digest)
+        _digest_cache.move_to_end(path)
+        while len(_digest_cache) > DIGEST_CACHE_SIZE:
+            _digest_cache.popitem(last=False)
+    return digest
+
+
+def _to_input_media(row):
+    if row.media_type == 'photo':
+        return types.InputMediaPhoto(types.InputPhoto(row.media_id, row.access_hash, row.file_reference))
+    return types.InputMediaDocument(types.InputDocument(row.media_id, row.access_hash, row.file_reference))
+
+
+def load_cached_media(user_id, digests):
+    """Returns {digest: InputMedia} for the digests this account has uploaded before"""
+    db = SessionLocal()
+    try:
+        rows = db.query(UploadedMedia).filter(UploadedMedia.user_id == user_id,
+                                              UploadedMedia.file_hash.in_(set(digests))).all()
+        now = datetime.utcnow()
+        for row in rows:
+            row.last_used = now
+        db.commit()
+        return {row.file_hash: _to_input_media(row) for row in rows}
+    finally:
+        db.close()
+
+
+def store_cached_media(user_id, digest, input_media):
+    """Remember the reference of a freshly uploaded file"""
+    media_type = 'photo' if isinstance(input_media, types.InputMediaPhoto) else 'document'
+    ref = input_media.id
+
+    db = SessionLocal()
+    try:
+        row = db.query(UploadedMedia).filter_by(user_id=user_id, file_hash=digest).first()
+        if not row:
+            row = UploadedMedia(user_id=user_id, file_hash=digest)
+            db.add(row)
+        row.media_type = media_type
+        row.media_id = ref.id
+        row.access_hash = ref.access_hash
+        row.file_reference = ref.file_reference
+        row.last_used = datetime.utcnow()
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Could not cache uploaded media: {e}")
+    finally:
+        db.close()
+
+
+def forget_cached_media(user_id, digests):
+    db = SessionLocal()
+    try:
+        db.query(UploadedMedia).filter(UploadedMedia.user_id == user_id,
+                                       UploadedMedia.file_hash.in_(set(digests))
+                                       ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+class MediaStager:
+    """
+    Turns a task's file paths into reusable InputMedia handles for one execution.
+
+    Each file is uploaded at most once per execution (or not at all when the
+    account has a still-valid reference cached), and every chat is sent the
+    same handles.
+    """
+
+    def __init__(self, client, user_id, file_paths):
+        self.client = client
+        self.user_id = user_id
+        self.file_paths = list(file_paths)
+        self.digests = []
+        self.media = []
+        self.generation = 0
+        self.uploaded = 0
+        self.reused = 0
+        self._lock = asyncio.Lock()
+
+    async def stage(self, use_cache=True):
+        """Resolve every file to an InputMedia, uploading only what is not cached"""
+        loop = asyncio.get_running_loop()
+        # Hashing reads whole files and the cache lookups hit the database; neither may block the loop
+        self.digests = [await loop.run_in_executor(None, file_digest, path) for path in self.file_paths]
+        cached = await loop.run_in_executor(None, load_cached_media, self.user_id, self.digests) if use_cache else {}
+
+        media = []
+        for path, digest in zip(self.file_paths, self.digests):
+            input_media = cached.get(digest)
+            if input_media is None:
+                input_media = await self._upload(path)
+                await loop.run_in_executor(None, store_cached_media, self.user_id, digest, input_media)
+                cached[digest] = input_media  # same file twice in one task
+                self.uploaded += 1
+            else:
+                self.reused += 1
+            media.append(input_media)
+        self.media = media
+
+    async def send(self, chat_id, caption):
+        """Send the staged media to a chat, re-uploading once if Telegram rejects a reference"""
+        generation = self.generation
+        try:
+            await self.client.send_file(chat_id, self.media, caption=caption)
+        except MEDIA_REJECTED_ERRORS as e:
+            print(f"Cached media rejected for user {self.user_id} ({e.__class__.__name__}), re-uploading")
+            await self._restage(generation)
+            await self.client.send_file(chat_id, self.media, caption=caption)
+
+    async def _restage(self, generation):
+        async with self._lock:
+            # Another chat already re-uploaded while we were waiting
+            if self.generation != generation:
+                return
+            await asyncio.get_running_loop().run_in_executor(None, forget_cached_media, self.user_id, self.digests)
+            await self.stage(use_cache=False)
+            self.generation += 1
+
+    async def _upload(self, path):
+        file_handle = await self.client.upload_file(path)
+        if utils.is_image(path):
+            uploaded = types.InputMediaUploadedPhoto(file_handle)
+        else:
+            attributes, mime_type = utils.get_attributes(path)
+            uploaded = types.InputMediaUploadedDocument(
+                file=file_handle, mime_type=mime_type, attributes=attributes,
+                nosound_video=True if mime_type.startswith('video/') else None
+            )
+
+        # Registering the upload (without sending it anywhere) gives a
+        # permanent id/access_hash/file_reference usable in any chat.
+        result = await self.client(functions.messages.UploadMediaRequest(types.InputPeerSelf(), media=uploaded))
+        if isinstance(result, types.MessageMediaPhoto):
+            return utils.get_input_media(result.photo)
+        return utils.get_input_media(result.document)
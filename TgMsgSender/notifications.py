@@ -0,0 +1,237 @@
+"""
+Bot notifications through one shared Bot, rate-limited, with digests for bursts
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+
+from fanout import AccountLimiter
+
+DIGEST_LINES = 20
+
+
+class _Message:
+    __slots__ = ('text', 'summary', 'ok', 'queued_at', 'attempts')
+
+    def __init__(self, text, summary, ok, now):
+        self.text = text
+        self.summary = summary or text.splitlines()[0]
+        self.ok = ok
+        self.queued_at = now
+        self.attempts = 0
+
+
+class _Chat:
+    __slots__ = ('queue', 'held', 'recent', 'digest_due', 'next_send')
+
+    def __init__(self):
+        self.queue = deque()  # sent one by one
+        self.held = []  # part of a burst, sent together as a digest at digest_due
+        self.recent = deque()  # arrival times within the digest window
+        self.digest_due = None
+        self.next_send = 0.0  # math.inf while a send to this chat is in flight
+
+
+class NotificationDispatcher:
+    """
+    Delivers bot messages from a bounded in-memory queue on `loop`.
+
+    Every message goes through the one `bot` (and so one HTTP connection
+    pool), at most `rate` per second overall and one per `chat_interval`
+    seconds per chat, which keeps under the Bot API limits instead of having
+    messages rejected. When a chat gets more than `digest_threshold`
+    notifications within `digest_window` seconds, the rest of the burst is
+    held and sent as one digest when the window ends. A RetryAfter from
+    Telegram pauses all sends for as long as it asks and the message is
+    retried. Once `max_pending` messages are waiting, new ones are dropped
+    and counted. notify() may be called from any thread.
+    """
+
+    def __init__(self, loop, bot, rate=25.0, chat_interval=1.0, digest_threshold=3, digest_window=60,
+                 max_pending=1000, concurrency=8, max_retries=3):
+        self.loop = loop
+        self.bot = bot
+        self.chat_interval = chat_interval
+        self.digest_threshold = digest_threshold
+        self.digest_window = digest_window
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.limiter = None
+        self._limits = (concurrency, rate, max(1, int(rate)))
+        self._chats = {}
+        self._pending = 0
+        self._wakeup = None
+        self._runner = None
+        self.sent = 0
+        self.digests = 0
+        self.retried = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def start(self):
+        self._call(self._start)
+
+    def notify(self, chat_id, text, summary=None, ok=True):
+        """Queue `text` for `chat_id`; `summary` (one line) stands for it in a digest"""
+        self._call(self._enqueue, chat_id, text, summary, ok)
+
+    async def close(self, timeout=5):
+        """Send what is queued, held digests included, for up to `timeout` seconds"""
+        if self._runner is None:
+            return
+        for chat in self._chats.values():
+            if chat.held:
+                chat.digest_due = 0.0
+        self._wake()
+        deadline = time.monotonic() + timeout
+        while self._pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        self._runner.cancel()
+        self._runner = None
+        try:
+            await self.bot.shutdown()
+        except Exception as e:
+            print(f"Could not shut down the notification bot: {e}")
+
+    def stats(self):
+        return {'pending': self._pending, 'chats': len(self._chats), 'sent': self.sent, 'digests': self.digests,
+                'retried': self.retried, 'failed': self.failed, 'dropped': self.dropped}
+
+    # --- Internals (loop thread only) ---
+    def _call(self, fn, *args):
+        try:
+            on_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            on_loop = False
+
+        if on_loop:
+            fn(*args)
+        else:
+            self.loop.call_soon_threadsafe(fn, *args)
+
+    def _start(self):
+        if self._runner is None:
+            self.limiter = AccountLimiter(*self._limits)
+            self._wakeup = asyncio.Event()
+            self._runner = self.loop.create_task(self._run())
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _enqueue(self, chat_id, text, summary, ok):
+        if self._pending >= self.max_pending:
+            self.dropped += 1
+            print(f"Notification queue is full, dropping a notification for {chat_id}")
+            return
+        if self._runner is None:
+            self._start()
+
+        now = time.monotonic()
+        chat = self._chats.setdefault(chat_id, _Chat())
+        while chat.recent and chat.recent[0] <= now - self.digest_window:
+            chat.recent.popleft()
+        chat.recent.append(now)
+
+        message = _Message(text, summary, ok, now)
+        if chat.digest_due is not None or len(chat.recent) > self.digest_threshold:
+            # A burst: whatever is still waiting joins the digest too
+            chat.held.extend(chat.queue)
+            chat.queue.clear()
+            chat.held.append(message)
+            if chat.digest_due is None:
+                chat.digest_due = now + self.digest_window
+        else:
+            chat.queue.append(message)
+        self._pending += 1
+        self._wake()
+
+    def _next_ready(self):
+        """(chat_id, None) for a chat that may send now, else (None, seconds until one may)"""
+        now = time.monotonic()
+        soonest = None
+        for chat_id, chat in list(self._chats.items()):
+            if chat.queue:
+                ready_at = chat.next_send
+            elif chat.held:
+                ready_at = max(chat.next_send, chat.digest_due)
+            else:
+                if chat.next_send <= now and (not chat.recent or chat.recent[-1] <= now - self.digest_window):
+                    del self._chats[chat_id]  # idle
+                continue
+            if ready_at <= now:
+                return chat_id, None
+            if ready_at != math.inf and (soonest is None or ready_at - now < soonest):
+                soonest = ready_at - now
+        return None, soonest
+
+    async def _run(self):
+        while True:
+            chat_id, delay = self._next_ready()
+            if chat_id is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            chat = self._chats[chat_id]
+            chat.next_send = math.inf
+            if chat.queue:
+                messages = [chat.queue.popleft()]
+            else:
+                messages, chat.held, chat.digest_due = chat.held, [], None
+            await self.limiter.semaphore.acquire()
+            try:
+                await self.limiter.wait_turn()
+            except BaseException:
+                self.limiter.semaphore.release()
+                raise
+            self.loop.create_task(self._send(chat_id, chat, messages))
+
+    async def _send(self, chat_id, chat, messages):
+        text = messages[0].text if len(messages) == 1 else self._digest(messages)
+        try:
+            await self.bot.initialize()
+            await self.bot.send_message(chat_id=chat_id, text=text)
+            self.sent += 1
+            if len(messages) > 1:
+                self.digests += 1
+            self._pending -= len(messages)
+        except Exception as e:
+            retry_after = getattr(e, 'retry_after', None)
+            attempts = max(m.attempts for m in messages) + 1
+            if retry_after is not None and attempts <= self.max_retries:
+                seconds = retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else retry_after
+                self.limiter.flood_wait(float(seconds))
+                for message in messages:
+                    message.attempts = attempts
+                self.retried += 1
+                if len(messages) == 1:
+                    chat.queue.appendleft(messages[0])
+                else:
+                    chat.held[:0] = messages
+                    chat.digest_due = 0.0
+            else:
+                self.failed += 1
+                self._pending -= len(messages)
+                print(f"Failed to send bot notification to {chat_id}: {e}")
+        finally:
+            chat.next_send = time.monotonic() + self.chat_interval
+            self.limiter.semaphore.release()
+            self._wake()
+
+    def _digest(self, messages):
+        minutes = max(1, round((time.monotonic() - messages[0].queued_at) / 60))
+        failed = sum(1 for m in messages if not m.ok)
+        lines = [f"📬 {len(messages)} tasks executed in the last "
+                 f"{'minute' if minutes == 1 else f'{minutes} minutes'}",
+                 f"✅ {len(messages) - failed} succeeded" + (f", ❌ {failed} with failures" if failed else ""),
+                 ""]
+        lines += [m.summary for m in messages[:DIGEST_LINES]]
+        if len(messages) > DIGEST_LINES:
+            lines.append(f"…and {len(messages) - DIGEST_LINES} more")
+        return '\n'.join(lines)
@@ -0,0 +1,74 @@
+"""
+Keyset (cursor) pagination for the list endpoints
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Clamp a ?limit= argument; missing or malformed means `default`"""
+    try:
+        return max(1, min(int(value), maximum))
+    except (TypeError, ValueError):
+        return default
+
+
+def contains_pattern(text):
+    """LIKE pattern matching `text` anywhere, with its wildcards escaped by a backslash"""
+    return '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def encode_cursor(values):
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError('wrong number of values')
+        return [datetime.fromisoformat(v) if c.type.python_type is datetime else v
+                for v, c in zip(values, columns)]
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f'Invalid cursor: {e}') from e
+
+
+def paginate(query, columns, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=True):
+    """
+    One page of `query` ordered by `columns`, the last of which must be
+    unique (usually the primary key), e.g. (Task.created_at, Task.id).
+
+    Rows after `cursor` are found with a range condition on the same columns,
+    so with a matching index every page costs the same however deep it is.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        query = query.filter(_after(columns, values, descending))
+    query = query.order_by(*(c.desc() if descending else c.asc() for c in columns))
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor([getattr(rows[-1], c.key) for c in columns])
+
+
+def _after(columns, values, descending):
+    # (a, b) < (x, y)  ==  a < x OR (a = x AND b < y), spelled out for every backend
+    first, value = columns[0], values[0]
+    beyond = first < value if descending else first > value
+    if len(columns) == 1:
+        return beyond
+    return or_(beyond, and_(first == value, _after(columns[1:], values[1:], descending)))
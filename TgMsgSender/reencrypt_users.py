@@ -0,0 +1,131 @@
+"""
+Re-encrypt stored user credentials into the current (v2) envelope format.
+
+Walks the users table in primary-key order, one batch at a time, so memory
+stays bounded no matter how many users there are. Each user gets one fresh
+data key shared by api_id, api_hash and session_string. Users already in the
+v2 format are skipped unless --force is given (e.g. to rotate data keys).
+A row is only overwritten if it still holds what was read, so credentials
+saved by a login meanwhile are kept. Safe to interrupt and re-run.
+
+    python reencrypt_users.py --batch-size 500
+    python reencrypt_users.py --dry-run
+"""
+
+import argparse
+import time
+
+from sqlalchemy import update
+
+from database import SessionLocal, User
+from encryption import decrypt_fields, encrypt_fields, is_current_format
+
+FIELDS = ('api_id_encrypted', 'api_hash_encrypted', 'session_string_encrypted')
+# A user whose row keeps changing under us (e.g. logging in again) is retried this often
+MAX_ATTEMPTS = 3
+
+
+def iter_batches(batch_size):
+    """Yields lists of (id, api_id, api_hash, session_string) ciphertext rows"""
+    last_id = 0
+    while True:
+        db = SessionLocal()
+        try:
+            rows = db.query(User.id, User.api_id_encrypted, User.api_hash_encrypted,
+                            User.session_string_encrypted) \
+                .filter(User.id > last_id).order_by(User.id).limit(batch_size).all()
+        finally:
+            db.close()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def load_rows(user_ids):
+    db = SessionLocal()
+    try:
+        return db.query(User.id, User.api_id_encrypted, User.api_hash_encrypted, User.session_string_encrypted) \
+            .filter(User.id.in_(user_ids)).order_by(User.id).all()
+    finally:
+        db.close()
+
+
+def write(updates):
+    """
+    Store the re-encrypted values, each only if the row still holds the
+    ciphertexts they were made from. Returns the ids of rows that changed
+    in the meantime (a login, a logout) and were left alone.
+    """
+    stale = []
+    db = SessionLocal()
+    try:
+        for user_id, old, new in updates:
+            matched = db.execute(
+                update(User)
+                .where(User.id == user_id,
+                       *(getattr(User, field).is_not_distinct_from(value) for field, value in zip(FIELDS, old)))
+                .values(dict(zip(FIELDS, new)))
+            ).rowcount
+            if not matched:
+                stale.append(user_id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return stale
+
+
+def reencrypt(batch_size=500, dry_run=False, force=False):
+    seen = converted = skipped = failed = conflicts = 0
+    started = time.monotonic()
+
+    for rows in iter_batches(batch_size):
+        seen += len(rows)
+        for attempt in range(MAX_ATTEMPTS):
+            updates = []
+            for user_id, *ciphertexts in rows:
+                if not force and all(is_current_format(value) for value in ciphertexts):
+                    skipped += 1
+                    continue
+                try:
+                    plaintexts = decrypt_fields(*ciphertexts)
+                    updates.append((user_id, ciphertexts, encrypt_fields(*plaintexts)))
+                except Exception as e:
+                    failed += 1
+                    print(f"⚠️  User {user_id}: could not re-encrypt ({e.__class__.__name__}: {e})")
+
+            stale = write(updates) if updates and not dry_run else []
+            converted += len(updates) - len(stale)
+            if not stale:
+                break
+            conflicts += len(stale)
+            # Start over from what they hold now
+            rows = load_rows(stale)
+        else:
+            failed += len(stale)
+            print(f"⚠️  Users {stale}: changed on every attempt, left as they are; run again later")
+
+        print(f"  ...{seen} users scanned, {converted} re-encrypted, {skipped} already current, "
+              f"{failed} failed, {conflicts} changed meanwhile and retried ({time.monotonic() - started:.1f}s)")
+
+    verb = 'would be re-encrypted' if dry_run else 're-encrypted'
+    print(f"✅ Done: {converted} users {verb}, {skipped} already current, {failed} failed")
+    return converted, skipped, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--dry-run', action='store_true', help='decrypt and re-encrypt, but write nothing')
+    parser.add_argument('--force', action='store_true', help='re-encrypt users already in the current format')
+    args = parser.parse_args()
+
+    _, _, failed = reencrypt(args.batch_size, args.dry_run, args.force)
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
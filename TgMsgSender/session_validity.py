@@ -0,0 +1,143 @@
+"""
+In-memory record of whether each user's Telegram session is still authorised,
+so /api/auth/status can answer without a Telegram round-trip
+"""
+
+import asyncio
+import threading
+import time
+
+
+class _Entry:
+    __slots__ = ('valid', 'checked_at', 'last_seen', 'generation')
+
+    def __init__(self, valid, now):
+        self.valid = valid
+        self.checked_at = now
+        self.last_seen = now
+        self.generation = 0
+
+
+class SessionValidityCache:
+    """
+    Maps telegram id -> last known session validity.
+
+    `check` (async, telegram id -> True, False, or None when it could not
+    tell) is only called on the event loop: once for a user nobody has asked
+    about yet, and then by a background refresher for entries older than
+    `refresh_interval`, at most `rate` checks per second. Logins and
+    successful sends call mark_valid(), and anything that sees an auth error
+    calls invalidate(), so most entries are kept fresh for free. Users whose
+    status nobody asked for in `idle_ttl` seconds are forgotten instead of
+    being checked.
+    """
+
+    def __init__(self, loop, check, refresh_interval=300, rate=2.0, idle_ttl=3600, tick=5):
+        self.loop = loop
+        self.check = check
+        self.refresh_interval = refresh_interval
+        self.rate = rate
+        self.idle_ttl = idle_ttl
+        self.tick = tick
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._refresher = None
+        self.hits = 0
+        self.misses = 0
+        self.checks = 0
+        self.check_failures = 0
+
+    def start(self):
+        self.loop.call_soon_threadsafe(self._start)
+
+    def get(self, telegram_id):
+        """True/False if known, None if this user has not been checked yet"""
+        with self._lock:
+            entry = self._entries.get(telegram_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry.last_seen = time.monotonic()
+            return entry.valid
+
+    def mark_valid(self, telegram_id):
+        self._set(telegram_id, True)
+
+    def invalidate(self, telegram_id):
+        self._set(telegram_id, False)
+
+    async def check_now(self, telegram_id):
+        """Run `check` for one user and record the answer unless something newer was recorded meanwhile"""
+        with self._lock:
+            entry = self._entries.get(telegram_id)
+            generation = entry.generation if entry else None
+        self.checks += 1
+        try:
+            valid = await self.check(telegram_id)
+        except Exception as e:
+            print(f"Session check for user {telegram_id} failed: {e}")
+            valid = None
+        if valid is None:
+            self.check_failures += 1
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(telegram_id)
+            if entry is None:
+                if generation is None:
+                    self._entries[telegram_id] = _Entry(valid, now)
+            elif entry.generation == generation:
+                entry.valid = valid
+                entry.checked_at = now
+                entry.generation += 1
+            else:
+                valid = entry.valid
+        return valid
+
+    def stats(self):
+        with self._lock:
+            valid = sum(1 for entry in self._entries.values() if entry.valid)
+            size = len(self._entries)
+        return {
+            'size': size,
+            'valid': valid,
+            'invalid': size - valid,
+            'hits': self.hits,
+            'misses': self.misses,
+            'checks': self.checks,
+            'check_failures': self.check_failures,
+        }
+
+    def _set(self, telegram_id, valid):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(telegram_id)
+            if entry is None:
+                self._entries[telegram_id] = _Entry(valid, now)
+                return
+            entry.valid = valid
+            entry.checked_at = now
+            entry.generation += 1
+
+    def _start(self):
+        if self._refresher is None:
+            self._refresher = self.loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            for telegram_id in self._due():
+                await self.check_now(telegram_id)
+                await asyncio.sleep(1 / self.rate)
+
+    def _due(self):
+        """Valid entries past refresh_interval, oldest first; drops entries nobody asks about"""
+        now = time.monotonic()
+        with self._lock:
+            for telegram_id in [t for t, e in self._entries.items() if now - e.last_seen > self.idle_ttl]:
+                del self._entries[telegram_id]
+            due = [(entry.checked_at, telegram_id) for telegram_id, entry in self._entries.items()
+                   if entry.valid and now - entry.checked_at >= self.refresh_interval]
+        return [telegram_id for _, telegram_id in sorted(due)]
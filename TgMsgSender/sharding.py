@@ -0,0 +1,230 @@
+"""
+Distributed scheduling: tasks are split into shards by user, and each worker
+process schedules only the shards it holds a lease on
+"""
+
+import asyncio
+import math
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+
+from database import SchedulerLease, SchedulerWorker, Task
+
+
+def shard_for_user(user_id, shard_count):
+    return user_id % shard_count
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class ShardCoordinator:
+    """
+    Claims, renews and releases shard leases in the scheduler_leases table.
+
+    Every heartbeat the worker refreshes its row in scheduler_workers (so
+    workers without any shard still count), renews its leases, takes over
+    shards whose lease expired (a dead worker) and gives up shards above its
+    fair share so a newly started worker gets some. Lease rows are claimed with
+    compare-and-set UPDATEs, so a shard never has two owners at once.
+
+    The lease I/O runs on a worker thread so a slow database cannot hold up
+    the loop, and the scheduler only starts a job while the lease covering it
+    is known to be unexpired (holds_lease), so a late renewal never lets a
+    task run here after another worker took its shard over.
+    """
+
+    # Tasks edited by another worker are picked up by re-reading rows changed
+    # since the last sync; the overlap absorbs clock skew and slow commits.
+    SYNC_OVERLAP = timedelta(seconds=5)
+
+    def __init__(self, loop, scheduler, store, session_factory, shard_count,
+                 worker_id=None, lease_ttl=30):
+        self.loop = loop
+        self.scheduler = scheduler
+        self.store = store
+        self.session_factory = session_factory
+        self.shard_count = shard_count
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_ttl = timedelta(seconds=lease_ttl)
+        self.owned = frozenset()
+        self.live_workers = 0
+        self._watermark = None
+        self._lease_deadline = 0.0  # time.monotonic() until which the owned leases are surely ours
+        self._task = None
+        self.listeners = []  # called with no arguments after the owned shards change
+
+        store.shard_count = shard_count
+        store.shards = self.owned
+        scheduler.accepts = self.owns
+        scheduler.may_run = self.holds_lease
+
+    def owns(self, user_id):
+        return shard_for_user(user_id, self.shard_count) in self.owned
+
+    def holds_lease(self, user_id):
+        return self.owns(user_id) and time.monotonic() < self._lease_deadline
+
+    def start(self):
+        self._task = asyncio.run_coroutine_threadsafe(self._run(), self.loop)
+
+    def stats(self):
+        return {
+            'worker_id': self.worker_id,
+            'shard_count': self.shard_count,
+            'owned_shards': sorted(self.owned),
+            'live_workers': self.live_workers,
+        }
+
+    def release(self):
+        """Give up every lease, e.g. on shutdown, so others take over immediately"""
+        db = self.session_factory()
+        try:
+            db.execute(update(SchedulerLease).where(SchedulerLease.worker_id == self.worker_id)
+                       .values(worker_id=None, expires_at=datetime.utcnow()))
+            db.query(SchedulerWorker).filter_by(worker_id=self.worker_id).delete()
+            db.commit()
+        except Exception as e:
+            print(f"Could not release scheduler leases: {e}")
+        finally:
+            db.close()
+
+    async def _run(self):
+        interval = self.lease_ttl.total_seconds() / 3
+        while True:
+            await self.loop.run_in_executor(None, self._beat)
+            await asyncio.sleep(interval)
+
+    def _beat(self):
+        try:
+            self._set_owned(self._heartbeat())
+            self._sync_changes()
+        except Exception as e:
+            # Without a renewed lease we must assume someone else took over
+            print(f"Scheduler lease heartbeat failed for {self.worker_id}: {e}")
+            self._lease_deadline = 0.0
+            self._set_owned(frozenset())
+
+    def _heartbeat(self):
+        # Taken before any lease is written, so the deadline errs on the early side
+        started = time.monotonic()
+        now = datetime.utcnow()
+        expires = now + self.lease_ttl
+        db = self.session_factory()
+        try:
+            self._ensure_rows(db)
+            self._register(db, now, expires)
+            db.execute(update(SchedulerLease)
+                       .where(SchedulerLease.worker_id == self.worker_id, SchedulerLease.expires_at > now)
+                       .values(expires_at=expires, heartbeat_at=now))
+
+            self.live_workers = db.query(SchedulerWorker).filter(SchedulerWorker.expires_at > now).count()
+            fair_share = math.ceil(self.shard_count / max(1, self.live_workers))
+            leases = db.query(SchedulerLease).filter(SchedulerLease.shard < self.shard_count) \
+                .order_by(SchedulerLease.shard).all()
+
+            mine = [lease.shard for lease in leases if lease.worker_id == self.worker_id and lease.expires_at > now]
+            for shard in mine[fair_share:]:
+                db.execute(update(SchedulerLease)
+                           .where(SchedulerLease.shard == shard, SchedulerLease.worker_id == self.worker_id)
+                           .values(worker_id=None, expires_at=now))
+            mine = set(mine[:fair_share])
+
+            for lease in leases:
+                if len(mine) >= fair_share:
+                    break
+                if lease.shard in mine or (lease.worker_id and lease.expires_at > now):
+                    continue
+                claimed = db.execute(
+                    update(SchedulerLease)
+                    .where(SchedulerLease.shard == lease.shard,
+                           or_(SchedulerLease.worker_id.is_(None), SchedulerLease.expires_at <= now))
+                    .values(worker_id=self.worker_id, expires_at=expires, heartbeat_at=now)
+                ).rowcount
+                if claimed:
+                    mine.add(lease.shard)
+                    if lease.worker_id and lease.worker_id != self.worker_id:
+                        # Its previous owner died; runs it left marked as running never finished
+                        db.query(Task).filter((Task.user_id % self.shard_count) == lease.shard,
+                                              Task.is_running == True) \
+                            .update({'is_running': False}, synchronize_session=False)
+            db.commit()
+            self._lease_deadline = started + self.lease_ttl.total_seconds()
+            return frozenset(mine)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _ensure_rows(self, db):
+        existing = {shard for (shard,) in db.query(SchedulerLease.shard)}
+        missing = [shard for shard in range(self.shard_count) if shard not in existing]
+        if not missing:
+            return
+        try:
+            db.add_all([SchedulerLease(shard=shard, worker_id=None, expires_at=datetime.utcnow())
+                        for shard in missing])
+            db.commit()
+        except IntegrityError:
+            # Another worker seeded them first
+            db.rollback()
+
+    def _register(self, db, now, expires):
+        updated = db.execute(update(SchedulerWorker).where(SchedulerWorker.worker_id == self.worker_id)
+                             .values(heartbeat_at=now, expires_at=expires)).rowcount
+        if not updated:
+            db.add(SchedulerWorker(worker_id=self.worker_id, heartbeat_at=now, expires_at=expires))
+            db.flush()
+        # Forget workers that have been gone for a while
+        db.query(SchedulerWorker).filter(SchedulerWorker.expires_at < now - 10 * self.lease_ttl) \
+            .delete(synchronize_session=False)
+
+    def _set_owned(self, owned):
+        if owned == self.owned:
+            return
+        gained, lost = owned - self.owned, self.owned - owned
+        print(f"Scheduler worker {self.worker_id} shards: {sorted(owned)} "
+              f"(+{sorted(gained)} -{sorted(lost)})")
+        self.owned = owned
+        self.store.shards = owned
+        self._watermark = datetime.utcnow()
+        self.scheduler.rebuild()
+        for listener in self.listeners:
+            try:
+                listener()
+            except Exception as e:
+                print(f"Shard change listener failed: {e}")
+
+    def _sync_changes(self):
+        """Apply task edits made through other workers to the shards we own"""
+        if not self.owned:
+            return
+        now = datetime.utcnow()
+        since = self._watermark - self.SYNC_OVERLAP
+        db = self.session_factory()
+        try:
+            rows = db.query(Task.id, Task.user_id, Task.interval_value, Task.interval_unit,
+                            Task.next_run, Task.status) \
+                .filter(Task.updated_at > since, (Task.user_id % self.shard_count).in_(self.owned)).all()
+        finally:
+            db.close()
+        self._watermark = now
+
+        for task_id, user_id, value, unit, next_run, status in rows:
+            job = self.scheduler.get_job(task_id)
+            if status != 'active' or not next_run:
+                if job:
+                    self.scheduler.remove_job(task_id)
+                continue
+            # A next_run in the past is our own write from an earlier run
+            if job and (next_run <= now or next_run == job.next_run_time):
+                continue
+            interval = max(1, int(timedelta(**{unit: value}).total_seconds()))
+            self.scheduler.add_job(task_id, user_id, interval, next_run)
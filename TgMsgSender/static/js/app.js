@@ -3,10 +3,21 @@ let currentLang = 'en';
 let selectedFiles = [];
 let editFilesUnified = [];
 let pollingInterval = null;
+const FALLBACK_RESYNC_TICKS = 2; // minutes between full reloads besides /api/events
+let eventSource = null;
+let currentTasks = [];
+let currentStats = null;
 let userTimezone = Intl.DateTimeFormat().resolvedOptions().timeZone;
 let selectedChatIds = [];
 let editSelectedChatIds = [];
 let allChats = [];
+// Lists are loaded a page at a time; a cursor is the server's next_cursor, null on the last page
+let chatsCursor = null;
+let chatQuery = '';
+let tasksCursor = null;
+let taskQuery = '';
+let adminTasksCursor = null;
+let searchTimer = null;
 let showingArchived = false;
 let currentUser = {};
 let isLoggingOut = false;
@@ -301,6 +312,7 @@ const switchAccount = async (telegramId) => {
 const logout = async () => {
     if (confirm(getText('logout_confirm'))) {
         if (pollingInterval) clearInterval(pollingInterval);
+        if (eventSource) eventSource.close();
         isLoggingOut = true;
         const { activeAccountId } = accountManager.getAccounts();
 
@@ -349,16 +361,79 @@ const showApp = (user) => {
     });
 
     loadInitialData();
+    startEventStream();
+    // Task and stats changes arrive over /api/events; this refreshes relative
+    // times ("in 5 min") locally and the cross-user admin tab. The stream only
+    // carries events of the server process it is connected to (and may be
+    // refused), so tasks and stats are also reloaded every few minutes.
+    let ticks = 0;
     pollingInterval = setInterval(() => {
         if (isLoggingOut) {
             clearInterval(pollingInterval);
             return;
         }
-        if (document.getElementById('tasksTab').classList.contains('active')) loadTasks(false);
-        if (document.getElementById('dashboardTab').classList.contains('active')) loadStats(false);
+        ticks += 1;
+        if (ticks % FALLBACK_RESYNC_TICKS === 0 && !document.hidden) {
+            reloadTasks();
+            loadStats(false);
+        } else if (document.getElementById('tasksTab').classList.contains('active')) {
+            renderTasks();
+        }
         if (document.getElementById('adminTab').classList.contains('active')) loadAdminData(false);
-        fetchApi('/api/auth/status').catch(() => {});
-    }, 15000);
+    }, 60000);
+};
+
+// --- Live Updates ---
+const startEventStream = () => {
+    if (eventSource) eventSource.close();
+    let disconnected = false;
+    eventSource = new EventSource('/api/events');
+    eventSource.addEventListener('task', e => applyTaskEvent(JSON.parse(e.data)));
+    eventSource.addEventListener('stats', e => applyStatsDeltas(JSON.parse(e.data).deltas));
+    eventSource.addEventListener('session', () => fetchApi('/api/auth/status').catch(() => {}));
+    eventSource.addEventListener('resync', () => { reloadTasks(); loadStats(false); });
+    eventSource.onopen = () => {
+        // Anything published while we were disconnected was missed
+        if (disconnected) { disconnected = false; reloadTasks(); loadStats(false); }
+    };
+    eventSource.onerror = () => {
+        if (isLoggingOut) { eventSource.close(); return; }
+        if (!disconnected) {
+            disconnected = true;
+            // A 401 here logs the page out through fetchApi
+            fetchApi('/api/auth/status').catch(() => {});
+        }
+    };
+};
+
+const applyTaskEvent = ({ action, task }) => {
+    const index = currentTasks.findIndex(t => t.id === task.id);
+    const matches = !taskQuery || (task.name || '').toLowerCase().includes(taskQuery.toLowerCase());
+    const inView = action !== 'deleted' && matches
+        && (showingArchived ? task.status === 'archived' : task.status !== 'archived');
+    if (!inView) {
+        if (index === -1) return;
+        currentTasks.splice(index, 1);
+    } else if (index !== -1) {
+        currentTasks[index] = task;
+    } else if (action === 'created' || action === 'archived') {
+        // Newest by the list's order (created_at, or updated_at when archived), so first
+        currentTasks.unshift(task);
+    } else if (action === 'unarchived') {
+        // Back among the active tasks at its creation date, which may be on a page not loaded yet
+        reloadTasks();
+        return;
+    } else {
+        // A task on a page not loaded yet; "Load more" will bring it
+        return;
+    }
+    renderTasks();
+};
+
+const applyStatsDeltas = (deltas) => {
+    if (!currentStats) return;
+    Object.entries(deltas).forEach(([key, delta]) => { currentStats[key] = (currentStats[key] || 0) + delta; });
+    renderStats();
 };
 
 const populateAccountDropdown = () => {
@@ -417,55 +492,57 @@ const loadInitialData = () => {
     loadSimplifiedLoginSetting();
 };
 
-const loadChats = async (selectIds = []) => {
+const loadChats = async (more = false) => {
+    const params = new URLSearchParams({ q: chatQuery });
+    if (more && chatsCursor) params.set('cursor', chatsCursor);
     try {
-        const d = await fetchApi('/api/chats');
-        allChats = d.chats;
+        const d = await fetchApi(`/api/chats?${params}`);
+        allChats = more ? allChats.concat(d.chats) : d.chats;
+        chatsCursor = d.next_cursor;
         renderChatSelector(chatSelector, selectedChatIds, false);
+        if (editModal.classList.contains('active')) renderChatSelector(editChatSelector, editSelectedChatIds, true);
     } catch (e) {}
 };
 
 const renderChatSelector = (container, selected, isEdit) => {
-    // Generate the HTML for items
-    const itemsHtml = allChats.map(c => `
+    // The search bar is built once so typing in it survives re-renders of the list
+    let list = container.querySelector('.chat-items');
+    if (!list) {
+        container.innerHTML = `
+            <div class="chat-selector-header">
+                <input type="text" class="chat-search-input"
+                       placeholder="${getText('search_chats') || 'Search chats...'}"
+                       oninput="searchChats(this.value)">
+            </div>
+            <div class="chat-items"></div>
+        `;
+        list = container.querySelector('.chat-items');
+    }
+    const input = container.querySelector('.chat-search-input');
+    if (input.value !== chatQuery && document.activeElement !== input) input.value = chatQuery;
+
+    list.innerHTML = allChats.map(c => `
         <div class="chat-item ${selected.includes(c.id) ? 'selected' : ''}"
-             onclick="toggleChat(${c.id}, ${isEdit})"
-             data-name="${c.name.toLowerCase()}">
+             onclick="toggleChat(${c.id}, ${isEdit})">
             <div class="chat-checkbox"><i class="fas fa-check"></i></div>
             <div class="chat-info">
                 <div class="chat-name">${c.name}</div>
                 <div class="chat-type">${c.type}</div>
             </div>
         </div>
-    `).join('');
-
-    // Prepend Search Bar
-    const searchHtml = `
-        <div class="chat-selector-header">
-            <input type="text" class="chat-search-input"
-                   placeholder="${getText('search_chats') || 'Search chats...'}"
-                   onkeyup="filterChats(this)">
-        </div>
-    `;
-
-    container.innerHTML = searchHtml + itemsHtml;
+    `).join('') + (chatsCursor ? loadMoreButton('loadChats(true)') : '');
 };
 
-// Add this new helper function
-const filterChats = (input) => {
-    const filter = input.value.toLowerCase();
-    const container = input.closest('.chat-selector');
-    const items = container.querySelectorAll('.chat-item');
+const loadMoreButton = (onclick) =>
+    `<div class="load-more"><button type="button" class="btn btn-secondary btn-sm" onclick="${onclick}">${getText('load_more_btn')}</button></div>`;
 
-    items.forEach(item => {
-        const name = item.getAttribute('data-name');
-        if (name.includes(filter)) {
-            item.style.display = "flex";
-        } else {
-            item.style.display = "none";
-        }
-    });
+// Searches run on the server, a moment after the user stops typing
+const debounceSearch = (fn) => {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(fn, 300);
 };
+
+const searchChats = (value) => debounceSearch(() => { chatQuery = value.trim(); loadChats(); });
 const toggleChat = (chatId, isEdit) => {
     const list = isEdit ? editSelectedChatIds : selectedChatIds;
     const container = isEdit ? editChatSelector : chatSelector;
@@ -489,46 +566,78 @@ const toggleArchivedView = () => {
     loadTasks(true);
 };
 
-const loadTasks = async (showLoader = false) => {
+const searchTasks = (value) => debounceSearch(() => { taskQuery = value.trim(); loadTasks(false); });
+
+// Reloads the first page; more = true appends the next one instead
+const loadTasks = async (showLoader = false, more = false) => {
     if (showLoader) {
         tasksList.innerHTML = Array(3).fill(0).map(() => `
             <div class="task-card skeleton-card skeleton"></div>
         `).join('');
     }
     const endpoint = showingArchived ? '/api/tasks/archived' : '/api/tasks';
+    const params = new URLSearchParams({ timezone: userTimezone, q: taskQuery });
+    if (more && tasksCursor) params.set('cursor', tasksCursor);
     try {
-        const d = await fetchApi(`${endpoint}?timezone=${encodeURIComponent(userTimezone)}`);
+        const d = await fetchApi(`${endpoint}?${params}`);
         const toggleBtn = document.getElementById('toggleArchivedBtn');
         if (toggleBtn) {
             const btnText = showingArchived ? getText('show_active_btn') : getText('show_archived_btn');
             toggleBtn.innerHTML = `<i class="fas ${showingArchived ? 'fa-list' : 'fa-archive'}"></i> <span>${btnText}</span>`;
         }
-        if (!d.tasks || d.tasks.length === 0) {
-            const emptyMsg = showingArchived
-            ? `<h3>${getText('no_archived_tasks_header')}</h3><p>${getText('no_archived_tasks_desc')}</p>`
-            : `<h3>${getText('no_tasks_header')}</h3><p>${getText('no_tasks_desc')}</p>`;
-            tasksList.innerHTML = `<div class="empty-state"><i class="fas fa-inbox"></i>${emptyMsg}</div>`;
-            return;
+        currentTasks = more ? currentTasks.concat(d.tasks || []) : (d.tasks || []);
+        tasksCursor = d.next_cursor;
+        renderTasks();
+    } catch (e) {}
+};
+
+// Refetches as many rows as are loaded, so pages added with "Load more" (and
+// the scroll position) survive a resync; the server caps each request at 500
+const reloadTasks = async () => {
+    const endpoint = showingArchived ? '/api/tasks/archived' : '/api/tasks';
+    const wanted = currentTasks.length;
+    let tasks = [], cursor = null;
+    try {
+        do {
+            const params = new URLSearchParams({ timezone: userTimezone, q: taskQuery });
+            if (wanted) params.set('limit', Math.min(wanted - tasks.length, 500));
+            if (cursor) params.set('cursor', cursor);
+            const d = await fetchApi(`${endpoint}?${params}`);
+            tasks = tasks.concat(d.tasks || []);
+            cursor = d.next_cursor;
+        } while (cursor && tasks.length < wanted);
+        currentTasks = tasks;
+        tasksCursor = cursor;
+        renderTasks();
+    } catch (e) {}
+};
+
+const renderTasks = () => {
+    if (currentTasks.length === 0) {
+        const emptyMsg = showingArchived
+        ? `<h3>${getText('no_archived_tasks_header')}</h3><p>${getText('no_archived_tasks_desc')}</p>`
+        : `<h3>${getText('no_tasks_header')}</h3><p>${getText('no_tasks_desc')}</p>`;
+        tasksList.innerHTML = `<div class="empty-state"><i class="fas fa-inbox"></i>${emptyMsg}</div>`;
+        return;
+    }
+    tasksList.innerHTML = currentTasks.map(t => {
+        let actions = '';
+        if (showingArchived) {
+            actions = `<button class="btn btn-success btn-sm" onclick="unarchiveTask('${t.id}')"><i class="fas fa-undo"></i> ${getText('unarchive_btn')}</button><button class="btn btn-danger btn-sm" onclick="deleteTask('${t.id}')"><i class="fas fa-trash"></i> ${getText('delete_btn')}</button>`;
+        } else {
+            actions = `<button class="btn btn-secondary btn-sm" onclick="openEditModal('${t.id}')"><i class="fas fa-edit"></i> ${getText('edit_btn')}</button>`;
+            if (t.status === 'active') actions += `<button class="btn btn-secondary btn-sm" onclick="pauseTask('${t.id}')"><i class="fas fa-pause"></i> ${getText('pause_btn')}</button>`;
+            if (t.status === 'paused') actions += `<button class="btn btn-success btn-sm" onclick="resumeTask('${t.id}')"><i class="fas fa-play"></i> ${getText('resume_btn')}</button>`;
+            actions += `<button class="btn btn-warning btn-sm" onclick="archiveTask('${t.id}')"><i class="fas fa-archive"></i> ${getText('archive_btn')}</button><button class="btn btn-danger btn-sm" onclick="deleteTask('${t.id}')"><i class="fas fa-trash"></i> ${getText('delete_btn')}</button>`;
         }
-        tasksList.innerHTML = d.tasks.map(t => {
-            let actions = '';
-            if (showingArchived) {
-                actions = `<button class="btn btn-success btn-sm" onclick="unarchiveTask('${t.id}')"><i class="fas fa-undo"></i> ${getText('unarchive_btn')}</button><button class="btn btn-danger btn-sm" onclick="deleteTask('${t.id}')"><i class="fas fa-trash"></i> ${getText('delete_btn')}</button>`;
-            } else {
-                actions = `<button class="btn btn-secondary btn-sm" onclick="openEditModal('${t.id}')"><i class="fas fa-edit"></i> ${getText('edit_btn')}</button>`;
-                if (t.status === 'active') actions += `<button class="btn btn-secondary btn-sm" onclick="pauseTask('${t.id}')"><i class="fas fa-pause"></i> ${getText('pause_btn')}</button>`;
-                if (t.status === 'paused') actions += `<button class="btn btn-success btn-sm" onclick="resumeTask('${t.id}')"><i class="fas fa-play"></i> ${getText('resume_btn')}</button>`;
-                actions += `<button class="btn btn-warning btn-sm" onclick="archiveTask('${t.id}')"><i class="fas fa-archive"></i> ${getText('archive_btn')}</button><button class="btn btn-danger btn-sm" onclick="deleteTask('${t.id}')"><i class="fas fa-trash"></i> ${getText('delete_btn')}</button>`;
-            }
-            const lastRunText = t.last_run ? `${getText('last_run')} ${formatTimeAgo(t.last_run)}` : getText('not_executed_yet');
-            const nextRunText = t.next_run && t.status === 'active' ? ` | ${getText('next_run')} ${formatNextRun(t.next_run)}` : '';
+        const lastRunText = t.last_run ? `${getText('last_run')} ${formatTimeAgo(t.last_run)}` : getText('not_executed_yet');
+        const nextRunText = t.next_run && t.status === 'active' ? ` | ${getText('next_run')} ${formatNextRun(t.next_run)}` : '';
 
-            // Format time display
-            const durationText = formatCompositeDuration(t.interval_value, t.interval_unit);
+        // Format time display
+        const durationText = formatCompositeDuration(t.interval_value, t.interval_unit);
 
-            return `<div class="task-card"><div class="task-header"><div style="display:flex;gap:10px;align-items:center;flex-wrap:wrap;">${t.name ? `<div class="task-name-badge">${t.name}</div>` : ''}<span class="task-status status-${t.status}">${t.status}</span></div><div class="task-actions">${actions}</div></div><div class="task-body"><div class="task-message">${t.message.substring(0, 120)}${t.message.length > 120 ? '...' : ''}</div><div class="task-meta"><div class="task-meta-item"><i class="far fa-clock"></i><span>${getText('every')} ${durationText}</span></div><div class="task-meta-item"><i class="fas fa-users"></i><span>${t.chat_ids.length} ${getText('chats')}</span></div>${t.files > 0 ? `<div class="task-meta-item"><i class="fas fa-paperclip"></i><span>${t.files} ${getText('files')}</span></div>` : ''}<div class="task-meta-item"><i class="fas fa-repeat"></i><span>${t.execution_count}${getText('executed')}</span></div><div class="task-meta-item"><i class="fas fa-history"></i><span>${lastRunText}${nextRunText}</span></div></div></div></div>`;
-        }).join('');
-    } catch (e) {}
+        return `<div class="task-card"><div class="task-header"><div style="display:flex;gap:10px;align-items:center;flex-wrap:wrap;">${t.name ? `<div class="task-name-badge">${t.name}</div>` : ''}<span class="task-status status-${t.status}">${t.status}</span></div><div class="task-actions">${actions}</div></div><div class="task-body"><div class="task-message">${t.message.substring(0, 120)}${t.message.length > 120 ? '...' : ''}</div><div class="task-meta"><div class="task-meta-item"><i class="far fa-clock"></i><span>${getText('every')} ${durationText}</span></div><div class="task-meta-item"><i class="fas fa-users"></i><span>${t.chat_ids.length} ${getText('chats')}</span></div>${t.files > 0 ? `<div class="task-meta-item"><i class="fas fa-paperclip"></i><span>${t.files} ${getText('files')}</span></div>` : ''}<div class="task-meta-item"><i class="fas fa-repeat"></i><span>${t.execution_count}${getText('executed')}</span></div><div class="task-meta-item"><i class="fas fa-history"></i><span>${lastRunText}${nextRunText}</span></div></div></div></div>`;
+    }).join('') + (tasksCursor ? loadMoreButton('loadTasks(false, true)') : '');
 };
 
 const loadStats = async (showLoader = false) => {
@@ -538,11 +647,16 @@ const loadStats = async (showLoader = false) => {
         ).join('');
     }
     try {
-        const s = await fetchApi('/api/stats');
-        statsGrid.innerHTML = `<div class="stat-card"><div class="stat-value">${s.total_tasks}</div><div class="stat-label">${getText('total_tasks')}</div></div><div class="stat-card"><div class="stat-value">${s.active_tasks}</div><div class="stat-label">${getText('active_tasks')}</div></div><div class="stat-card"><div class="stat-value">${s.archived_tasks}</div><div class="stat-label">${getText('archived_tasks')}</div></div><div class="stat-card"><div class="stat-value">${s.total_executions}</div><div class="stat-label">${getText('total_executions')}</div></div>`;
+        currentStats = await fetchApi('/api/stats');
+        renderStats();
     } catch (e) {}
 };
 
+const renderStats = () => {
+    const s = currentStats;
+    statsGrid.innerHTML = `<div class="stat-card"><div class="stat-value">${s.total_tasks}</div><div class="stat-label">${getText('total_tasks')}</div></div><div class="stat-card"><div class="stat-value">${s.active_tasks}</div><div class="stat-label">${getText('active_tasks')}</div></div><div class="stat-card"><div class="stat-value">${s.archived_tasks}</div><div class="stat-label">${getText('archived_tasks')}</div></div><div class="stat-card"><div class="stat-value">${s.total_executions}</div><div class="stat-label">${getText('total_executions')}</div></div>`;
+};
+
 const loadNotificationSettings = async () => { try { const s = await fetchApi('/api/settings/notifications'); notificationsToggle.checked = s.enabled; } catch(e) {} };
 const loadSimplifiedLoginSetting = async () => { try { const s = await fetchApi('/api/settings/simplified_login'); simplifiedLoginToggle.checked = s.enabled; } catch(e) {} };
 
@@ -724,23 +838,32 @@ const loadAdminUsers = async (showLoader = false) => {
     } catch(e) {}
 };
 
-const loadAdminUserTasks = async (userId, userName) => {
-    adminUserTasksCard.style.display = 'block';
-    adminTasksForUser.textContent = userName;
-    adminUserTasksList.innerHTML = '<div class="loader"></div>';
+const loadAdminUserTasks = async (userId, userName, more = false) => {
+    const params = new URLSearchParams({ timezone: userTimezone });
+    if (more && adminTasksCursor) {
+        params.set('cursor', adminTasksCursor);
+        adminUserTasksList.querySelector('.load-more')?.remove();
+    } else {
+        adminUserTasksCard.style.display = 'block';
+        adminTasksForUser.textContent = userName;
+        adminUserTasksList.innerHTML = '<div class="loader"></div>';
+    }
     try {
-        const d = await fetchApi(`/api/admin/tasks/${userId}?timezone=${encodeURIComponent(userTimezone)}`);
-        if (!d.tasks || d.tasks.length === 0) {
+        const d = await fetchApi(`/api/admin/tasks/${userId}?${params}`);
+        if (!more && (!d.tasks || d.tasks.length === 0)) {
             adminUserTasksList.innerHTML = `<div class="empty-state"><p>${getText('no_user_tasks')}</p></div>`;
             return;
         }
-        adminUserTasksList.innerHTML = d.tasks.map(t => {
+        adminTasksCursor = d.next_cursor;
+        const html = d.tasks.map(t => {
             const lastRunText = t.last_run ? `${getText('last_run')} ${formatTimeAgo(t.last_run)}` : getText('not_executed_yet');
             const nextRunText = t.next_run && t.status === 'active' ? ` | ${getText('next_run')} ${formatNextRun(t.next_run)}` : '';
             const durationText = formatCompositeDuration(t.interval_value, t.interval_unit);
 
             return `<div class="task-card"><div class="task-header"><div style="display:flex;gap:10px;align-items:center;flex-wrap:wrap;">${t.name ? `<div class="task-name-badge">${t.name}</div>` : ''}<span class="task-status status-${t.status}">${t.status}</span></div></div><div class="task-body"><div class="task-message">${t.message.substring(0, 120)}${t.message.length > 120 ? '...' : ''}</div><div class="task-meta"><div class="task-meta-item"><i class="far fa-clock"></i><span>${getText('every')} ${durationText}</span></div><div class="task-meta-item"><i class="fas fa-users"></i><span>${t.chat_ids.length} ${getText('chats')}</span></div>${t.files > 0 ? `<div class="task-meta-item"><i class="fas fa-paperclip"></i><span>${t.files} ${getText('files')}</span></div>` : ''}<div class="task-meta-item"><i class="fas fa-repeat"></i><span>${t.execution_count}${getText('executed')}</span></div><div class="task-meta-item"><i class="fas fa-history"></i><span>${lastRunText}${nextRunText}</span></div></div></div></div>`;
-        }).join('');
+        }).join('') + (adminTasksCursor ? loadMoreButton(`loadAdminUserTasks(${userId}, null, true)`) : '');
+        if (more) adminUserTasksList.insertAdjacentHTML('beforeend', html);
+        else adminUserTasksList.innerHTML = html;
     } catch(e) {}
 };
 
@@ -54,6 +54,8 @@ const translations = {
         // Tasks
         "show_archived_btn": "Show Archived",
         "show_active_btn": "Show Active",
+        "search_tasks": "Search by name...",
+        "load_more_btn": "Load more",
         "no_tasks_header": "No tasks yet",
         "no_tasks_desc": "Create your first repeating task to get started",
         "no_archived_tasks_header": "No archived tasks",
@@ -181,6 +183,8 @@ const translations = {
 
         "show_archived_btn": "Показать архив",
         "show_active_btn": "Показать активные",
+        "search_tasks": "Поиск по названию...",
+        "load_more_btn": "Загрузить ещё",
         "no_tasks_header": "Задач пока нет",
         "no_tasks_desc": "Создайте свою первую повторяющуюся задачу, чтобы начать",
         "no_archived_tasks_header": "Нет архивных задач",
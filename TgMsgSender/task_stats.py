@@ -0,0 +1,140 @@
+"""
+Task statistics from GROUP BY aggregates, and optional running counters
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, update
+
+from database import ExecutionRollup, Task, TaskCounter, TaskExecution
+
+STAT_KEYS = ('total_tasks', 'active_tasks', 'paused_tasks', 'archived_tasks', 'total_executions')
+ALL_USERS = 0  # task_counters row holding the totals of every user
+
+
+def status_counts(status):
+    """The task-count part of the stats contributed by one task in `status` (None = no task)"""
+    return {'total_tasks': int(status is not None and status != 'archived'),
+            'active_tasks': int(status == 'active'),
+            'paused_tasks': int(status == 'paused'),
+            'archived_tasks': int(status == 'archived')}
+
+
+def _aggregate(query):
+    stats = dict.fromkeys(STAT_KEYS, 0)
+    for status, count, executions in query:
+        for key, present in status_counts(status).items():
+            stats[key] += present * count
+        stats['total_executions'] += executions
+    return stats
+
+
+def task_stats(db, user_id=None):
+    """Stats of one user, or of everyone when user_id is None, in one GROUP BY status"""
+    query = db.query(Task.status, func.count(Task.id), func.coalesce(func.sum(Task.execution_count), 0)) \
+        .group_by(Task.status)
+    if user_id is not None:
+        query = query.filter(Task.user_id == user_id)
+    return _aggregate(query)
+
+
+def execution_history(db, user_id=None, days=30):
+    """
+    Runs and chat results of the last `days` days (counted from midnight UTC)
+    for one user or everyone: the daily rollups plus the task_executions rows
+    that have not been rolled up yet. The two never overlap.
+    """
+    since = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days - 1)
+    rolled_up = db.query(func.coalesce(func.sum(ExecutionRollup.runs), 0),
+                         func.coalesce(func.sum(ExecutionRollup.successful_chats), 0),
+                         func.coalesce(func.sum(ExecutionRollup.failed_chats), 0)) \
+        .filter(ExecutionRollup.period == 'day', ExecutionRollup.period_start >= since)
+    recent = db.query(func.count(TaskExecution.id),
+                      func.coalesce(func.sum(TaskExecution.successful_chats), 0),
+                      func.coalesce(func.sum(TaskExecution.failed_chats), 0)) \
+        .filter(TaskExecution.execution_time >= since)
+    if user_id is not None:
+        rolled_up = rolled_up.filter(ExecutionRollup.user_id == user_id)
+        recent = recent.join(Task, Task.id == TaskExecution.task_id).filter(Task.user_id == user_id)
+    totals = [a + b for a, b in zip(rolled_up.one(), recent.one())]
+    return {'days': days, **dict(zip(('runs', 'successful_chats', 'failed_chats'), totals))}
+
+
+class TaskCounters:
+    """
+    Keeps task_counters in step with the tasks table, so stats are one
+    primary-key read however many tasks there are.
+
+    apply() adds the deltas of a committed task change to the user's row and
+    to the ALL_USERS row with `col = col + n`, which stays right when several
+    processes apply at once. rebuild() recomputes every row from the tasks
+    table; run it at startup to heal drift from a crash between a task
+    commit and its counter update.
+    """
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self.applied = 0
+        self.rebuilt_at = None
+
+    def rebuild(self):
+        db = self.session_factory()
+        try:
+            per_user = {}
+            query = db.query(Task.user_id, Task.status, func.count(Task.id),
+                             func.coalesce(func.sum(Task.execution_count), 0)) \
+                .group_by(Task.user_id, Task.status)
+            for user_id, status, count, executions in query:
+                per_user.setdefault(user_id, []).append((status, count, executions))
+
+            now = datetime.utcnow()
+            rows = [{'user_id': user_id, **_aggregate(groups), 'updated_at': now}
+                    for user_id, groups in per_user.items()]
+            totals = dict.fromkeys(STAT_KEYS, 0)
+            for row in rows:
+                for key in STAT_KEYS:
+                    totals[key] += row[key]
+            rows.append({'user_id': ALL_USERS, **totals, 'updated_at': now})
+
+            db.execute(delete(TaskCounter))
+            db.execute(insert(TaskCounter), rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        self.rebuilt_at = datetime.utcnow()
+        return len(rows) - 1
+
+    def apply(self, user_id, deltas):
+        deltas = {key: delta for key, delta in deltas.items() if key in STAT_KEYS and delta}
+        if not deltas:
+            return
+        db = self.session_factory()
+        try:
+            values = {key: getattr(TaskCounter, key) + delta for key, delta in deltas.items()}
+            values['updated_at'] = datetime.utcnow()
+            for row_id in (user_id, ALL_USERS):
+                updated = db.execute(update(TaskCounter).where(TaskCounter.user_id == row_id).values(values)).rowcount
+                if not updated:
+                    # No row since the last rebuild: the tasks table, where this change
+                    # is already committed, has the right numbers
+                    stats = task_stats(db, None if row_id == ALL_USERS else row_id)
+                    db.add(TaskCounter(user_id=row_id, **stats, updated_at=values['updated_at']))
+            db.commit()
+            self.applied += 1
+        except Exception as e:
+            db.rollback()
+            print(f"Could not update task counters for user {user_id}: {e}")
+        finally:
+            db.close()
+
+    def get(self, db, user_id=ALL_USERS):
+        """The stored stats, or None if there is no row (yet)"""
+        row = db.get(TaskCounter, user_id)
+        return {key: getattr(row, key) for key in STAT_KEYS} if row else None
+
+    def stats(self):
+        return {'applied': self.applied,
+                'rebuilt_at': self.rebuilt_at.isoformat() if self.rebuilt_at else None}
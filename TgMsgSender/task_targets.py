@@ -0,0 +1,79 @@
+"""
+Keeps the task_targets table in step with Task.chat_ids
+"""
+
+from sqlalchemy import update
+
+from database import Task, TaskTarget
+
+
+def unique_chat_ids(chat_ids):
+    """Drop repeated chat ids, keeping the first position of each"""
+    return list(dict.fromkeys(chat_ids or []))
+
+
+def set_task_targets(task, chat_ids):
+    """Set a task's chats, updating chat_ids and its task_targets rows together"""
+    chat_ids = unique_chat_ids(chat_ids)
+    if task.chat_ids != chat_ids:
+        task.chat_ids = chat_ids
+
+    existing = {target.chat_id: target for target in task.targets}
+    targets = []
+    for position, chat_id in enumerate(chat_ids):
+        target = existing.get(chat_id) or TaskTarget(chat_id=chat_id)
+        target.position = position
+        targets.append(target)
+    task.targets = targets
+
+
+def tasks_targeting(db, user_id, chat_id):
+    """Ids of the user's tasks that send to a chat"""
+    return [task_id for (task_id,) in db.query(TaskTarget.task_id).join(Task, Task.id == TaskTarget.task_id)
+            .filter(Task.user_id == user_id, TaskTarget.chat_id == chat_id)]
+
+
+def retarget_chat(db, user_id, old_chat_id, new_chat_id):
+    """
+    Point every task of the user that sends to old_chat_id at new_chat_id
+    (e.g. a group that was migrated to a supergroup). Returns the task ids changed.
+    """
+    task_ids = tasks_targeting(db, user_id, old_chat_id)
+    if not task_ids:
+        return []
+
+    # Tasks that already send to the new chat just lose the old one
+    has_new = db.query(TaskTarget.task_id).filter(TaskTarget.task_id.in_(task_ids),
+                                                  TaskTarget.chat_id == new_chat_id)
+    db.query(TaskTarget).filter(TaskTarget.task_id.in_(has_new.scalar_subquery()),
+                                TaskTarget.chat_id == old_chat_id).delete(synchronize_session=False)
+    db.execute(update(TaskTarget)
+               .where(TaskTarget.task_id.in_(task_ids), TaskTarget.chat_id == old_chat_id)
+               .values(chat_id=new_chat_id))
+
+    positions = {}
+    for task in db.query(Task).filter(Task.id.in_(task_ids)):
+        task.chat_ids = unique_chat_ids(new_chat_id if chat_id == old_chat_id else chat_id
+                                        for chat_id in task.chat_ids or [])
+        positions.update({(task.id, chat_id): position for position, chat_id in enumerate(task.chat_ids)})
+
+    rows = db.query(TaskTarget.id, TaskTarget.task_id, TaskTarget.chat_id).filter(TaskTarget.task_id.in_(task_ids))
+    db.execute(update(TaskTarget), [{'id': target_id, 'position': positions[(task_id, chat_id)]}
+                                    for target_id, task_id, chat_id in rows if (task_id, chat_id) in positions])
+    return task_ids
+
+
+def backfill_task_targets(db, batch_size=500):
+    """Create task_targets rows for tasks that have none yet (e.g. created before the table existed)"""
+    filled, last_id = 0, ''
+    while True:
+        tasks = db.query(Task).filter(Task.id > last_id, ~Task.targets.any()) \
+            .order_by(Task.id).limit(batch_size).all()
+        if not tasks:
+            return filled
+        last_id = tasks[-1].id
+        for task in tasks:
+            if task.chat_ids:
+                set_task_targets(task, task.chat_ids)
+                filled += 1
+        db.commit()
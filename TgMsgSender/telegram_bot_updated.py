@@ -2,20 +2,36 @@
 Telegram Control Bot - Notification and Monitoring Version
 """
 
+import contextvars
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import wraps
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     Application, CommandHandler, CallbackQueryHandler, ContextTypes,
     ConversationHandler, MessageHandler, filters
 )
 from database import SessionLocal, User, Task, UserChat
+from pagination import encode_cursor, paginate
+from task_stats import task_stats
+from user_cache import UserCache
 from dotenv import load_dotenv
 
 # --- Setup ---
 load_dotenv('.env')
 BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD')  # For granting admin rights
+# Users rows are cached for BOT_USER_CACHE_TTL seconds; changes made by the web app
+# (logins, logouts, settings) are picked up within BOT_USER_CACHE_FOLLOW_INTERVAL seconds
+BOT_USER_CACHE_TTL = int(os.getenv('BOT_USER_CACHE_TTL', 60))
+BOT_USER_CACHE_FOLLOW_INTERVAL = float(os.getenv('BOT_USER_CACHE_FOLLOW_INTERVAL', 5))
+
+user_cache = UserCache(ttl=BOT_USER_CACHE_TTL, follow_interval=BOT_USER_CACHE_FOLLOW_INTERVAL or None)
+# Writes made here (toggles, language, admin grants) drop the cached row at once
+user_cache.watch(SessionLocal)
+# Task lists show up to this many tasks per message, fewer if they would not fit
+BOT_TASK_PAGE_SIZE = int(os.getenv('BOT_TASK_PAGE_SIZE', 10))
+MESSAGE_LIMIT = 4096  # Bot API limit on a message's text
 
 # --- States for ConversationHandler ---
 ADMIN_PASSWORD_STATE = range(1)
@@ -34,6 +50,7 @@ translations = {
         "admin_web_feature": "👑 Admin Panel\n\nThis feature is available in the web application. Please log in to access the admin dashboard.",
         "no_tasks": "🔭 No Tasks Found\n\nYou haven't created any active tasks yet. Please visit the web app to create your first task.",
         "your_tasks_header": "📋 Your Tasks ({count} total)\n\n",
+        "your_tasks_page_header": "📋 Your Tasks\n\n",
         "last_run": "Last: {time}",
         "not_executed_yet": "Not executed yet",
         "next_run": "Next: {time}",
@@ -43,6 +60,7 @@ translations = {
         "execution_info": "🔄 Executed {count} times",
         "no_archived_tasks": "🗄️ No Archived Tasks\n\nYou don't have any archived tasks.",
         "archived_header": "🗄️ Archived Tasks ({count} total)\n\n",
+        "archived_page_header": "🗄️ Archived Tasks\n\n",
         "was_schedule": "Was: Every {value} {unit}",
         "last_run_archived": "Last run: {time}",
         "never_executed": "Never executed",
@@ -63,6 +81,8 @@ translations = {
         "simplified_disabled": "❌ Disabled",
         "select_language": "Please select your language:",
         "lang_changed": "✅ Language has been set to {lang_name}.",
+        "prev_page": "⬅️ Previous",
+        "next_page": "Next ➡️",
     },
     'ru': {
         "not_authorized": "⚠️ Нет авторизации\n\nЧтобы использовать этого бота, вы должны сначала войти через веб-интерфейс. Если вы недавно вышли, пожалуйста, войдите снова, чтобы повторно авторизовать бота.",
@@ -76,6 +96,7 @@ translations = {
         "admin_web_feature": "👑 Панель администратора\n\nЭта функция доступна в веб-приложении. Пожалуйста, войдите, чтобы получить доступ к панели администратора.",
         "no_tasks": "🔭 Задачи не найдены\n\nВы еще не создали ни одной активной задачи. Пожалуйста, посетите веб-приложение, чтобы создать свою первую задачу.",
         "your_tasks_header": "📋 Ваши задачи (всего: {count})\n\n",
+        "your_tasks_page_header": "📋 Ваши задачи\n\n",
         "last_run": "Последний запуск: {time}",
         "not_executed_yet": "Еще не выполнялась",
         "next_run": "Следующий запуск: {time}",
@@ -85,6 +106,7 @@ translations = {
         "execution_info": "🔄 Выполнено раз: {count}",
         "no_archived_tasks": "🗄️ Нет архивных задач\n\nУ вас нет архивных задач.",
         "archived_header": "🗄️ Архивные задачи (всего: {count})\n\n",
+        "archived_page_header": "🗄️ Архивные задачи\n\n",
         "was_schedule": "Было: Каждые {value} {unit}",
         "last_run_archived": "Последний запуск: {time}",
         "never_executed": "Никогда не выполнялась",
@@ -105,6 +127,8 @@ translations = {
         "simplified_disabled": "❌ Отключен",
         "select_language": "Пожалуйста, выберите ваш язык:",
         "lang_changed": "✅ Язык изменен на {lang_name}.",
+        "prev_page": "⬅️ Назад",
+        "next_page": "Далее ➡️",
     }
 }
 LANGUAGES = {'en': 'English', 'ru': 'Русский'}
@@ -118,13 +142,41 @@ def get_text(key, lang_code='en'):
 # --- End of FIX ---
 
 # --- Helpers ---
-def get_user(update: Update, db_session=None):
-    """Fetches the user from the database based on their Telegram ID."""
-    db = db_session or SessionLocal()
-    user = db.query(User).filter_by(telegram_id=update.effective_user.id).first()
-    if not db_session:
-        db.close()
-    return user
+_update_scope = contextvars.ContextVar('update_scope', default=None)
+
+
+def per_update(handler):
+    """
+    Gives the handler, and every handler it calls for the same update, one
+    database session (get_db()) and one user lookup (get_user()); the
+    session is closed when the outermost handler returns.
+    """
+    @wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
+        if _update_scope.get() is not None:
+            return await handler(update, context, *args, **kwargs)
+        db = SessionLocal()
+        token = _update_scope.set({'db': db})
+        try:
+            return await handler(update, context, *args, **kwargs)
+        finally:
+            _update_scope.reset(token)
+            db.close()
+
+    return wrapper
+
+
+def get_db():
+    """The database session of the update being handled"""
+    return _update_scope.get()['db']
+
+
+def get_user(update: Update):
+    """The User who sent the update, looked up once per update (None if unknown)."""
+    scope = _update_scope.get()
+    if 'user' not in scope:
+        scope['user'] = user_cache.load(scope['db'], update.effective_user.id)
+    return scope['user']
 
 
 def format_time_ago(dt, lang):
@@ -180,6 +232,7 @@ async def is_authorized(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 # --- Main Commands ---
+@per_update
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Greets the user and shows the main menu."""
     if not await is_authorized(update, context):
@@ -203,6 +256,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
+@per_update
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Provides help information about the bot's commands."""
     if not await is_authorized(update, context):
@@ -211,6 +265,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(get_text("help_text", user.language))
 
 
+@per_update
 async def menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles callbacks from the main menu."""
     query = update.callback_query
@@ -252,43 +307,39 @@ async def menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 # --- Admin Commands (unchanged) ---
+@per_update
 async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Starts the conversation to grant admin privileges to another user."""
     if not await is_authorized(update, context):
         return ConversationHandler.END
 
-    db = SessionLocal()
-    admin_user = db.query(User).filter_by(telegram_id=update.effective_user.id).first()
+    admin_user = get_user(update)
 
     if not admin_user or not admin_user.is_admin:
         await update.message.reply_text("⛔ You are not authorized to use this command.")
-        db.close()
         return ConversationHandler.END
 
     if not context.args or len(context.args) != 1:
         await update.message.reply_text("Usage: /admin @username")
-        db.close()
         return ConversationHandler.END
 
     target_username = context.args[0].lstrip('@')
-    target_user = db.query(User).filter_by(username=target_username).first()
+    target_user = get_db().query(User).filter_by(username=target_username).first()
 
     if not target_user:
         await update.message.reply_text(f"Could not find a user with the username @{target_username}.")
-        db.close()
         return ConversationHandler.END
 
     if not ADMIN_PASSWORD:
         await update.message.reply_text("⚠️ Admin password is not set on the server. Cannot proceed.")
-        db.close()
         return ConversationHandler.END
 
     context.user_data['target_user_id'] = target_user.id
     await update.message.reply_text("Please enter the admin password to confirm.")
-    db.close()
     return ADMIN_PASSWORD_STATE
 
 
+@per_update
 async def receive_admin_password(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Checks the admin password and grants privileges if correct."""
     password_attempt = update.message.text
@@ -299,7 +350,7 @@ async def receive_admin_password(update: Update, context: ContextTypes.DEFAULT_T
         return ConversationHandler.END
 
     if password_attempt == ADMIN_PASSWORD:
-        db = SessionLocal()
+        db = get_db()
         target_user = db.query(User).filter_by(id=target_user_id).first()
         if target_user:
             target_user.is_admin = True
@@ -307,7 +358,6 @@ async def receive_admin_password(update: Update, context: ContextTypes.DEFAULT_T
             await update.message.reply_text(f"✅ Success! @{target_user.username} has been granted admin privileges.")
         else:
             await update.message.reply_text("An error occurred. Could not find the target user.")
-        db.close()
     else:
         await update.message.reply_text("⛔ Incorrect password. Action cancelled.")
 
@@ -324,131 +374,200 @@ async def cancel_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 
 # --- Bot Features ---
-async def view_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Displays a list of the user's tasks."""
-    if not await is_authorized(update, context):
-        return
-    user = get_user(update)
-    lang = user.language
-    db = SessionLocal()
-    tasks = db.query(Task).filter_by(user_id=user.id).filter(Task.status != 'archived').order_by(
-        Task.created_at.desc()).all()
-    db.close()
+def format_task(task, lang):
+    """Summary of an active or paused task for the task list"""
+    status_emoji = {'active': '🟢', 'paused': '⏸️'}.get(task.status, '⚪')
+
+    task_name_display = f"{task.name}\n" if task.name else ""
+    schedule_info = get_text("schedule_info", lang).format(value=task.interval_value, unit=task.interval_unit)
+    files_info = get_text("files_info", lang).format(count=len(task.file_paths)) if task.file_paths else ""
+    last_run_info = get_text("last_run", lang).format(
+        time=format_time_ago(task.last_run, lang)) if task.last_run else get_text("not_executed_yet", lang)
+    next_run_info = get_text("next_run", lang).format(
+        time=format_next_run(task.next_run, lang)) if task.next_run else ""
+
+    task_text = (
+        f"{status_emoji} {task_name_display}"
+        f"\"{task.message[:50]}{'...' if len(task.message) > 50 else ''}\"\n"
+        f"⏱️ {schedule_info}\n"
+        f"👥 {get_text('chats_info', lang).format(count=len(task.chat_ids))}{files_info}\n"
+        f"🔄 {get_text('execution_info', lang).format(count=task.execution_count)}\n"
+        f"🕐 {last_run_info}"
+    )
 
-    message_sender = update.callback_query.edit_message_text if update.callback_query else update.message.reply_text
+    if next_run_info and task.status == 'active':
+        task_text += f" | {next_run_info}"
+    return task_text
+
+
+def format_archived_task(task, lang):
+    """Summary of an archived task for the archived list"""
+    task_name_display = f"{task.name}\n" if task.name else ""
+    schedule_info = get_text("was_schedule", lang).format(value=task.interval_value, unit=task.interval_unit)
+    files_info = get_text("files_info", lang).format(count=len(task.file_paths)) if task.file_paths else ""
+    last_run_info = get_text("last_run_archived", lang).format(
+        time=format_time_ago(task.last_run, lang)) if task.last_run else get_text("never_executed", lang)
+
+    return (
+        f"📦 {task_name_display}"
+        f"\"{task.message[:50]}{'...' if len(task.message) > 50 else ''}\"\n"
+        f"⏱️ {schedule_info}\n"
+        f"👥 {get_text('chats_info', lang).format(count=len(task.chat_ids))}{files_info}\n"
+        f"🔄 {get_text('execution_info', lang).format(count=task.execution_count)}\n"
+        f"🕐 {last_run_info}"
+    )
 
-    if not tasks:
-        await message_sender(
-            text=get_text("no_tasks", lang)
-        )
-        return
 
-    text = get_text("your_tasks_header", lang).format(count=len(tasks))
-    await message_sender(text=text)
+# kind -> (filter, sort column, first page header, later pages header, empty text, formatter);
+# both lists are newest first
+TASK_LISTS = {
+    'tasks': (lambda: Task.status != 'archived', Task.created_at, "your_tasks_header", "your_tasks_page_header",
+              "no_tasks", format_task),
+    'archived': (lambda: Task.status == 'archived', Task.updated_at, "archived_header", "archived_page_header",
+                 "no_archived_tasks", format_archived_task),
+}
+_EPOCH = datetime(1970, 1, 1)
 
-    chat_id = update.effective_chat.id
 
-    for task in tasks[:10]:
-        status_emoji = {'active': '🟢', 'paused': '⏸️'}.get(task.status, '⚪')
-
-        task_name_display = f"{task.name}\n" if task.name else ""
-        schedule_info = get_text("schedule_info", lang).format(value=task.interval_value, unit=task.interval_unit)
-        files_info = get_text("files_info", lang).format(count=len(task.file_paths)) if task.file_paths else ""
-        last_run_info = get_text("last_run", lang).format(
-            time=format_time_ago(task.last_run, lang)) if task.last_run else get_text("not_executed_yet", lang)
-        next_run_info = get_text("next_run", lang).format(
-            time=format_next_run(task.next_run, lang)) if task.next_run else ""
-
-        task_text = (
-            f"{status_emoji} {task_name_display}"
-            f"\"{task.message[:50]}{'...' if len(task.message) > 50 else ''}\"\n"
-            f"⏱️ {schedule_info}\n"
-            f"👥 {get_text('chats_info', lang).format(count=len(task.chat_ids))}{files_info}\n"
-            f"🔄 {get_text('execution_info', lang).format(count=task.execution_count)}\n"
-            f"🕐 {last_run_info}"
-        )
+def message_length(text):
+    """Length of `text` as Telegram counts it (UTF-16 code units)"""
+    return len(text.encode('utf-16-le')) // 2
 
-        if next_run_info and task.status == 'active':
-            task_text += f" | {next_run_info}"
 
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=task_text
-        )
+def truncate_message(text, limit=MESSAGE_LIMIT):
+    """`text` cut to at most `limit` UTF-16 code units, never inside a surrogate pair"""
+    encoded = text.encode('utf-16-le')
+    if len(encoded) <= 2 * limit:
+        return text
+    return encoded[:2 * limit].decode('utf-16-le', errors='ignore')
 
 
-async def view_archived_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Displays a list of archived tasks."""
+def page_callback(kind, direction, task, column):
+    """callback_data for the page before ('prev') or after ('next') `task`, within Telegram's 64 bytes"""
+    micros = (getattr(task, column.key) - _EPOCH) // timedelta(microseconds=1)
+    return f"{kind}_{direction}_{micros}_{task.id}"
+
+
+def render_task_page(user, kind, direction=None, micros=None, task_id=None):
+    """
+    (text, keyboard) for one page of a task list.
+
+    The page holds as many task summaries as fit in one message, at most
+    BOT_TASK_PAGE_SIZE. Without a boundary it is the first page; otherwise
+    it is the page right after ('next') or right before ('prev') the task
+    whose sort key and id the callback carries, found with a keyset query.
+    Only the first page counts the tasks, so paging costs one indexed query.
+    """
+    status_filter, column, header_key, page_header_key, empty_key, formatter = TASK_LISTS[kind]
+    lang = user.language
+    query = get_db().query(Task).filter(Task.user_id == user.id, status_filter())
+
+    cursor = None
+    if direction:
+        cursor = encode_cursor([_EPOCH + timedelta(microseconds=micros), task_id])
+        header = get_text(page_header_key, lang)
+    else:
+        total = query.count()
+        if not total:
+            return get_text(empty_key, lang), None
+        header = get_text(header_key, lang).format(count=total)
+    backwards = direction == 'prev'
+    # Going back, rows come oldest first from right before the boundary
+    rows, more = paginate(query, (column, Task.id), cursor, BOT_TASK_PAGE_SIZE, descending=not backwards)
+
+    length = message_length(header)
+    page = []
+    for task in rows:
+        summary = formatter(task, lang)
+        added = message_length(summary) + (2 if page else 0)
+        if page and length + added > MESSAGE_LIMIT:
+            more = True
+            break
+        page.append((task, summary))
+        length += added
+    if backwards:
+        page.reverse()
+
+    if not page:
+        # Nothing left past the boundary (tasks were archived or deleted meanwhile)
+        return render_task_page(user, kind) if direction else (get_text(empty_key, lang), None)
+
+    has_prev, has_next = (bool(more), True) if backwards else (bool(direction), bool(more))
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton(get_text("prev_page", lang),
+                                            callback_data=page_callback(kind, 'prev', page[0][0], column)))
+    if has_next:
+        buttons.append(InlineKeyboardButton(get_text("next_page", lang),
+                                            callback_data=page_callback(kind, 'next', page[-1][0], column)))
+    keyboard = [buttons] if buttons else []
+    keyboard.append([InlineKeyboardButton(get_text("back_to_menu", lang), callback_data="menu_main")])
+
+    text = header + "\n\n".join(summary for _, summary in page)
+    return truncate_message(text), InlineKeyboardMarkup(keyboard)
+
+
+async def show_task_page(update: Update, kind, direction=None, micros=None, task_id=None):
+    """Sends the page as one message, or edits the message the button was pressed in"""
+    text, keyboard = render_task_page(get_user(update), kind, direction, micros, task_id)
+    if update.callback_query:
+        await update.callback_query.edit_message_text(text=text, reply_markup=keyboard)
+    else:
+        await update.message.reply_text(text=text, reply_markup=keyboard)
+
+
+@per_update
+async def view_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Displays the first page of the user's tasks."""
     if not await is_authorized(update, context):
         return
-    user = get_user(update)
-    lang = user.language
-    db = SessionLocal()
-    tasks = db.query(Task).filter_by(user_id=user.id, status='archived').order_by(Task.updated_at.desc()).all()
-    db.close()
+    await show_task_page(update, 'tasks')
 
-    message_sender = update.callback_query.edit_message_text if update.callback_query else update.message.reply_text
 
-    if not tasks:
-        await message_sender(text=get_text("no_archived_tasks", lang))
+@per_update
+async def view_archived_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Displays the first page of archived tasks."""
+    if not await is_authorized(update, context):
         return
+    await show_task_page(update, 'archived')
 
-    text = get_text("archived_header", lang).format(count=len(tasks))
-    await message_sender(text=text)
 
-    chat_id = update.effective_chat.id
+@per_update
+async def task_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handles the prev/next buttons of the task lists."""
+    query = update.callback_query
+    await query.answer()
 
-    for task in tasks[:10]:
-        task_name_display = f"{task.name}\n" if task.name else ""
-        schedule_info = get_text("was_schedule", lang).format(value=task.interval_value, unit=task.interval_unit)
-        files_info = get_text("files_info", lang).format(count=len(task.file_paths)) if task.file_paths else ""
-        last_run_info = get_text("last_run_archived", lang).format(
-            time=format_time_ago(task.last_run, lang)) if task.last_run else get_text("never_executed", lang)
-
-        task_text = (
-            f"📦 {task_name_display}"
-            f"\"{task.message[:50]}{'...' if len(task.message) > 50 else ''}\"\n"
-            f"⏱️ {schedule_info}\n"
-            f"👥 {get_text('chats_info', lang).format(count=len(task.chat_ids))}{files_info}\n"
-            f"🔄 {get_text('execution_info', lang).format(count=task.execution_count)}\n"
-            f"🕐 {last_run_info}"
-        )
+    if not await is_authorized(update, context):
+        return
 
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=task_text
-        )
+    kind, direction, micros, task_id = query.data.split('_', 3)
+    await show_task_page(update, kind, direction, int(micros), task_id)
 
 
+@per_update
 async def view_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Shows user statistics."""
     if not await is_authorized(update, context):
         return
     user = get_user(update)
     lang = user.language
-    db = SessionLocal()
-    tasks = db.query(Task).filter_by(user_id=user.id).all()
-    db.close()
-
-    total = len([t for t in tasks if t.status != 'archived'])
-    active = sum(1 for t in tasks if t.status == 'active')
-    paused = sum(1 for t in tasks if t.status == 'paused')
-    archived = sum(1 for t in tasks if t.status == 'archived')
-    executions = sum(t.execution_count for t in tasks)
+    stats = task_stats(get_db(), user.id)
 
     text = (
         f'{get_text("stats_header", lang)}\n'
-        f'{get_text("total_tasks_stat", lang).format(count=total)}\n'
-        f'{get_text("active_stat", lang).format(count=active)}\n'
-        f'{get_text("paused_stat", lang).format(count=paused)}\n'
-        f'{get_text("archived_stat", lang).format(count=archived)}\n'
-        f'{get_text("total_executions_stat", lang).format(count=executions)}'
+        f'{get_text("total_tasks_stat", lang).format(count=stats["total_tasks"])}\n'
+        f'{get_text("active_stat", lang).format(count=stats["active_tasks"])}\n'
+        f'{get_text("paused_stat", lang).format(count=stats["paused_tasks"])}\n'
+        f'{get_text("archived_stat", lang).format(count=stats["archived_tasks"])}\n'
+        f'{get_text("total_executions_stat", lang).format(count=stats["total_executions"])}'
     )
 
     message_sender = update.callback_query.edit_message_text if update.callback_query else update.message.reply_text
     await message_sender(text=text)
 
 
+@per_update
 async def settings_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, is_callback=True):
     """Displays the settings menu."""
     if not await is_authorized(update, context):
@@ -479,6 +598,7 @@ async def settings_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, is_c
 
 
 # --- FIX: New handlers for language settings ---
+@per_update
 async def language_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Shows the language selection menu."""
     query = update.callback_query
@@ -497,6 +617,7 @@ async def language_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
+@per_update
 async def set_language(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Sets the user's language."""
     query = update.callback_query
@@ -504,11 +625,9 @@ async def set_language(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     new_lang = query.data.split('_')[-1]  # 'en' or 'ru'
 
-    db = SessionLocal()
-    user = get_user(update, db_session=db)
+    user = get_user(update)
     user.language = new_lang
-    db.commit()
-    db.close()
+    get_db().commit()
 
     await query.answer(get_text("lang_changed", new_lang).format(lang_name=LANGUAGES[new_lang]))
     await settings_menu(update, context)  # Go back to settings menu
@@ -516,6 +635,7 @@ async def set_language(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # --- End of FIX ---
 
+@per_update
 async def toggle_notifications(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Toggles the user's notification setting."""
     query = update.callback_query
@@ -524,15 +644,14 @@ async def toggle_notifications(update: Update, context: ContextTypes.DEFAULT_TYP
     if not await is_authorized(update, context):
         return
 
-    db = SessionLocal()
-    user = db.query(User).filter_by(telegram_id=update.effective_user.id).first()
+    user = get_user(update)
     user.notifications_enabled = not user.notifications_enabled
-    db.commit()
-    db.close()
+    get_db().commit()
 
     await settings_menu(update, context)
 
 
+@per_update
 async def toggle_simplified_login(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Toggles the user's simplified login setting."""
     query = update.callback_query
@@ -541,12 +660,10 @@ async def toggle_simplified_login(update: Update, context: ContextTypes.DEFAULT_
     if not await is_authorized(update, context):
         return
 
-    db = SessionLocal()
-    user = db.query(User).filter_by(telegram_id=update.effective_user.id).first()
+    user = get_user(update)
     if user:
         user.simplified_login_enabled = not user.simplified_login_enabled
-        db.commit()
-    db.close()
+        get_db().commit()
 
     await settings_menu(update, context)
 
@@ -576,6 +693,7 @@ def main():
     app.add_handler(CallbackQueryHandler(menu_handler, pattern='^menu_main$'))
     app.add_handler(CallbackQueryHandler(view_tasks, pattern='^menu_tasks$'))
     app.add_handler(CallbackQueryHandler(view_archived_tasks, pattern='^menu_archived$'))
+    app.add_handler(CallbackQueryHandler(task_page, pattern='^(tasks|archived)_(prev|next)_'))
     app.add_handler(CallbackQueryHandler(view_stats, pattern='^menu_stats$'))
     app.add_handler(CallbackQueryHandler(lambda u, c: settings_menu(u, c), pattern='^menu_settings$'))
     app.add_handler(CallbackQueryHandler(lambda u, c: settings_menu(u, c), pattern='^menu_settings_back$'))
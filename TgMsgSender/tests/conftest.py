@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# The app is a flat set of top-level modules
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), '..')))
+# Never touch the working database from tests
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, update
+
+import database
+import telegram_bot_updated as bot
+from database import SessionLocal, Task, User
+
+
+def walk(user, kind):
+    """Text of every page, following the Next buttons from the first page"""
+    pages, args = [], ()
+    while True:
+        text, keyboard = bot.render_task_page(user, kind, *args)
+        assert bot.message_length(text) <= bot.MESSAGE_LIMIT
+        pages.append(text)
+        data = [button.callback_data for button in keyboard.inline_keyboard[0] if '_next_' in button.callback_data]
+        if not data:
+            return pages
+        _, direction, micros, task_id = data[0].split('_', 3)
+        args = (direction, int(micros), task_id)
+
+
+def test_archived_pages_reach_every_task():
+    database.init_db()
+    db = SessionLocal()
+    user = User(telegram_id=9201, phone='+9201', api_id_encrypted='x', api_hash_encrypted='x', language='en')
+    db.add(user)
+    db.flush()
+    start = datetime(2026, 1, 1)
+    db.add_all([Task(id=f'archived{i:02}', user_id=user.id, name=f'task{i:02}', message='hi', status='archived',
+                     interval_value=1, interval_unit='hours', chat_ids=[1], created_at=start + timedelta(hours=i))
+                for i in range(25)])
+    db.commit()
+    # Several tasks archived at the same moment: pages must split ties by id
+    db.execute(update(Task).where(Task.id < 'archived05').values(updated_at=start))
+    db.commit()
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    token = bot._update_scope.set({'db': db})
+    event.listen(database.engine, 'before_cursor_execute', record)
+    try:
+        pages = walk(user, 'archived')
+    finally:
+        event.remove(database.engine, 'before_cursor_execute', record)
+        bot._update_scope.reset(token)
+    names = [f'task{i:02}' for i in range(25)]
+    assert len(pages) == 3
+    assert sorted(name for name in names for page in pages if f'{name}\n' in page) == names
+    # Only the first page counts; every page is read in index order, not sorted
+    assert sum('count(' in statement for statement, _ in statements) == 1
+    pages_read = [(s, p) for s, p in statements if s.startswith('SELECT tasks.id') and 'ORDER BY' in s]
+    assert len(pages_read) == 3
+    for statement, parameters in pages_read:
+        plan = db.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+        assert not any('TEMP B-TREE' in row[-1] for row in plan)
+
+    db.query(Task).filter_by(user_id=user.id).delete()
+    db.delete(user)
+    db.commit()
+    db.close()
+
+
+def test_truncate_counts_utf16_code_units():
+    text = '😀' * 3000  # two UTF-16 code units each
+    truncated = bot.truncate_message(text)
+    assert truncated == '😀' * 2048 and bot.message_length(truncated) == bot.MESSAGE_LIMIT
+    assert bot.truncate_message('a' + text) == 'a' + '😀' * 2047  # never half a surrogate pair
+    assert bot.truncate_message('short') == 'short'
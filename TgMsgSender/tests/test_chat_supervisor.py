@@ -0,0 +1,62 @@
+import asyncio
+
+from chat_supervisor import ChatSyncSupervisor
+
+
+class AuthError(Exception):
+    pass
+
+
+class FakeStats:
+    def to_dict(self):
+        return {}
+
+
+class FakeMonitor:
+    def __init__(self, user_id, slots, outcomes, started):
+        self.user_id = user_id
+        self.outcomes = outcomes
+        self.started = started
+        self.state = 'syncing'
+        self.stats = FakeStats()
+
+    async def run(self):
+        self.started.append(self.user_id)
+        pending = self.outcomes.get(self.user_id)
+        outcome = pending.pop(0) if pending else None
+        if outcome is None:
+            await asyncio.sleep(3600)  # keeps following updates
+        elif outcome != 'logout':
+            raise outcome
+
+
+def test_one_job_per_user_with_restarts_and_auth_stop():
+    outcomes = {2: [RuntimeError('network'), RuntimeError('network')], 3: [AuthError('revoked')], 4: ['logout']}
+    started, auth_failed = [], []
+
+    async def run():
+        supervisor = ChatSyncSupervisor(
+            asyncio.get_running_loop(), lambda user_id, slots: FakeMonitor(user_id, slots, outcomes, started),
+            spread=0, retry_delay=0.01, is_auth_error=lambda e: isinstance(e, AuthError),
+            on_auth_error=auth_failed.append, accepts=lambda user_id: user_id != 5)
+        for user_id in (1, 1, 2, 3, 4, 5):
+            supervisor.ensure(user_id)
+        await asyncio.sleep(0.2)
+        jobs = {job['user_id']: job for job in supervisor.jobs()}
+        before_restore = list(started)
+        supervisor.restore([2, 3])
+        await asyncio.sleep(0.01)
+        remaining = {job['user_id'] for job in supervisor.jobs()}
+        await supervisor.shutdown()
+        return jobs, before_restore, remaining
+
+    jobs, started, remaining = asyncio.run(asyncio.wait_for(run(), 5))
+    # Ensuring a running job again does not start a second one; user 5 belongs to another worker
+    assert sorted(jobs) == [1, 2, 3, 4] and started.count(1) == 1
+    assert jobs[1]['state'] == 'syncing' and jobs[1]['restarts'] == 0
+    # Other errors back off and restart until the monitor settles
+    assert started.count(2) == 3 and jobs[2]['restarts'] == 2 and jobs[2]['last_error'] == 'RuntimeError: network'
+    assert jobs[3]['state'] == 'failed' and auth_failed == [3] and started.count(3) == 1
+    assert jobs[4]['state'] == 'stopped'
+    # Restoring keeps exactly the listed users' jobs
+    assert remaining == {2, 3}
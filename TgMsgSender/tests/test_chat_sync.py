@@ -0,0 +1,43 @@
+import database
+from chat_sync import ChatSyncEngine
+from database import SessionLocal, User, UserChat
+
+
+def stored(db, user_id):
+    return {chat.chat_id: (chat.chat_name, chat.chat_type, chat.is_active)
+            for chat in db.query(UserChat).filter_by(user_id=user_id)}
+
+
+def test_sync_applies_the_diff_and_apply_touches_only_its_chats():
+    database.init_db()
+    db = SessionLocal()
+    user = User(telegram_id=9501, phone='+9501', api_id_encrypted='x', api_hash_encrypted='x')
+    db.add(user)
+    db.commit()
+    user_id = user.id
+    engine = ChatSyncEngine(batch_size=2)  # several batches per statement kind
+
+    chats = [{'id': i, 'name': f'chat {i}', 'type': 'group'} for i in range(1, 6)]
+    assert engine.sync(db, user_id, chats)['inserted'] == 5
+    db.commit()
+
+    chats = [{'id': 1, 'name': 'chat 1', 'type': 'group'}, {'id': 2, 'name': 'renamed', 'type': 'group'},
+             {'id': 3, 'name': 'chat 3', 'type': 'channel'}, {'id': 6, 'name': 'chat 6', 'type': 'private'}]
+    diff = engine.sync(db, user_id, chats)
+    db.commit()
+    assert diff == {'inserted': 1, 'renamed': 1, 'retyped': 1, 'reactivated': 0, 'deactivated': 2, 'unchanged': 1}
+    assert stored(db, user_id) == {1: ('chat 1', 'group', True), 2: ('renamed', 'group', True),
+                                   3: ('chat 3', 'channel', True), 4: ('chat 4', 'group', False),
+                                   5: ('chat 5', 'group', False), 6: ('chat 6', 'private', True)}
+
+    # A single update: chat 4 is back, chat 1 left, nothing else is looked at
+    diff = engine.apply(db, user_id, chats=[{'id': 4, 'name': 'chat 4', 'type': 'group'}], removed=[1, 5, 99])
+    db.commit()
+    assert diff == {'inserted': 0, 'renamed': 0, 'retyped': 0, 'reactivated': 1, 'deactivated': 1, 'unchanged': 0}
+    assert {chat_id for chat_id, (_, _, active) in stored(db, user_id).items() if active} == {2, 3, 4, 6}
+    assert engine.stats()['syncs'] == 3 and engine.stats()['totals']['deactivated'] == 3
+
+    db.query(UserChat).filter_by(user_id=user_id).delete()
+    db.query(User).filter_by(id=user_id).delete()
+    db.commit()
+    db.close()
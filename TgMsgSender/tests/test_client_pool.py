@@ -0,0 +1,159 @@
+import asyncio
+import threading
+
+import pytest
+
+import client_pool
+from client_pool import TelegramClientPool
+from dialog_sync import ChatMonitor
+
+
+class FakeClient:
+    def __init__(self, session, api_id, api_hash, loop=None):
+        self.session = session
+        self.connected = False
+
+    async def connect(self):
+        await asyncio.sleep(0.01)
+        if self.session == 'unreachable':
+            raise ConnectionError('no network')
+        self.connected = True
+
+    def is_connected(self):
+        return self.connected
+
+    async def disconnect(self):
+        self.connected = False
+
+    async def get_me(self, input_peer=False):
+        return type('InputPeerUser', (), {'user_id': 1})()
+
+    def add_event_handler(self, callback, event):
+        pass
+
+    def remove_event_handler(self, callback, event):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def fake_telethon(monkeypatch):
+    monkeypatch.setattr(client_pool, 'TelegramClient', FakeClient)
+    monkeypatch.setattr(client_pool, 'StringSession', lambda session_string: session_string)
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 5))
+
+
+def test_discard_keeps_client_connected_until_last_release():
+    async def scenario():
+        pool = TelegramClientPool(asyncio.get_running_loop(), max_clients=5)
+        first = await pool.acquire(1, 1, 'hash', 'session')
+        second = await pool.acquire(1, 1, 'hash', 'session')
+        assert first is second
+
+        pool.discard(1)
+        await asyncio.sleep(0)
+        assert first.is_connected()
+
+        await pool.release(1, first)
+        assert first.is_connected()
+        await pool.release(1, second)
+        assert not first.is_connected()
+        assert pool.stats()['open'] == 0
+        await pool.close()
+
+    run(scenario())
+
+
+def test_failed_connect_wakes_waiters_for_room():
+    async def scenario():
+        pool = TelegramClientPool(asyncio.get_running_loop(), max_clients=1)
+        failing = asyncio.ensure_future(pool.acquire(1, 1, 'hash', 'unreachable'))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(pool.acquire(2, 1, 'hash', 'session'))
+
+        with pytest.raises(ConnectionError):
+            await failing
+        client = await waiter
+        assert client.is_connected()
+        await pool.release(2, client)
+        await pool.close()
+
+    run(scenario())
+
+
+class FakeSession:
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_more_monitors_than_clients_leave_room_for_sends():
+    async def scenario():
+        pool = TelegramClientPool(asyncio.get_running_loop(), max_clients=3, max_followers=4)
+
+        async def full_sync(user_id, client, db):
+            return {}
+
+        monitors = [ChatMonitor(user_id, pool, None, FakeSession, lambda user_id: (1, 'hash', 'session'),
+                                full_sync, poll_interval=3600, reconcile_interval=3600)
+                    for user_id in range(1, 8)]
+        runs = [asyncio.ensure_future(monitor.run()) for monitor in monitors]
+        for _ in range(100):
+            if all(monitor.state in ('following', 'sleeping') for monitor in monitors):
+                break
+            await asyncio.sleep(0.01)
+
+        states = [monitor.state for monitor in monitors]
+        assert states.count('following') == 4 and states.count('sleeping') == 3
+        assert pool.stats()['followers'] == 4
+
+        # Every other user still gets a client straight away
+        for user_id in range(100, 106):
+            async with pool.client(user_id, 1, 'hash', 'session') as client:
+                assert client.is_connected()
+
+        for run in runs:
+            run.cancel()
+        await asyncio.gather(*runs, return_exceptions=True)
+        await pool.close()
+
+    run(scenario())
+
+
+def test_monitor_database_work_stays_off_the_loop():
+    loop_thread = []
+    threads = []
+
+    class Engine:
+        def apply(self, db, user_id, chats=(), removed=()):
+            threads.append(('apply', threading.current_thread()))
+            return {'deactivated': len(removed)}
+
+    def get_credentials(user_id):
+        threads.append(('credentials', threading.current_thread()))
+        return 1, 'hash', 'session'
+
+    async def scenario():
+        loop_thread.append(threading.current_thread())
+        pool = TelegramClientPool(asyncio.get_running_loop(), max_clients=1)
+        monitor = ChatMonitor(1, pool, Engine(), FakeSession, get_credentials, None)
+
+        async def gone(client, peer):
+            return None
+
+        monitor._fetch = gone
+        assert await monitor._credentials() == (1, 'hash', 'session')
+        await monitor._handle(FakeClient('session', 1, 'hash'), -100, monitor._refresh)
+        assert monitor.stats.rows_changed == 1
+        await pool.close()
+
+    run(scenario())
+    assert [name for name, _ in threads] == ['credentials', 'apply']
+    assert all(thread is not loop_thread[0] for _, thread in threads)
@@ -0,0 +1,50 @@
+from datetime import datetime
+
+from sqlalchemy import event, func
+
+import database
+import main_app
+from database import ExecutionRollup, SessionLocal, Task, TaskExecution, User
+
+
+def test_deleting_a_task_removes_its_history_without_loading_it():
+    db = SessionLocal()
+    user = User(telegram_id=9001, phone='+9001', api_id_encrypted='x', api_hash_encrypted='x')
+    db.add(user)
+    db.flush()
+    db.add(Task(id='withhistory', user_id=user.id, message='hi', status='paused', interval_value=1,
+                interval_unit='hours', chat_ids=[1]))
+    db.flush()
+    db.add_all([TaskExecution(task_id='withhistory', execution_time=datetime.utcnow(), status='success')
+                for _ in range(50)])
+    db.add_all([ExecutionRollup(task_id='withhistory', user_id=user.id, period=period,
+                                period_start=datetime(2026, 1, day), runs=1)
+                for period in ('hour', 'day') for day in range(1, 21)])
+    db.commit()
+    user_id = user.id
+    db.close()
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    client = main_app.app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 9001
+    event.listen(database.engine, 'before_cursor_execute', record)
+    try:
+        response = client.delete('/api/tasks/withhistory')
+    finally:
+        event.remove(database.engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+
+    db = SessionLocal()
+    assert db.query(func.count(TaskExecution.id)).filter_by(task_id='withhistory').scalar() == 0
+    assert db.query(func.count(ExecutionRollup.id)).filter_by(task_id='withhistory').scalar() == 0
+    db.query(User).filter_by(id=user_id).delete()
+    db.commit()
+    db.close()
+    for table in ('task_executions', 'execution_rollups'):
+        assert not any(s.startswith('SELECT') and f'FROM {table}' in s for s in statements)
+        assert sum(s.startswith(f'DELETE FROM {table}') for s in statements) == 1
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from due_index import DueTaskIndex, MemoryTaskStore, TaskStore
+
+START = datetime(2026, 1, 1)
+
+
+def at(minutes):
+    return START + timedelta(minutes=minutes)
+
+
+def test_due_tasks_come_out_in_time_order():
+    index = DueTaskIndex()
+    for task_id, minutes in [('c', 30), ('a', 10), ('d', 40), ('b', 20), ('tie', 10)]:
+        index.push(task_id, at(minutes))
+    assert len(index) == 5 and index.peek() == (at(10), 'a')
+    # Equal due times keep their insertion order
+    assert index.pop_due(at(25)) == ['a', 'tie', 'b']
+    assert index.peek() == (at(30), 'c') and 'a' not in index
+    assert index.pop_due(at(29)) == []
+    assert index.pop_due(at(100)) == ['c', 'd']
+    assert index.peek() is None and len(index) == 0
+
+
+def test_rescheduling_replaces_the_previous_due_time():
+    index = DueTaskIndex()
+    index.push('a', at(10))
+    index.push('b', at(20))
+    index.push('a', at(30))  # later: b is now first
+    assert index.peek() == (at(20), 'b')
+    index.push('b', at(5))  # earlier
+    assert index.pop_due(at(25)) == ['b']
+    index.discard('a')
+    index.discard('missing')
+    assert index.pop_due(at(100)) == [] and len(index) == 0
+
+
+def test_many_reschedules_keep_one_entry_per_task():
+    index = DueTaskIndex()
+    for round_ in range(50):
+        for task_id in range(10):
+            index.push(task_id, at(round_ * 10 + (9 - task_id)))
+    # Stale entries are compacted away instead of piling up
+    assert len(index) == 10 and len(index._heap) <= 2 * 10 + 64
+    assert index.pop_due(at(1000)) == list(range(9, -1, -1))
+
+
+def test_task_store_requires_both_methods():
+    class LoadOnly(TaskStore):
+        def load_jobs(self):
+            return []
+
+    with pytest.raises(TypeError):
+        LoadOnly()
+
+    store = MemoryTaskStore([('a', 1, 3600, at(0)), ('b', 1, 60, at(5))])
+    store.save_next_runs({'a': at(60), 'gone': at(1)})
+    assert sorted(store.load_jobs()) == [('a', 1, 3600, at(60)), ('b', 1, 60, at(5))]
@@ -0,0 +1,24 @@
+import encryption
+from encryption import decrypt_data, decrypt_fields, encrypt_data, encrypt_fields
+
+
+def test_decrypt_fields_unwraps_each_data_key_once_and_keeps_none(monkeypatch):
+    unwraps = []
+    unwrap = encryption._unwrap_data_key
+
+    def counting_unwrap(wrapped_key):
+        unwraps.append(wrapped_key)
+        return unwrap(wrapped_key)
+
+    monkeypatch.setattr(encryption, '_unwrap_data_key', counting_unwrap)
+    bundle = encrypt_fields('1234', 'hash', 'session')
+
+    assert decrypt_fields(*bundle, None) == ['1234', 'hash', 'session', None]
+    assert len(unwraps) == 1
+    # Nothing outlives the call: a later decrypt (say after a logout) unwraps again
+    assert decrypt_fields(*bundle) == ['1234', 'hash', 'session']
+    assert len(unwraps) == 2
+
+    assert decrypt_fields(encrypt_data('a'), encrypt_data('b')) == ['a', 'b']
+    assert len(unwraps) == 4
+    assert decrypt_data(bundle[1]) == 'hash'
@@ -0,0 +1,13 @@
+from event_stream import EventBroker
+
+
+def test_streams_per_user_are_capped():
+    broker = EventBroker(max_streams_per_user=2)
+    first, second = broker.subscribe(1), broker.subscribe(1)
+    assert first and second
+    assert broker.subscribe(1) is None
+    assert broker.subscribe(2) is not None
+
+    broker.unsubscribe(first)
+    assert broker.subscribe(1) is not None
+    assert broker.stats()['rejected'] == 1
@@ -0,0 +1,83 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+import database
+from database import ExecutionRollup, SessionLocal, Task, TaskExecution, User
+from execution_retention import DAY, HOUR, ExecutionRetention
+
+
+def totals(db, *where):
+    return db.query(func.count(), func.sum(TaskExecution.successful_chats),
+                    func.sum(TaskExecution.failed_chats)).filter(*where).one()
+
+
+def rollup_totals(db, period):
+    return db.query(func.sum(ExecutionRollup.runs), func.sum(ExecutionRollup.successful_chats),
+                    func.sum(ExecutionRollup.failed_chats)).filter(ExecutionRollup.period == period).one()
+
+
+def test_rollup_keeps_totals_while_pruning_old_rows():
+    database.init_db()
+    db = SessionLocal()
+    user = User(telegram_id=9301, phone='+9301', api_id_encrypted='x', api_hash_encrypted='x')
+    db.add(user)
+    db.flush()
+    db.add(Task(id='retained', user_id=user.id, message='hi', status='active', interval_value=1,
+                interval_unit='hours', chat_ids=[1, 2, 3]))
+    now = datetime.utcnow()
+    old = (now - timedelta(days=10)).replace(hour=12, minute=0, second=0, microsecond=0)
+    # Eleven old runs 20 minutes apart (four clock hours of one day), and two recent ones
+    times = [old + timedelta(minutes=20 * i) for i in range(11)] + [now - timedelta(hours=1), now]
+    db.add_all([TaskExecution(task_id='retained', execution_time=moment, status='success', total_chats=3,
+                              successful_chats=3 - i % 2, failed_chats=i % 2)
+                for i, moment in enumerate(times)])
+    db.commit()
+    user_id = user.id
+    cutoff = now - timedelta(days=7)
+    before = totals(db, TaskExecution.task_id == 'retained')
+    old_before = totals(db, TaskExecution.task_id == 'retained', TaskExecution.execution_time < cutoff)
+    db.close()
+
+    async def run():
+        retention = ExecutionRetention(asyncio.get_running_loop(), SessionLocal, raw_days=7, batch_size=4,
+                                       pause=0)
+        first = await retention.run_once()
+        second = await retention.run_once()
+        return retention, first, second
+
+    retention, first, second = asyncio.run(asyncio.wait_for(run(), 10))
+    assert first['compacted'] == 11 and second['compacted'] == 0
+    assert retention.stats()['compacted'] == 11 and retention.stats()['passes'] == 2
+
+    db = SessionLocal()
+    assert totals(db, TaskExecution.task_id == 'retained')[0] == 2
+    # Every old run is counted once in the hourly and once in the daily rollups
+    assert tuple(rollup_totals(db, HOUR)) == tuple(old_before)
+    assert tuple(rollup_totals(db, DAY)) == tuple(old_before)
+    assert db.query(ExecutionRollup).filter_by(period=HOUR).count() == 4
+    assert db.query(ExecutionRollup).filter_by(period=DAY).count() == 1
+    # Raw rows plus the daily rollup still add up to everything that ran
+    recent = totals(db, TaskExecution.task_id == 'retained')
+    assert tuple(a + b for a, b in zip(recent, rollup_totals(db, DAY))) == tuple(before)
+    db.close()
+
+    # Hourly rollups past their own retention go, the daily ones stay
+    async def prune():
+        retention = ExecutionRetention(asyncio.get_running_loop(), SessionLocal, raw_days=7, hourly_days=5,
+                                       batch_size=4, pause=0)
+        return await retention.run_once()
+
+    done = asyncio.run(asyncio.wait_for(prune(), 10))
+    assert done['hourly_pruned'] == 4
+    db = SessionLocal()
+    assert db.query(ExecutionRollup).filter_by(period=HOUR).count() == 0
+    assert tuple(rollup_totals(db, DAY)) == tuple(old_before)
+
+    db.query(ExecutionRollup).filter_by(task_id='retained').delete()
+    db.query(TaskExecution).filter_by(task_id='retained').delete()
+    db.query(Task).filter_by(id='retained').delete()
+    db.query(User).filter_by(id=user_id).delete()
+    db.commit()
+    db.close()
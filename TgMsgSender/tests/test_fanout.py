@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+from telethon.errors import FloodWaitError
+
+from fanout import FanoutEngine
+
+
+def test_token_bucket_paces_sends_after_the_burst():
+    engine = FanoutEngine(concurrency=10, rate=20, burst=2)
+    sent = []
+
+    async def send_one(chat_id):
+        sent.append(time.monotonic())
+
+    start = time.monotonic()
+    results = asyncio.run(asyncio.wait_for(engine.fan_out('account', range(6), send_one), 5))
+    assert results == [(chat_id, None) for chat_id in range(6)]
+    # The burst goes out at once, the other four wait a token each (1/20 s)
+    assert sent[1] - start < 0.04
+    assert sent[-1] - start >= 0.18
+    assert all(b - a >= 0.04 for a, b in zip(sent[1:], sent[2:]))
+
+
+def test_flood_wait_pauses_the_account_and_retries():
+    engine = FanoutEngine(concurrency=2, rate=100, burst=10)
+    calls = {}
+    flooded_at = None
+    after_flood = []
+
+    async def send_one(chat_id):
+        nonlocal flooded_at
+        now = time.monotonic()
+        calls[chat_id] = calls.get(chat_id, 0) + 1
+        if flooded_at is not None:
+            after_flood.append(now - flooded_at)
+        if chat_id == 1 and calls[chat_id] == 1:
+            flooded_at = now
+            raise FloodWaitError(request=None, capture=1)
+
+    results = asyncio.run(asyncio.wait_for(engine.fan_out('account', [1, 2, 3, 4], send_one), 5))
+    assert results == [(chat_id, None) for chat_id in [1, 2, 3, 4]]
+    assert calls[1] == 2
+    # Every send made after the flood wait, the retry included, waited it out
+    assert len(after_flood) >= 3 and all(waited >= 0.95 for waited in after_flood)
+
+
+def test_long_flood_wait_is_reported_without_retrying():
+    engine = FanoutEngine(max_flood_wait=1)
+    calls = []
+
+    async def send_one(chat_id):
+        calls.append(chat_id)
+        raise FloodWaitError(request=None, capture=60)
+
+    [(chat_id, error)] = asyncio.run(asyncio.wait_for(engine.fan_out('account', [7], send_one), 5))
+    assert chat_id == 7 and isinstance(error, FloodWaitError) and error.seconds == 60
+    assert calls == [7]
+
+
+def test_fatal_error_stops_the_remaining_chats():
+    engine = FanoutEngine(concurrency=1, is_fatal=lambda e: isinstance(e, PermissionError))
+    calls = []
+    denied = PermissionError('session revoked')
+
+    async def send_one(chat_id):
+        calls.append(chat_id)
+        raise denied
+
+    results = asyncio.run(asyncio.wait_for(engine.fan_out('account', [1, 2, 3], send_one), 5))
+    assert results == [(1, denied), (2, denied), (3, denied)]
+    assert calls == [1]
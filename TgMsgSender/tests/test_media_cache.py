@@ -0,0 +1,23 @@
+import os
+
+import media_cache
+from media_cache import file_digest
+
+
+def test_digest_cache_is_bounded_and_follows_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_cache, 'DIGEST_CACHE_SIZE', 3)
+    monkeypatch.setattr(media_cache, '_digest_cache', media_cache.OrderedDict())
+    paths = []
+    for n in range(5):
+        path = tmp_path / f'file{n}.bin'
+        path.write_bytes(b'x' * n)
+        paths.append(str(path))
+        file_digest(str(path))
+    assert list(media_cache._digest_cache) == paths[2:]
+
+    before = file_digest(paths[4])
+    with open(paths[4], 'ab') as f:
+        f.write(b'more')
+    os.utime(paths[4], ns=(0, 1))
+    assert file_digest(paths[4]) != before
+    assert len(media_cache._digest_cache) == 3
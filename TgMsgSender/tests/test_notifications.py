@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+from notifications import NotificationDispatcher
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def initialize(self):
+        pass
+
+    async def send_message(self, chat_id, text):
+        self.sent.append((time.monotonic(), chat_id, text))
+
+    async def shutdown(self):
+        pass
+
+
+def test_burst_is_coalesced_into_one_digest():
+    bot = FakeBot()
+
+    async def run():
+        dispatcher = NotificationDispatcher(asyncio.get_running_loop(), bot, rate=100, chat_interval=0,
+                                            digest_threshold=2, digest_window=0.3)
+        dispatcher.notify(1, 'first run\ndetails')
+        dispatcher.notify(1, 'second run\ndetails')
+        await asyncio.sleep(0.05)
+        burst_at = time.monotonic()
+        dispatcher.notify(1, 'third run\ndetails')
+        dispatcher.notify(1, 'fourth run\ndetails', ok=False)
+        dispatcher.notify(1, 'fifth run\ndetails', summary='fifth, summarised')
+        dispatcher.notify(2, 'other chat')
+        await asyncio.sleep(0.1)
+        assert len(bot.sent) == 3 and dispatcher.stats()['pending'] == 3  # the burst is held
+        await asyncio.sleep(0.4)
+        stats = dispatcher.stats()
+        await dispatcher.close()
+        return burst_at, stats
+
+    burst_at, stats = asyncio.run(asyncio.wait_for(run(), 5))
+    assert [(chat_id, text) for _, chat_id, text in bot.sent[:3]] == [
+        (1, 'first run\ndetails'), (1, 'second run\ndetails'), (2, 'other chat')]
+    sent_at, chat_id, digest = bot.sent[3]
+    assert len(bot.sent) == 4 and chat_id == 1
+    # Held until the digest window ends, then sent as one message of summaries
+    assert sent_at - burst_at >= 0.25
+    assert digest.splitlines() == ['📬 3 tasks executed in the last minute', '✅ 2 succeeded, ❌ 1 with failures',
+                                   '', 'third run', 'fourth run', 'fifth, summarised']
+    del stats['chats']  # idle chats are forgotten, so this depends on timing
+    assert stats == {'pending': 0, 'sent': 4, 'digests': 1, 'retried': 0, 'failed': 0, 'dropped': 0}
+
+
+def test_messages_still_waiting_join_the_digest():
+    bot = FakeBot()
+
+    async def run():
+        dispatcher = NotificationDispatcher(asyncio.get_running_loop(), bot, rate=100, chat_interval=0,
+                                            digest_threshold=2, digest_window=0.1)
+        for i in range(4):
+            dispatcher.notify(1, f'run {i}')
+        await asyncio.sleep(0.3)
+        await dispatcher.close()
+
+    asyncio.run(asyncio.wait_for(run(), 5))
+    # None had been sent when the burst began, so all four go out together
+    [(_, _, digest)] = bot.sent
+    assert digest.startswith('📬 4 tasks executed') and digest.splitlines()[-4:] == [f'run {i}' for i in range(4)]
@@ -0,0 +1,13 @@
+import os
+import subprocess
+import sys
+
+SCRIPT = os.path.realpath(os.path.join(os.path.dirname(__file__), '..', 'check_query_plans.py'))
+
+
+def test_queries_use_indexes(tmp_path):
+    # Its own process: the script points the app at a throwaway database before
+    # importing it, and RSA keys are written to the working directory
+    result = subprocess.run([sys.executable, SCRIPT], cwd=tmp_path, capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stdout[-5000:] + result.stderr[-5000:]
+    assert ' 0 unexpected full scans' in result.stdout
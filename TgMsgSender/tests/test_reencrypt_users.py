@@ -0,0 +1,42 @@
+import database
+import reencrypt_users
+from database import SessionLocal, User
+from encryption import decrypt_data, encrypt_data
+
+
+def credentials(telegram_id):
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter_by(telegram_id=telegram_id).one()
+        return [decrypt_data(getattr(user, field)) for field in reencrypt_users.FIELDS]
+    finally:
+        db.close()
+
+
+def test_login_during_reencryption_is_not_overwritten(monkeypatch):
+    database.init_db()
+    db = SessionLocal()
+    db.add(User(telegram_id=8001, phone='+8001', api_id_encrypted=encrypt_data('1'),
+                api_hash_encrypted=encrypt_data('old-hash'), session_string_encrypted=encrypt_data('old-session')))
+    db.commit()
+    db.close()
+
+    encrypt_fields = reencrypt_users.encrypt_fields
+    logins = []
+
+    def encrypt_then_log_in(*values):
+        if not logins:
+            # The user logs in again between our read and our write
+            logins.append(True)
+            db = SessionLocal()
+            user = db.query(User).filter_by(telegram_id=8001).one()
+            user.api_hash_encrypted, user.session_string_encrypted = encrypt_fields('new-hash', 'new-session')
+            db.commit()
+            db.close()
+        return encrypt_fields(*values)
+
+    monkeypatch.setattr(reencrypt_users, 'encrypt_fields', encrypt_then_log_in)
+    converted, skipped, failed = reencrypt_users.reencrypt(force=True)
+
+    assert failed == 0
+    assert credentials(8001) == ['1', 'new-hash', 'new-session']
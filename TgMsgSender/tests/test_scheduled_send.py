@@ -0,0 +1,56 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+import database
+import main_app
+from database import SessionLocal, Task, User
+
+
+@pytest.fixture
+def task():
+    db = SessionLocal()
+    user = User(telegram_id=7001, phone='+7001', api_id_encrypted='x', api_hash_encrypted='x',
+                session_string_encrypted='x', notifications_enabled=False)
+    db.add(user)
+    db.flush()
+    row = Task(id='loopcheck', user_id=user.id, message='hi', status='active', interval_value=1,
+               interval_unit='hours', chat_ids=[1, 2], next_run=datetime.utcnow() + timedelta(hours=1))
+    db.add(row)
+    db.commit()
+    ids = user.id, row.id
+    db.close()
+    yield ids
+    db = SessionLocal()
+    db.query(Task).filter_by(id='loopcheck').delete()
+    db.query(User).filter_by(telegram_id=7001).delete()
+    db.commit()
+    db.close()
+
+
+def test_scheduled_send_keeps_database_work_off_the_loop(task, monkeypatch):
+    async def deliver(user, task):
+        return [(chat_id, None) for chat_id in task.chat_ids]
+
+    monkeypatch.setattr(main_app, 'deliver_task', deliver)
+    threads = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        threads.append(threading.current_thread())
+
+    event.listen(database.engine, 'before_cursor_execute', record)
+    try:
+        main_app.run_async(main_app.send_scheduled_message(*task))
+        main_app.run_async(main_app.execution_writer.close())
+    finally:
+        event.remove(database.engine, 'before_cursor_execute', record)
+
+    assert threads
+    assert main_app.loop_thread not in threads
+
+    db = SessionLocal()
+    row = db.get(Task, 'loopcheck')
+    assert (row.execution_count, row.is_running) == (1, False)
+    db.close()
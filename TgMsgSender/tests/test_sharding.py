@@ -0,0 +1,61 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+import database
+from async_scheduler import AsyncTaskScheduler
+from database import SessionLocal
+from due_index import SQLTaskStore
+from sharding import ShardCoordinator
+
+
+def test_leases_are_renewed_off_the_loop_and_jobs_wait_for_a_current_lease():
+    database.init_db()
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        ran = []
+
+        async def run_task(user_id, task_id):
+            ran.append(task_id)
+
+        scheduler = AsyncTaskScheduler(loop, run_task, store=SQLTaskStore(SessionLocal))
+        coordinator = ShardCoordinator(loop, scheduler, scheduler.store, SessionLocal, 1, worker_id='w1')
+        threads = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            threads.append(threading.current_thread())
+
+        event.listen(database.engine, 'before_cursor_execute', record)
+        try:
+            coordinator.start()
+            for _ in range(100):
+                if coordinator.owned:
+                    break
+                await asyncio.sleep(0.02)
+        finally:
+            event.remove(database.engine, 'before_cursor_execute', record)
+        assert coordinator.owned == {0}
+        assert threads and threading.current_thread() not in threads
+
+        scheduler.start()
+        await asyncio.sleep(0.05)  # let the rebuild from the lease change land
+        due = datetime.utcnow() - timedelta(seconds=1)
+        scheduler.add_job('leased', 1, 60, due)
+        await asyncio.sleep(0.05)
+        assert ran == ['leased']
+
+        # The renewal is late: the lease may have been taken over meanwhile
+        coordinator._lease_deadline = time.monotonic() - 1
+        scheduler.add_job('unsure', 1, 60, due)
+        await asyncio.sleep(0.05)
+        assert ran == ['leased']
+
+        coordinator._task.cancel()
+        await scheduler.shutdown()
+        coordinator.release()
+
+    asyncio.run(asyncio.wait_for(scenario(), 10))
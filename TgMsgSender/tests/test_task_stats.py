@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+import database
+from database import ExecutionRollup, SessionLocal, Task, TaskCounter, TaskExecution, User
+from task_stats import ALL_USERS, TaskCounters, execution_history, status_counts, task_stats
+
+
+def test_counters_follow_the_grouped_stats():
+    database.init_db()
+    db = SessionLocal()
+    user = User(telegram_id=9601, phone='+9601', api_id_encrypted='x', api_hash_encrypted='x')
+    db.add(user)
+    db.flush()
+    user_id = user.id
+    for i, status in enumerate(['active', 'active', 'paused', 'archived']):
+        db.add(Task(id=f'stats{i}', user_id=user_id, message='hi', status=status, interval_value=1,
+                    interval_unit='hours', chat_ids=[1], execution_count=i))
+    db.commit()
+    assert task_stats(db, user_id) == {'total_tasks': 3, 'active_tasks': 2, 'paused_tasks': 1, 'archived_tasks': 1,
+                                       'total_executions': 6}
+
+    counters = TaskCounters(SessionLocal)
+    counters.rebuild()
+    assert counters.get(db, user_id) == task_stats(db, user_id)
+    assert counters.get(db) == task_stats(db)
+
+    # Pausing an active task, applied as the deltas of the committed change
+    db.query(Task).filter_by(id='stats0').update({'status': 'paused'})
+    db.commit()
+    deltas = {key: status_counts('paused')[key] - status_counts('active')[key] for key in status_counts(None)}
+    counters.apply(user_id, deltas)
+    db.expire_all()
+    assert counters.get(db, user_id) == task_stats(db, user_id)
+    assert counters.get(db, ALL_USERS) == task_stats(db)
+
+    db.query(Task).filter_by(user_id=user_id).delete()
+    db.query(TaskCounter).filter_by(user_id=user_id).delete()
+    db.query(User).filter_by(id=user_id).delete()
+    db.commit()
+    db.close()
+    counters.rebuild()
+
+
+def test_history_adds_rollups_and_raw_rows_without_overlap():
+    database.init_db()
+    db = SessionLocal()
+    user = User(telegram_id=9602, phone='+9602', api_id_encrypted='x', api_hash_encrypted='x')
+    db.add(user)
+    db.flush()
+    user_id = user.id
+    db.add(Task(id='history', user_id=user_id, message='hi', status='active', interval_value=1,
+                interval_unit='hours', chat_ids=[1]))
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    db.add_all([ExecutionRollup(task_id='history', user_id=user_id, period='day',
+                                period_start=today - timedelta(days=3), runs=4, successful_chats=7, failed_chats=1),
+                ExecutionRollup(task_id='history', user_id=user_id, period='hour',
+                                period_start=today - timedelta(days=3), runs=4, successful_chats=7, failed_chats=1),
+                ExecutionRollup(task_id='history', user_id=user_id, period='day',
+                                period_start=today - timedelta(days=40), runs=9, successful_chats=9, failed_chats=0),
+                TaskExecution(task_id='history', execution_time=datetime.utcnow(), successful_chats=2, failed_chats=1)])
+    db.commit()
+    # The hourly rollup repeats the daily one and is not counted again; day 40 is out of the window
+    assert execution_history(db, user_id) == {'days': 30, 'runs': 5, 'successful_chats': 9, 'failed_chats': 2}
+
+    db.query(ExecutionRollup).filter_by(task_id='history').delete()
+    db.query(TaskExecution).filter_by(task_id='history').delete()
+    db.query(Task).filter_by(id='history').delete()
+    db.query(User).filter_by(id=user_id).delete()
+    db.commit()
+    db.close()
@@ -0,0 +1,40 @@
+import database
+from database import SessionLocal, Task, TaskTarget, User
+from task_targets import retarget_chat, set_task_targets, tasks_targeting
+
+
+def targets(db, task_id):
+    return [(target.chat_id, target.position) for target in
+            db.query(TaskTarget).filter_by(task_id=task_id).order_by(TaskTarget.position)]
+
+
+def test_retarget_moves_every_task_to_the_migrated_chat():
+    database.init_db()
+    db = SessionLocal()
+    user = User(telegram_id=9701, phone='+9701', api_id_encrypted='x', api_hash_encrypted='x')
+    db.add(user)
+    db.flush()
+    user_id = user.id
+    for task_id, chat_ids in [('moves', [5, 1, 7, 1]), ('merges', [2, 1, 9]), ('untouched', [3])]:
+        task = Task(id=task_id, user_id=user_id, message='hi', status='active', interval_value=1,
+                    interval_unit='hours')
+        set_task_targets(task, chat_ids)
+        db.add(task)
+    db.commit()
+    assert targets(db, 'moves') == [(5, 0), (1, 1), (7, 2)]  # repeats dropped
+    assert sorted(tasks_targeting(db, user_id, 1)) == ['merges', 'moves']
+
+    # Chat 1 became chat 9; 'merges' already sends to 9, so it just loses 1
+    assert sorted(retarget_chat(db, user_id, 1, 9)) == ['merges', 'moves']
+    db.commit()
+    db.expire_all()
+    assert db.get(Task, 'moves').chat_ids == [5, 9, 7] and targets(db, 'moves') == [(5, 0), (9, 1), (7, 2)]
+    assert db.get(Task, 'merges').chat_ids == [2, 9] and targets(db, 'merges') == [(2, 0), (9, 1)]
+    assert targets(db, 'untouched') == [(3, 0)]
+    assert tasks_targeting(db, user_id, 1) == [] and retarget_chat(db, user_id, 1, 9) == []
+
+    db.query(TaskTarget).filter(TaskTarget.task_id.in_(['moves', 'merges', 'untouched'])).delete()
+    db.query(Task).filter_by(user_id=user_id).delete()
+    db.query(User).filter_by(id=user_id).delete()
+    db.commit()
+    db.close()
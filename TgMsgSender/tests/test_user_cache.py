@@ -0,0 +1,72 @@
+from sqlalchemy.orm import sessionmaker
+
+import database
+from database import SessionLocal, User
+from user_cache import UserCache
+
+
+def set_language(session_factory, telegram_id, language):
+    db = session_factory()
+    db.query(User).filter_by(telegram_id=telegram_id).one().language = language
+    db.commit()
+    db.close()
+
+
+def load_language(cache, telegram_id):
+    db = SessionLocal()
+    try:
+        return cache.load(db, telegram_id).language
+    finally:
+        db.close()
+
+
+def test_watched_writes_invalidate_and_others_are_followed():
+    database.init_db()
+    db = SessionLocal()
+    db.add(User(telegram_id=9401, phone='+9401', api_id_encrypted='x', api_hash_encrypted='x', language='en'))
+    db.commit()
+    db.close()
+
+    watched = sessionmaker(bind=database.engine)
+    cache = UserCache(ttl=3600)
+    cache.watch(watched)
+
+    assert load_language(cache, 9401) == 'en'
+    assert load_language(cache, 9401) == 'en'
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+    # A write through a watched session is seen straight away
+    set_language(watched, 9401, 'ru')
+    assert cache.stats()['size'] == 0
+    assert load_language(cache, 9401) == 'ru'
+
+    # One through an unwatched session (another process) waits for the TTL...
+    set_language(SessionLocal, 9401, 'en')
+    assert load_language(cache, 9401) == 'ru'
+
+    # ...unless the cache follows users.updated_at
+    following = UserCache(ttl=3600, follow_interval=0)
+    assert load_language(following, 9401) == 'en'
+    followed = following.stats()['followed']
+    set_language(SessionLocal, 9401, 'ru')
+    assert load_language(following, 9401) == 'ru'
+    assert following.stats()['followed'] == followed + 1
+    # Once seen, the same change does not evict the entry again
+    hits = following.stats()['hits']
+    assert load_language(following, 9401) == 'ru'
+    assert following.stats()['followed'] == followed + 1 and following.stats()['hits'] == hits + 1
+
+    # A flush that is rolled back drops the (here stale) entry; the next load reads the committed row
+    set_language(SessionLocal, 9401, 'en')
+    assert load_language(cache, 9401) == 'ru'
+    db = watched()
+    db.query(User).filter_by(telegram_id=9401).one().language = 'de'
+    db.flush()
+    db.rollback()
+    db.close()
+    assert load_language(cache, 9401) == 'en'
+
+    db = SessionLocal()
+    db.query(User).filter_by(telegram_id=9401).delete()
+    db.commit()
+    db.close()
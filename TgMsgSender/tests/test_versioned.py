@@ -0,0 +1,65 @@
+import main_app
+from database import SessionLocal, Task, User
+
+
+def test_etag_follows_writes_made_outside_the_web_process():
+    db = SessionLocal()
+    user = User(telegram_id=9101, phone='+9101', api_id_encrypted='x', api_hash_encrypted='x')
+    db.add(user)
+    db.commit()
+    user_id = user.id
+    db.close()
+
+    client = main_app.app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 9101
+
+    first = client.get('/api/tasks')
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and etag.startswith('W/"')
+    for header in (etag, etag[2:], f'"other", {etag}', '*'):
+        assert client.get('/api/tasks', headers={'If-None-Match': header}).status_code == 304
+    # A tag merely containing this one is a different tag
+    assert client.get('/api/tasks', headers={'If-None-Match': etag[:-1] + '0"'}).status_code == 200
+
+    # A write by the bot or another worker, which no in-process counter sees
+    db = SessionLocal()
+    db.add(Task(id='elsewhere', user_id=user_id, message='hi', status='paused', interval_value=1,
+                interval_unit='hours', chat_ids=[1]))
+    db.commit()
+    response = client.get('/api/tasks', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.headers['ETag'] != etag
+    assert [task['id'] for task in response.get_json()['tasks']] == ['elsewhere']
+
+    etag = response.headers['ETag']
+    db.query(Task).filter_by(id='elsewhere').update({'status': 'active'})
+    db.commit()
+    assert client.get('/api/tasks', headers={'If-None-Match': etag}).status_code == 200
+
+    db.query(Task).filter_by(user_id=user_id).delete()
+    db.query(User).filter_by(id=user_id).delete()
+    db.commit()
+    db.close()
+
+
+def test_users_with_identical_data_get_different_etags():
+    db = SessionLocal()
+    users = [User(telegram_id=telegram_id, phone=f'+{telegram_id}', api_id_encrypted='x', api_hash_encrypted='x')
+             for telegram_id in (9102, 9103)]
+    db.add_all(users)
+    db.commit()
+    user_ids = [user.id for user in users]
+    db.close()
+
+    etags = []
+    for telegram_id in (9102, 9103):
+        client = main_app.app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = telegram_id
+        etags.append(client.get('/api/tasks').headers['ETag'])
+    assert etags[0] != etags[1]
+
+    db = SessionLocal()
+    db.query(User).filter(User.id.in_(user_ids)).delete()
+    db.commit()
+    db.close()
@@ -0,0 +1,124 @@
+"""
+Short-lived cache of users rows by telegram_id, for the per-request user lookup
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from database import User
+
+_COLUMNS = [attr.key for attr in inspect(User).column_attrs]
+# Transactions can commit out of updated_at order, so each look reaches back this far
+FOLLOW_OVERLAP = timedelta(seconds=5)
+
+
+class UserCache:
+    """
+    Maps telegram_id -> the column values of that users row.
+
+    load() turns a fresh entry back into a User attached to the caller's
+    session without a query, so routes can read and write it as usual.
+    Entries expire after `ttl` seconds, which bounds how long a write made
+    by another process (e.g. the bot) can go unseen; writes made through
+    sessions passed to watch() invalidate the entry straight away. With
+    `follow_interval` set, load() also asks the database, at most that
+    often, which users rows changed since it last looked (by updated_at)
+    and forgets them, so other processes' writes show up within seconds.
+    """
+
+    def __init__(self, max_entries=1000, ttl=30, follow_interval=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.follow_interval = follow_interval
+        self._entries = OrderedDict()  # telegram_id -> (expires_at, values)
+        self._lock = threading.Lock()
+        self._followed_at = time.monotonic()
+        self._watermark = datetime.utcnow()  # newest users.updated_at seen
+        self._seen = {}  # telegram_id -> updated_at, for rows within FOLLOW_OVERLAP of the watermark
+        self.hits = 0
+        self.misses = 0
+        self.followed = 0
+
+    def load(self, db, telegram_id):
+        """The User with this telegram_id attached to `db`, or None"""
+        if self.follow_interval is not None:
+            self._follow(db)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(telegram_id)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(telegram_id)
+                self.hits += 1
+                values = entry[1]
+            else:
+                self.misses += 1
+                values = None
+
+        if values is not None:
+            user = db.identity_map.get(inspect(User).identity_key_from_primary_key((values['id'],)))
+            if user is None:
+                user = User(**values)
+                make_transient_to_detached(user)
+                db.add(user)
+            return user
+
+        user = db.query(User).filter_by(telegram_id=telegram_id).first()
+        if user is not None:
+            with self._lock:
+                self._entries[telegram_id] = (now + self.ttl, {key: getattr(user, key) for key in _COLUMNS})
+                self._entries.move_to_end(telegram_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return user
+
+    def invalidate(self, telegram_id):
+        with self._lock:
+            self._entries.pop(telegram_id, None)
+
+    def _follow(self, db):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._followed_at < self.follow_interval:
+                return
+            self._followed_at = now
+            since = self._watermark - FOLLOW_OVERLAP
+        changed = db.query(User.telegram_id, User.updated_at).filter(User.updated_at > since).all()
+        with self._lock:
+            for telegram_id, updated_at in changed:
+                if self._seen.get(telegram_id) == updated_at:
+                    continue
+                self._seen[telegram_id] = updated_at
+                self._entries.pop(telegram_id, None)
+                self._watermark = max(self._watermark, updated_at)
+                self.followed += 1
+            cutoff = self._watermark - FOLLOW_OVERLAP
+            self._seen = {key: updated_at for key, updated_at in self._seen.items() if updated_at > cutoff}
+
+    def watch(self, session_factory):
+        """Invalidate users that sessions made by `session_factory` insert, change or delete"""
+
+        @event.listens_for(session_factory, 'after_flush')
+        def collect(db, flush_context):
+            written = {obj.telegram_id for obj in (*db.new, *db.dirty, *db.deleted) if isinstance(obj, User)}
+            if written:
+                db.info.setdefault('written_users', set()).update(written)
+                for telegram_id in written:
+                    self.invalidate(telegram_id)
+
+        @event.listens_for(session_factory, 'after_commit')
+        def invalidate_committed(db):
+            # Again after commit: a reader may have cached the old row in between
+            for telegram_id in db.info.pop('written_users', ()):
+                self.invalidate(telegram_id)
+
+        @event.listens_for(session_factory, 'after_rollback')
+        def forget(db):
+            db.info.pop('written_users', None)
+
+    def stats(self):
+        return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses, 'followed': self.followed}